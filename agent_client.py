@@ -1,21 +1,147 @@
-import os
-from typing import List
+import asyncio
+import time
+from contextlib import aclosing
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
 
-from dotenv import load_dotenv
-from openai import OpenAI
+from backends import (
+    AsyncOpenAIBackend,
+    OpenAIBackend,
+    estimate_tokens,
+    estimated_request_tokens,
+)
+from metrics import emit_span
+from response_cache import ResponseCache
+from utils import Agent, Completion, Response
 
-from utils import Agent, Response
+# Called with each streamed delta and the text so far; returning True stops
+# the stream early.
+TokenCallback = Callable[[str, str], bool]
 
-load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+def build_messages(agent: Agent, chat_history: List) -> List[dict]:
+    clean_chat_history = [
+        (
+            {"role": "assistant", "content": message["content"]}
+            if message["role"] == agent.name
+            else {"role": "user", "content": message["content"]}
+        )
+        for message in chat_history
+    ]
+    return [{"role": "system", "content": agent.instructions}] + clean_chat_history
+
+
+def cache_key(
+    cache: Optional[ResponseCache],
+    agent: Agent,
+    messages: List[dict],
+    temperature: float,
+    json_response: bool,
+    max_tokens: Optional[int] = None,
+) -> Optional[str]:
+    if cache is None or not cache.should_cache(temperature):
+        return None
+    return cache.key(agent.model, messages, temperature, json_response, max_tokens)
+
+
+class StreamedCompletion:
+    def __init__(self, messages: List[dict], on_token: Optional[TokenCallback]):
+        self.messages = messages
+        self.on_token = on_token
+        self.text = ""
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.queue_seconds = 0.0
+        self.stopped = False
+
+    def add(self, chunk: Completion) -> bool:
+        self.text += chunk.content or ""
+        self.prompt_tokens += chunk.prompt_tokens
+        self.completion_tokens += chunk.completion_tokens
+        self.retries += chunk.retries
+        self.queue_seconds += chunk.queue_seconds
+        if chunk.content and self.on_token and self.on_token(chunk.content, self.text):
+            self.stopped = True
+        return self.stopped
+
+    def completion(self) -> Completion:
+        # A stream that is cut short never receives its usage chunk.
+        return Completion(
+            content=self.text,
+            prompt_tokens=self.prompt_tokens or estimated_request_tokens(self.messages),
+            completion_tokens=self.completion_tokens or estimate_tokens(self.text),
+            retries=self.retries,
+            queue_seconds=self.queue_seconds,
+        )
+
+
+def agent_response(
+    agent: Agent,
+    content: Optional[str],
+    completion: Optional[Completion],
+    started: float,
+    stream: bool,
+) -> Response:
+    # `completion` is None for answers served from the response cache.
+    response = Response(
+        messages=[{"role": agent.name, "content": content}],
+        agent=agent,
+        prompt_tokens=completion.prompt_tokens if completion else 0,
+        completion_tokens=completion.completion_tokens if completion else 0,
+        latency_seconds=time.perf_counter() - started,
+        queue_seconds=completion.queue_seconds if completion else 0.0,
+        retries=completion.retries if completion else 0,
+        cached=completion is None,
+    )
+    emit_span(
+        {
+            "name": "agent_call",
+            "agent": agent.name,
+            "model": agent.model,
+            "started": started,
+            "latency_seconds": response.latency_seconds,
+            "queue_seconds": response.queue_seconds,
+            "prompt_tokens": response.prompt_tokens,
+            "completion_tokens": response.completion_tokens,
+            "retries": response.retries,
+            "cached": response.cached,
+            "stream": stream,
+        }
+    )
+    return response
 
 
 class AgentClient:
-    def __init__(self) -> None:
-        self.client = OpenAI(
-            api_key=OPENAI_API_KEY,
+    def __init__(
+        self, backend: Optional[Any] = None, cache: Optional[ResponseCache] = None
+    ) -> None:
+        self.backend = backend or OpenAIBackend()
+        self.cache = cache
+
+    def stream(
+        self,
+        agent: Agent,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool,
+        max_tokens: Optional[int],
+        on_token: Optional[TokenCallback],
+    ) -> Tuple[Completion, bool]:
+        streamed = StreamedCompletion(messages, on_token)
+        chunks = self.backend.stream(
+            model=agent.model,
+            messages=messages,
+            temperature=temperature,
+            json_response=json_response,
+            max_tokens=max_tokens,
         )
+        try:
+            for chunk in chunks:
+                if streamed.add(chunk):
+                    break
+        finally:
+            chunks.close()
+        return streamed.completion(), not streamed.stopped
 
     def run(
         self,
@@ -23,34 +149,125 @@ class AgentClient:
         chat_history: List = [],
         temperature: float = 0.8,
         json_response: bool = False,
+        max_tokens: Optional[int] = None,
+        messages: Optional[List[dict]] = None,
+        stream: bool = False,
+        on_token: Optional[TokenCallback] = None,
     ) -> Response:
-        clean_chat_history = [
-            (
-                {"role": "assistant", "content": message["content"]}
-                if message["role"] == agent.name
-                else {"role": "user", "content": message["content"]}
-            )
-            for message in chat_history
-        ]
-        messages = [
-            {"role": "system", "content": agent.instructions}
-        ] + clean_chat_history
-        if json_response:
-            response = self.client.chat.completions.create(
-                model=agent.model,
-                response_format={"type": "json_object"},
-                messages=messages,
-                temperature=temperature,
-            )
+        started = time.perf_counter()
+        if messages is None:
+            messages = build_messages(agent, chat_history)
+        key = cache_key(
+            self.cache, agent, messages, temperature, json_response, max_tokens
+        )
+        response_utterance = self.cache.get(key) if key and self.cache else None
+        completion = None
+        if response_utterance is not None:
+            if on_token:
+                on_token(response_utterance, response_utterance)
         else:
-            response = self.client.chat.completions.create(
+            if stream:
+                completion, finished = self.stream(
+                    agent, messages, temperature, json_response, max_tokens, on_token
+                )
+            else:
+                completion = self.backend.complete(
+                    model=agent.model,
+                    messages=messages,
+                    temperature=temperature,
+                    json_response=json_response,
+                    max_tokens=max_tokens,
+                )
+                finished = True
+            response_utterance = completion.content
+            if key and self.cache and finished and response_utterance is not None:
+                self.cache.put(key, response_utterance)
+        return agent_response(agent, response_utterance, completion, started, stream)
+
+
+class AsyncAgentClient:
+    def __init__(
+        self, backend: Optional[Any] = None, cache: Optional[ResponseCache] = None
+    ) -> None:
+        self.backend = backend or AsyncOpenAIBackend()
+        self.cache = cache
+
+    async def stream(
+        self,
+        agent: Agent,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool,
+        max_tokens: Optional[int],
+        on_token: Optional[TokenCallback],
+        drain: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Tuple[Completion, bool]:
+        streamed = StreamedCompletion(messages, on_token)
+        async with aclosing(
+            self.backend.stream(
                 model=agent.model,
                 messages=messages,
                 temperature=temperature,
+                json_response=json_response,
+                max_tokens=max_tokens,
             )
+        ) as chunks:
+            async for chunk in chunks:
+                if streamed.add(chunk):
+                    break
+                # Lets the caller hold the stream until what on_token wrote
+                # has gone out, e.g. to a slow client.
+                if drain is not None:
+                    await drain()
+        return streamed.completion(), not streamed.stopped
 
-        response_utterance = response.choices[0].message.content
-        return Response(
-            messages=[{"role": agent.name, "content": response_utterance}],
-            agent=agent,
+    async def run(
+        self,
+        agent: Agent,
+        chat_history: List = [],
+        temperature: float = 0.8,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+        messages: Optional[List[dict]] = None,
+        stream: bool = False,
+        on_token: Optional[TokenCallback] = None,
+        drain: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Response:
+        started = time.perf_counter()
+        if messages is None:
+            messages = build_messages(agent, chat_history)
+        key = cache_key(
+            self.cache, agent, messages, temperature, json_response, max_tokens
         )
+        # The cache is synchronous SQLite, kept off the event loop.
+        response_utterance = (
+            await asyncio.to_thread(self.cache.get, key) if key and self.cache else None
+        )
+        completion = None
+        if response_utterance is not None:
+            if on_token:
+                on_token(response_utterance, response_utterance)
+        else:
+            if stream:
+                completion, finished = await self.stream(
+                    agent,
+                    messages,
+                    temperature,
+                    json_response,
+                    max_tokens,
+                    on_token,
+                    drain,
+                )
+            else:
+                completion = await self.backend.complete(
+                    model=agent.model,
+                    messages=messages,
+                    temperature=temperature,
+                    json_response=json_response,
+                    max_tokens=max_tokens,
+                )
+                finished = True
+            response_utterance = completion.content
+            if key and self.cache and finished and response_utterance is not None:
+                await asyncio.to_thread(self.cache.put, key, response_utterance)
+        return agent_response(agent, response_utterance, completion, started, stream)
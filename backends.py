@@ -0,0 +1,550 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from candidate_tracker import KnowledgeBase
+from game_state import yes_no_answer
+from rate_limit import rate_limiter
+from utils import Completion, load_env
+
+# openai and httpx are only imported once a client is built, so importing the
+# game (and every tool that imports it) stays cheap and needs no API key.
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+_clients_lock = threading.Lock()
+_client: Optional["OpenAI"] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@functools.lru_cache(maxsize=None)
+def openai_settings() -> dict:
+    # Read from the environment (and .env) on first use rather than at import.
+    load_env()
+    return {
+        "api_key": os.getenv("OPENAI_API_KEY"),
+        "max_connections": int(os.getenv("OPENAI_MAX_CONNECTIONS", "200")),
+        "max_keepalive_connections": int(
+            os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "100")
+        ),
+        "max_retries": int(os.getenv("OPENAI_MAX_RETRIES", "5")),
+        "rate_limits": {
+            "requests_per_minute": float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "0"))
+            or None,
+            "tokens_per_minute": float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "0"))
+            or None,
+        },
+    }
+
+
+def default_rate_limits() -> dict:
+    return openai_settings()["rate_limits"]
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[type, ...]:
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def http_limits() -> "httpx.Limits":
+    import httpx
+
+    settings = openai_settings()
+    return httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+    )
+
+
+def openai_client() -> "OpenAI":
+    # One client, and so one keep-alive connection pool, per process. Retries
+    # are handled by the backends so they can share rate-limit state.
+    import httpx
+    from openai import OpenAI
+
+    global _client
+    with _clients_lock:
+        if _client is None:
+            _client = OpenAI(
+                api_key=openai_settings()["api_key"],
+                max_retries=0,
+                http_client=httpx.Client(limits=http_limits()),
+            )
+        return _client
+
+
+def async_openai_client() -> "AsyncOpenAI":
+    # Async connections belong to the event loop that opened them, so there is
+    # one async client per running loop.
+    import httpx
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        if loop not in _async_clients:
+            _async_clients[loop] = AsyncOpenAI(
+                api_key=openai_settings()["api_key"],
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=http_limits()),
+            )
+        return _async_clients[loop]
+
+
+def request_kwargs(
+    model: str,
+    messages: List[dict],
+    temperature: float,
+    json_response: bool,
+    max_tokens: Optional[int] = None,
+) -> dict:
+    kwargs: dict = {"model": model, "messages": messages, "temperature": temperature}
+    if json_response:
+        kwargs["response_format"] = {"type": "json_object"}
+    if max_tokens:
+        kwargs["max_tokens"] = max_tokens
+    return kwargs
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def estimated_request_tokens(messages: List[dict]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages)
+
+
+# Completion tokens expected per call when reserving rate-limit tokens; the
+# reservation is settled to the actual usage afterwards.
+EXPECTED_COMPLETION_TOKENS = 100
+
+
+def reserved_tokens(messages: List[dict], max_tokens: Optional[int] = None) -> int:
+    return estimated_request_tokens(messages) + min(
+        max_tokens or EXPECTED_COMPLETION_TOKENS, EXPECTED_COMPLETION_TOKENS
+    )
+
+
+def settle_usage(model: str, reserved: int, completion: Completion) -> None:
+    # Streams cut short report no usage and keep their reservation.
+    used = completion.prompt_tokens + completion.completion_tokens
+    if used:
+        rate_limiter(model, default_rate_limits()).settle(reserved, used)
+
+
+def error_headers(error: Exception) -> dict:
+    response = getattr(error, "response", None)
+    return dict(response.headers) if response is not None else {}
+
+
+class OpenAIBackend:
+    def __init__(self, max_retries: Optional[int] = None) -> None:
+        self.max_retries = (
+            max_retries if max_retries is not None else openai_settings()["max_retries"]
+        )
+
+    def create(
+        self, model: str, messages: List[dict], **kwargs
+    ) -> Tuple[Any, int, float, int]:
+        # Returns the parsed response, the number of retries, the seconds
+        # spent waiting on the rate limiter and the rate-limit tokens reserved.
+        client = openai_client()
+        limiter = rate_limiter(model, default_rate_limits())
+        reserved = reserved_tokens(messages, kwargs.get("max_tokens"))
+        queue_seconds = limiter.reserve(reserved)
+        time.sleep(queue_seconds)
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    # Retries wait out backoffs but keep the one reservation.
+                    wait = limiter.blocked_for()
+                    queue_seconds += wait
+                    time.sleep(wait)
+                try:
+                    raw_response = client.chat.completions.with_raw_response.create(
+                        model=model, messages=messages, **kwargs
+                    )
+                except retryable_errors() as error:
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(limiter.backoff(attempt, error_headers(error)))
+                    continue
+                limiter.observe(raw_response.headers)
+                return raw_response.parse(), attempt, queue_seconds, reserved
+        except Exception:
+            limiter.settle(reserved, 0)
+            raise
+        raise AssertionError("unreachable")
+
+    def complete(
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> Completion:
+        response, retries, queue_seconds, reserved = self.create(
+            **request_kwargs(model, messages, temperature, json_response, max_tokens)
+        )
+        completion = completion_from_response(response, retries, queue_seconds)
+        settle_usage(model, reserved, completion)
+        return completion
+
+    def stream(
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> Iterator[Completion]:
+        stream, retries, queue_seconds, reserved = self.create(
+            **request_kwargs(model, messages, temperature, json_response, max_tokens),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        yield Completion(content="", retries=retries, queue_seconds=queue_seconds)
+        usage = Completion()
+        try:
+            for chunk in stream:
+                completion = completion_from_chunk(chunk)
+                usage.prompt_tokens += completion.prompt_tokens
+                usage.completion_tokens += completion.completion_tokens
+                yield completion
+        finally:
+            stream.close()
+            settle_usage(model, reserved, usage)
+
+
+class AsyncOpenAIBackend:
+    def __init__(self, max_retries: Optional[int] = None) -> None:
+        self.max_retries = (
+            max_retries if max_retries is not None else openai_settings()["max_retries"]
+        )
+
+    async def create(
+        self, model: str, messages: List[dict], **kwargs
+    ) -> Tuple[Any, int, float, int]:
+        client = async_openai_client()
+        limiter = rate_limiter(model, default_rate_limits())
+        reserved = reserved_tokens(messages, kwargs.get("max_tokens"))
+        queue_seconds = limiter.reserve(reserved)
+        await asyncio.sleep(queue_seconds)
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    # Retries wait out backoffs but keep the one reservation.
+                    wait = limiter.blocked_for()
+                    queue_seconds += wait
+                    await asyncio.sleep(wait)
+                try:
+                    raw_response = (
+                        await client.chat.completions.with_raw_response.create(
+                            model=model, messages=messages, **kwargs
+                        )
+                    )
+                except retryable_errors() as error:
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(limiter.backoff(attempt, error_headers(error)))
+                    continue
+                limiter.observe(raw_response.headers)
+                return raw_response.parse(), attempt, queue_seconds, reserved
+        except Exception:
+            limiter.settle(reserved, 0)
+            raise
+        raise AssertionError("unreachable")
+
+    async def complete(
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> Completion:
+        response, retries, queue_seconds, reserved = await self.create(
+            **request_kwargs(model, messages, temperature, json_response, max_tokens)
+        )
+        completion = completion_from_response(response, retries, queue_seconds)
+        settle_usage(model, reserved, completion)
+        return completion
+
+    async def stream(
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[Completion]:
+        stream, retries, queue_seconds, reserved = await self.create(
+            **request_kwargs(model, messages, temperature, json_response, max_tokens),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        yield Completion(content="", retries=retries, queue_seconds=queue_seconds)
+        usage = Completion()
+        try:
+            async for chunk in stream:
+                completion = completion_from_chunk(chunk)
+                usage.prompt_tokens += completion.prompt_tokens
+                usage.completion_tokens += completion.completion_tokens
+                yield completion
+        finally:
+            await stream.close()
+            settle_usage(model, reserved, usage)
+
+
+def completion_from_response(
+    response, retries: int = 0, queue_seconds: float = 0.0
+) -> Completion:
+    usage = response.usage
+    return Completion(
+        content=response.choices[0].message.content,
+        prompt_tokens=usage.prompt_tokens if usage else 0,
+        completion_tokens=usage.completion_tokens if usage else 0,
+        retries=retries,
+        queue_seconds=queue_seconds,
+    )
+
+
+def completion_from_chunk(chunk) -> Completion:
+    # Content chunks carry a delta, the last chunk of a stream carries usage.
+    usage = chunk.usage
+    return Completion(
+        content=chunk.choices[0].delta.content or "" if chunk.choices else "",
+        prompt_tokens=usage.prompt_tokens if usage else 0,
+        completion_tokens=usage.completion_tokens if usage else 0,
+    )
+
+
+QUESTION_NUMBER_PATTERN = re.compile(r"Question (\d+):")
+# (latency multiplier, share of host answers that hedge) per model prefix;
+# other models keep the configured latency and always commit to yes or no.
+SIMULATED_MODEL_PROFILES = {"gpt-4o-mini": (0.3, 0.15)}
+
+
+class SimulatedBackend:
+    # Offline stand-in for both agents. The host recognises itself from the
+    # "host agent" system prompt and answers yes/no from a hash of the question,
+    # the guesser asks numbered questions and guesses `topic` on question
+    # `questions_before_guess`, so the same inputs always play the same game.
+    # Given a knowledge base, the host answers the base's own questions about
+    # the secret topic truthfully. Per `model_profiles`, small models answer
+    # faster but sometimes hedge, which a routing cascade escalates.
+    def __init__(
+        self,
+        topic: str = "penguin",
+        questions_before_guess: int = 12,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+        knowledge_base: Optional[KnowledgeBase] = None,
+        model_profiles: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> None:
+        self.topic = topic
+        self.model_profiles = (
+            SIMULATED_MODEL_PROFILES if model_profiles is None else model_profiles
+        )
+        self.knowledge_base = knowledge_base
+        self.questions_before_guess = questions_before_guess
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+    def profile(self, model: Optional[str]) -> Tuple[float, float]:
+        matches = [
+            prefix for prefix in self.model_profiles if (model or "").startswith(prefix)
+        ]
+        if not matches:
+            return 1.0, 0.0
+        return self.model_profiles[max(matches, key=len)]
+
+    def delay(self, model: Optional[str] = None) -> float:
+        if not self.latency and not self.jitter:
+            return 0.0
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay * self.profile(model)[0])
+
+    def hedges(self, model: Optional[str], messages: List[dict]) -> bool:
+        # Drawn from the seeded generator, like the latency jitter, so that
+        # repeated games differ in where a small model hedges.
+        hedge_rate = self.profile(model)[1]
+        if not hedge_rate or len(messages) == 1:
+            return False
+        return self.random.random() < hedge_rate
+
+    def reply(
+        self,
+        messages: List[dict],
+        json_response: bool = False,
+        model: Optional[str] = None,
+    ) -> str:
+        if messages[0]["content"].startswith("You are the judge"):
+            return self.judge_reply(messages)
+        if "host agent" in messages[0]["content"]:
+            reply = (
+                "Maybe, it depends."
+                if self.hedges(model, messages)
+                else self.host_reply(messages)
+            )
+            if json_response:
+                return json.dumps({"answer": yes_no_answer(reply)})
+            return reply
+        return self.guessing_reply(messages)
+
+    def host_reply(self, messages: List[dict]) -> str:
+        if len(messages) == 1:
+            return "I have a secret topic in mind. Ask your first question."
+        question = messages[-1]["content"].lower()
+        topic = re.search(r"secret topic is (.+?) and", messages[0]["content"])
+        if topic and re.search(
+            r"\b" + re.escape(topic.group(1).lower()) + r"\b", question
+        ):
+            return "Yes! You guessed it."
+        if topic and self.knowledge_base is not None:
+            answer = self.knowledge_base.answer(topic.group(1), messages[-1]["content"])
+            if answer is not None:
+                return f"{answer.capitalize()}."
+        digest = hashlib.blake2b(question.encode("utf-8"), digest_size=1).digest()
+        return "Yes." if digest[0] % 2 else "No."
+
+    def judge_reply(self, messages: List[dict]) -> str:
+        # Correct when one of topic and guess contains all words of the other.
+        match = re.search(r"Secret topic: (.*)\nGuess: (.*)", messages[-1]["content"])
+        topic, guess = (
+            (set(match.group(1).lower().split()), set(match.group(2).lower().split()))
+            if match
+            else (set(), set())
+        )
+        correct = bool(topic and guess) and (topic <= guess or guess <= topic)
+        return json.dumps({"correct": correct})
+
+    def guessing_reply(self, messages: List[dict]) -> str:
+        # Questions are numbered from the transcript text rather than by
+        # counting messages, so compacted histories play the same game.
+        asked = [
+            int(number)
+            for message in messages
+            for number in QUESTION_NUMBER_PATTERN.findall(message["content"])
+        ]
+        number_of_questions = max(asked, default=0) + 1
+        if number_of_questions >= self.questions_before_guess:
+            return f"Is it a {self.topic}?"
+        return f"Question {number_of_questions}: does it have property {number_of_questions}?"
+
+    def completion(
+        self,
+        messages: List[dict],
+        json_response: bool = False,
+        model: Optional[str] = None,
+    ) -> Completion:
+        content = self.reply(messages, json_response, model)
+        return Completion(
+            content=content,
+            prompt_tokens=sum(
+                estimate_tokens(message["content"]) for message in messages
+            ),
+            completion_tokens=estimate_tokens(content),
+        )
+
+    def chunks(
+        self,
+        messages: List[dict],
+        json_response: bool = False,
+        model: Optional[str] = None,
+    ) -> List[Completion]:
+        completion = self.completion(messages, json_response, model)
+        words = re.findall(r"\S+\s*", completion.content or "")
+        return [Completion(content=word) for word in words] + [
+            Completion(
+                content="",
+                prompt_tokens=completion.prompt_tokens,
+                completion_tokens=completion.completion_tokens,
+            )
+        ]
+
+    def complete(
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> Completion:
+        delay = self.delay(model)
+        if delay:
+            time.sleep(delay)
+        return self.completion(messages, json_response, model)
+
+    def stream(
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> Iterator[Completion]:
+        chunks = self.chunks(messages, json_response, model)
+        delay = self.delay(model) / len(chunks)
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+
+class AsyncSimulatedBackend(SimulatedBackend):
+    async def complete(  # type: ignore[override]
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> Completion:
+        delay = self.delay(model)
+        if delay:
+            await asyncio.sleep(delay)
+        return self.completion(messages, json_response, model)
+
+    async def stream(  # type: ignore[override]
+        self,
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool = False,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[Completion]:
+        chunks = self.chunks(messages, json_response, model)
+        delay = self.delay(model) / len(chunks)
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
@@ -0,0 +1,224 @@
+import io
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from agent_client import build_messages
+from backends import openai_client
+from game import Game
+from utils import Completion, GameResult, GameVariables, Response, bcolors
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+
+def batch_request_line(custom_id: str, request: dict) -> dict:
+    agent = request["agent"]
+    messages = request.get("messages")
+    if messages is None:
+        messages = build_messages(agent, request.get("chat_history", []))
+    body: Dict[str, Any] = {
+        "model": agent.model,
+        "messages": messages,
+        "temperature": request.get("temperature", 0.8),
+    }
+    if request.get("json_response"):
+        body["response_format"] = {"type": "json_object"}
+    if request.get("max_tokens"):
+        body["max_tokens"] = request["max_tokens"]
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": CHAT_COMPLETIONS_URL,
+        "body": body,
+    }
+
+
+def encode_jsonl(lines: List[dict]) -> bytes:
+    return "".join(
+        json.dumps(line, ensure_ascii=False) + "\n" for line in lines
+    ).encode("utf-8")
+
+
+def decode_batch_output(text: str) -> Dict[str, Completion]:
+    completions = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        output = json.loads(line)
+        if output.get("error") or output["response"]["status_code"] != 200:
+            raise RuntimeError(
+                f"Batch request {output['custom_id']} failed: {output.get('error') or output['response']}"
+            )
+        body = output["response"]["body"]
+        usage = body.get("usage") or {}
+        completions[output["custom_id"]] = Completion(
+            content=body["choices"][0]["message"]["content"],
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+    return completions
+
+
+class OpenAIBatchTransport:
+    def __init__(self, completion_window: str = "24h") -> None:
+        self.client = openai_client()
+        self.completion_window = completion_window
+
+    def submit(self, lines: List[dict]) -> str:
+        input_file = self.client.files.create(
+            file=("batch.jsonl", io.BytesIO(encode_jsonl(lines))), purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Completion]]:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise RuntimeError(f"Batch {batch_id} {batch.status}: {batch.errors}")
+        if batch.status != "completed":
+            return None
+        completions = {}
+        if batch.output_file_id:
+            completions = decode_batch_output(
+                self.client.files.content(batch.output_file_id).text
+            )
+        if batch.error_file_id:
+            decode_batch_output(self.client.files.content(batch.error_file_id).text)
+        # Time the batch waited before it was processed.
+        if batch.in_progress_at is not None:
+            for completion in completions.values():
+                completion.queue_seconds = float(
+                    batch.in_progress_at - batch.created_at
+                )
+        return completions
+
+
+class LocalBatchTransport:
+    # Stand-in for the Batch API: requests go through the same JSONL encoding
+    # and are answered by a synchronous backend (e.g. SimulatedBackend) once
+    # the batch has been polled `polls_until_complete` times.
+    def __init__(self, backend: Any, polls_until_complete: int = 0) -> None:
+        self.backend = backend
+        self.polls_until_complete = polls_until_complete
+        self.batches: Dict[str, bytes] = {}
+        self.polls: Dict[str, int] = {}
+
+    def submit(self, lines: List[dict]) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        self.batches[batch_id] = encode_jsonl(lines)
+        self.polls[batch_id] = 0
+        return batch_id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Completion]]:
+        self.polls[batch_id] += 1
+        if self.polls[batch_id] <= self.polls_until_complete:
+            return None
+        completions = {}
+        for line in self.batches.pop(batch_id).decode("utf-8").splitlines():
+            request = json.loads(line)
+            body = request["body"]
+            completions[request["custom_id"]] = self.backend.complete(
+                model=body["model"],
+                messages=body["messages"],
+                temperature=body["temperature"],
+                json_response="response_format" in body,
+                max_tokens=body.get("max_tokens"),
+            )
+        del self.polls[batch_id]
+        return completions
+
+
+class LockstepRunner:
+    # Advances every live game by one agent call per step: the pending
+    # requests of all games are submitted as one batch and each game only
+    # moves on once the batch has completed. Finished games drop out.
+    def __init__(
+        self, transport: Any, poll_interval: float = 30.0, verbose: bool = False
+    ) -> None:
+        self.transport = transport
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+
+    def wait(self, batch_id: str) -> Dict[str, Completion]:
+        while True:
+            completions = self.transport.poll(batch_id)
+            if completions is not None:
+                return completions
+            time.sleep(self.poll_interval)
+
+    def run(self, games: Sequence[GameVariables]) -> List[GameResult]:
+        turns = [
+            Game(game_variables, verbose=self.verbose).play()
+            for game_variables in games
+        ]
+        results: List[Optional[GameResult]] = [None] * len(turns)
+        pending = {index: next(game_turns) for index, game_turns in enumerate(turns)}
+        step = 0
+        while pending:
+            # A game can yield a list of requests (e.g. speculative questions),
+            # each of them becomes its own line of the batch.
+            custom_ids = {
+                index: [
+                    f"game-{index}-turn-{step}-{position}"
+                    for position in range(
+                        len(request) if isinstance(request, list) else 1
+                    )
+                ]
+                for index, request in pending.items()
+            }
+            # Every game in the step waits for the whole batch, so each call's
+            # latency is the batch's, from submission to its last poll.
+            submitted = time.perf_counter()
+            batch_id = self.transport.submit(
+                [
+                    batch_request_line(custom_id, request)
+                    for index, request in pending.items()
+                    for custom_id, request in zip(
+                        custom_ids[index],
+                        request if isinstance(request, list) else [request],
+                    )
+                ]
+            )
+            completions = self.wait(batch_id)
+            latency_seconds = time.perf_counter() - submitted
+            if self.verbose:
+                print(
+                    bcolors.LOG
+                    + f"Step {step}: batch of {sum(map(len, custom_ids.values()))} requests completed."
+                    + bcolors.ENDC
+                )
+            for index, request in list(pending.items()):
+                requests = request if isinstance(request, list) else [request]
+                responses = []
+                for custom_id, request in zip(custom_ids[index], requests):
+                    if custom_id not in completions:
+                        raise RuntimeError(f"Batch {batch_id} is missing {custom_id}")
+                    completion = completions[custom_id]
+                    agent = request["agent"]
+                    responses.append(
+                        Response(
+                            messages=[
+                                {"role": agent.name, "content": completion.content}
+                            ],
+                            agent=agent,
+                            prompt_tokens=completion.prompt_tokens,
+                            completion_tokens=completion.completion_tokens,
+                            latency_seconds=latency_seconds,
+                            queue_seconds=completion.queue_seconds,
+                            retries=completion.retries,
+                        )
+                    )
+                try:
+                    pending[index] = turns[index].send(
+                        responses if isinstance(pending[index], list) else responses[0]
+                    )
+                except StopIteration as stop:
+                    results[index] = stop.value
+                    del pending[index]
+            step += 1
+        return [result for result in results if result is not None]
@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import List, Optional
+
+from agent_client import AgentClient, AsyncAgentClient
+from backends import AsyncSimulatedBackend, SimulatedBackend
+from candidate_tracker import load_knowledge_base
+from game import Game
+from runner import run_games
+from utils import Agent, GameResult, GameVariables
+
+GAME_VARIABLES = GameVariables(
+    host_agent_additional_instructions="""The secret topic is {topic} and the user is trying to guess it.
+    You must answer the user's questions with yes or no truthfully.""",
+)
+
+
+def bench_agent_client(n_calls: int) -> float:
+    client = AgentClient(backend=SimulatedBackend())
+    agent = Agent(name="Guessing Agent", instructions="guessing agent")
+    chat_history = [
+        {"role": "Host Agent" if i % 2 == 0 else "Guessing Agent", "content": "Yes."}
+        for i in range(20)
+    ]
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        client.run(agent, chat_history=chat_history)
+    return (time.perf_counter() - start) / n_calls
+
+
+def bench_model_dump(results: List[GameResult]) -> float:
+    start = time.perf_counter()
+    for result in results:
+        result.model_dump()
+    return (time.perf_counter() - start) / len(results)
+
+
+def bench_sync_game(
+    n_games: int,
+    backend: SimulatedBackend,
+    game_variables: GameVariables = GAME_VARIABLES,
+) -> float:
+    client = AgentClient(backend=backend)
+    start = time.perf_counter()
+    for _ in range(n_games):
+        Game(game_variables, client=client, verbose=False).run()
+    return (time.perf_counter() - start) / n_games
+
+
+async def bench_async_games(
+    n_games: int,
+    backend: AsyncSimulatedBackend,
+    game_variables: GameVariables = GAME_VARIABLES,
+    compact: bool = False,
+) -> tuple[float, List[GameResult]]:
+    client = AsyncAgentClient(backend=backend)
+    start = time.perf_counter()
+    results = await run_games(
+        [game_variables] * n_games,
+        concurrency=n_games,
+        client=client,
+        verbose=False,
+        compact=compact,
+    )
+    return time.perf_counter() - start, results
+
+
+def memory_per_game(
+    n_games: int,
+    backend: AsyncSimulatedBackend,
+    game_variables: GameVariables = GAME_VARIABLES,
+    compact: bool = False,
+) -> float:
+    tracemalloc.start()
+    asyncio.run(bench_async_games(n_games, backend, game_variables, compact))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / n_games
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the game engine against the offline simulated backend."
+    )
+    parser.add_argument("--games", default="1,100,10000")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--questions", type=int, default=12)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="collect results as transcript.CompactGameResult",
+    )
+    parser.add_argument(
+        "--candidate-tracking",
+        action="store_true",
+        help="guess with the local knowledge base, the host answers from it too",
+    )
+    args = parser.parse_args(argv)
+    game_variables = GAME_VARIABLES.model_copy(
+        update={"candidate_tracking": args.candidate_tracking}
+    )
+
+    def backend(backend_class):
+        return backend_class(
+            questions_before_guess=args.questions,
+            latency=args.latency,
+            jitter=args.jitter,
+            seed=0,
+            knowledge_base=load_knowledge_base() if args.candidate_tracking else None,
+        )
+
+    print(f"AgentClient.run: {bench_agent_client(10_000) * 1e6:.1f} us/call")
+    print(
+        f"Game.run (sync): {bench_sync_game(100, backend(SimulatedBackend), game_variables) * 1e3:.2f} ms/game"
+    )
+    print(
+        f"{'games':>8} {'games/s':>10} {'turn overhead (us)':>20} {'memory/game (KiB)':>18} {'questions/game':>15}"
+    )
+    results: List[GameResult] = []
+    for n_games in [int(n) for n in args.games.split(",")]:
+        elapsed, results = asyncio.run(
+            bench_async_games(n_games, backend(AsyncSimulatedBackend), game_variables)
+        )
+        turns = sum(len(result.chat_history) for result in results)
+        # Agent calls of one game run back to back, so the simulated latency on
+        # the critical path is paid once per turn of the longest game.
+        critical_path = (
+            max(len(result.chat_history) for result in results) * args.latency
+        )
+        overhead = max(0.0, elapsed - critical_path) / turns
+        memory = (
+            "-"
+            if args.no_memory
+            else f"{memory_per_game(n_games, backend(AsyncSimulatedBackend), game_variables, args.compact) / 1024:.1f}"
+        )
+        questions = sum(result.number_of_questions or 0 for result in results)
+        print(
+            f"{n_games:>8} {n_games / elapsed:>10.1f} {overhead * 1e6:>20.1f} {memory:>18} {questions / n_games:>15.1f}"
+        )
+        if n_games == max(int(n) for n in args.games.split(",")):
+            print(
+                f"GameResult.model_dump: {bench_model_dump(results) * 1e6:.1f} us/game"
+            )
+
+
+if __name__ == "__main__":
+    main()
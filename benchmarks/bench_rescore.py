@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import List, Optional
+
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend
+from rescore import JUDGES, rescore
+from runner import run_games
+from utils import GameVariables, config_hash
+
+TOPICS = ["penguin", "polar bear", "apple", "strawberry", "notebook"]
+TEMPERATURES = [0.2, 0.5, 0.8, 1.1]
+
+
+def write_archive(path: str, n_games: int, n_distinct: int) -> None:
+    # Plays n_distinct simulated games per config once and writes them as a
+    # sweep checkpoint, repeated under fresh ids up to n_games records.
+    cells = [
+        GameVariables(topic=topic, guessing_agent_temperature=temperature)
+        for topic in TOPICS
+        for temperature in TEMPERATURES
+    ]
+    games = []
+    for game_variables in cells:
+        results = asyncio.run(
+            run_games(
+                [game_variables] * n_distinct,
+                client=AsyncAgentClient(
+                    backend=AsyncSimulatedBackend(topic=game_variables.topic, seed=0)
+                ),
+                verbose=False,
+            )
+        )
+        games += [(game_variables, result) for result in results]
+    with open(path, "w", encoding="utf-8") as f:
+        for run_index in range(n_games):
+            game_variables, result = games[run_index % len(games)]
+            record = {
+                "config_hash": config_hash(game_variables),
+                "run_index": run_index,
+                "game_variables": game_variables.model_dump(),
+                "result": {**result.model_dump(), "id": str(uuid.uuid4())},
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark re-scoring a synthetic archive of stored games."
+    )
+    parser.add_argument("--games", type=int, default=100_000)
+    parser.add_argument("--distinct", type=int, default=20)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "archive.jsonl")
+        write_archive(path, args.games, args.distinct)
+        size = os.path.getsize(path) / 2**20
+        print(f"archive: {args.games} games, {size:.0f} MiB")
+        for judge in JUDGES:
+            start = time.process_time()
+            summary = rescore([path], judge=judge)
+            elapsed = time.process_time() - start
+            print(
+                f"--judge {judge}: {len(summary)} configs in {elapsed:.2f}s CPU "
+                f"({args.games / elapsed:,.0f} games/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+# Short command lines our pipelines run and the wall-clock budget (ms) each
+# must start within, plus modules none of them may import.
+COMMANDS: List[Tuple[List[str], float]] = [
+    (["cli.py", "--help"], 150),
+    (["cli.py", "selfplay", "--help"], 150),
+    (["cli.py", "sweep", "--help"], 1000),
+    (["cli.py", "report", "--help"], 1000),
+    (["cli.py", "report", "/dev/null"], 1000),
+    (["cli.py", "sweep", "summary", "/dev/null"], 1000),
+]
+FORBIDDEN_MODULES = {"openai", "httpx", "dotenv", "scipy.stats"}
+# Re-scoring never plays a game, so it must not load the game engine either.
+OFFLINE_FORBIDDEN_MODULES = {"game", "agent_client", "backends"}
+
+
+def imported_modules(command: List[str]) -> Dict[str, int]:
+    # Cumulative import time in microseconds per top-level import, from
+    # python -X importtime.
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", *command],
+        capture_output=True,
+        text=True,
+    ).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def startup_seconds(command: List[str], repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *command], capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Time how long short CLI invocations take to start, against a budget."
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--budget-scale",
+        type=float,
+        default=1.0,
+        help="multiply every budget, e.g. on slower CI machines",
+    )
+    args = parser.parse_args(argv)
+    failures = []
+    print(f"{'command':<40} {'median (ms)':>12} {'budget (ms)':>12}  heaviest imports")
+    for command, budget_ms in COMMANDS:
+        elapsed_ms = startup_seconds(command, args.repeats) * 1e3
+        modules = imported_modules(command)
+        heaviest = sorted(
+            (name for name in modules if "." not in name),
+            key=modules.__getitem__,
+            reverse=True,
+        )[:3]
+        forbidden: Set[str] = FORBIDDEN_MODULES & set(modules)
+        if command[1] == "report":
+            forbidden |= OFFLINE_FORBIDDEN_MODULES & set(modules)
+        budget_ms *= args.budget_scale
+        print(
+            f"{' '.join(command):<40} {elapsed_ms:>12.0f} {budget_ms:>12.0f}  "
+            + ", ".join(f"{name} {modules[name] / 1e3:.0f} ms" for name in heaviest)
+        )
+        if elapsed_ms > budget_ms:
+            failures.append(f"{' '.join(command)} took {elapsed_ms:.0f} ms")
+        if forbidden:
+            failures.append(f"{' '.join(command)} imported {', '.join(forbidden)}")
+    if failures:
+        sys.exit("over budget: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+from typing import Callable, List, Optional, Sequence
+
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend
+from runner import run_games
+from transcript import CompactGameResult, decode_result, encode_result
+from utils import GameResult, GameVariables
+
+GAME_VARIABLES = GameVariables(compact_history=True)
+
+
+def retained_bytes(build: Callable[[], list]) -> float:
+    # Memory still held by what build returns, per item.
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(items)
+
+
+def seconds_per_item(function: Callable, items: Sequence) -> float:
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare GameResult with the compact transcript records: memory per game and (de)serialization time."
+    )
+    parser.add_argument("--games", type=int, default=2000)
+    args = parser.parse_args(argv)
+    results: List[GameResult] = asyncio.run(
+        run_games(
+            [GAME_VARIABLES] * args.games,
+            client=AsyncAgentClient(backend=AsyncSimulatedBackend(seed=0)),
+            verbose=False,
+        )
+    )
+    compact = [CompactGameResult.from_result(result) for result in results]
+    lines = [json.dumps(result.model_dump()) for result in results]
+    blobs = [encode_result(game) for game in compact]
+
+    print(f"{'':<42} {'GameResult':>12} {'compact':>12}")
+    # Results loaded back from disk, so no string is shared between games.
+    memory = (
+        retained_bytes(
+            lambda: [GameResult.model_validate_json(line) for line in lines]
+        ),
+        retained_bytes(lambda: [decode_result(blob) for blob in blobs]),
+    )
+    print(
+        f"{'memory per held game (KiB)':<42} {memory[0] / 1024:>12.1f} {memory[1] / 1024:>12.1f}"
+    )
+    size = (
+        sum(map(len, lines)) / len(lines),
+        sum(map(len, blobs)) / len(blobs),
+    )
+    print(
+        f"{'serialized size per game (KiB)':<42} {size[0] / 1024:>12.1f} {size[1] / 1024:>12.1f}"
+    )
+    encode = (
+        seconds_per_item(lambda result: json.dumps(result.model_dump()), results),
+        seconds_per_item(encode_result, compact),
+    )
+    print(
+        f"{'serialize (us/game)':<42} {encode[0] * 1e6:>12.1f} {encode[1] * 1e6:>12.1f}"
+    )
+    decode = (
+        seconds_per_item(GameResult.model_validate_json, lines),
+        seconds_per_item(decode_result, blobs),
+    )
+    print(
+        f"{'deserialize (us/game)':<42} {decode[0] * 1e6:>12.1f} {decode[1] * 1e6:>12.1f}"
+    )
+    print(
+        f"{'GameResult -> compact -> GameResult (us/game)':<42} {'':>12} "
+        f"{seconds_per_item(lambda result: CompactGameResult.from_result(result).to_result(), results) * 1e6:>12.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import json
+import resource
+import time
+import tracemalloc
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend
+from server import GameServer, SessionStore
+
+
+async def http_request(
+    port: int, method: str, path: str, body: Optional[dict] = None
+) -> Tuple[int, bytes, float]:
+    # Returns the status, the response body and the time to its first byte.
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    start = time.perf_counter()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode(
+            "latin-1"
+        )
+        + payload
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    first_byte = await reader.read(1)
+    time_to_first_byte = time.perf_counter() - start
+    rest = await reader.read()
+    writer.close()
+    return status, first_byte + rest, time_to_first_byte
+
+
+async def open_sessions(port: int, n_sessions: int, concurrency: int) -> List[str]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def open_session() -> Optional[str]:
+        async with semaphore:
+            status, body, _ = await http_request(
+                port, "POST", "/sessions", {"mode": "guess", "topic": "penguin"}
+            )
+        return json.loads(body)["session_id"] if status == 201 else None
+
+    session_ids = await asyncio.gather(*(open_session() for _ in range(n_sessions)))
+    return [session_id for session_id in session_ids if session_id]
+
+
+async def play(port: int, session_id: str, n_turns: int) -> Tuple[List[float], int]:
+    # Asks numbered questions until n_turns replies are in or the game ends;
+    # rejected turns are retried after the server's Retry-After.
+    turn_latencies = []
+    rejected = 0
+    question = 1
+    while len(turn_latencies) < n_turns:
+        start = time.perf_counter()
+        status, body, _ = await http_request(
+            port,
+            "POST",
+            f"/sessions/{session_id}/messages",
+            {"content": f"Question {question}: does it have property {question}?"},
+        )
+        if status in (429, 503):
+            rejected += 1
+            await asyncio.sleep(json.loads(body).get("retry_after", 1.0))
+            continue
+        turn_latencies.append(time.perf_counter() - start)
+        question += 1
+        if b'"finished": true' in body:
+            break
+    return turn_latencies, rejected
+
+
+async def load_test(args: argparse.Namespace) -> None:
+    if args.trace_memory:
+        tracemalloc.start()
+    server = GameServer(
+        AsyncAgentClient(
+            backend=AsyncSimulatedBackend(
+                latency=args.latency, jitter=args.latency / 2, seed=0
+            )
+        ),
+        store=SessionStore(max_sessions=args.idle + args.active),
+        max_active_turns=args.max_active_turns,
+    )
+    port = await server.start(port=0)
+    start = time.perf_counter()
+    idle = await open_sessions(port, args.idle, args.concurrency)
+    elapsed = time.perf_counter() - start
+    print(
+        f"opened {len(idle)} idle sessions in {elapsed:.1f}s, "
+        f"{server.store.total_bytes / max(1, len(idle)) / 1024:.1f} KiB/session estimated"
+    )
+    if args.trace_memory:
+        memory, _ = tracemalloc.get_traced_memory()
+        print(f"{memory / max(1, len(idle)) / 1024:.1f} KiB/session traced")
+    active = await open_sessions(port, args.active, args.concurrency)
+    start = time.perf_counter()
+    played = await asyncio.gather(
+        *(play(port, session_id, args.turns) for session_id in active)
+    )
+    elapsed = time.perf_counter() - start
+    latencies = np.array([latency for turns, _ in played for latency in turns])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(
+        f"{len(active)} active sessions played {len(latencies)} turns in {elapsed:.1f}s "
+        f"({len(latencies) / elapsed:.0f} turns/s), rejected {sum(r for _, r in played)}"
+    )
+    print(
+        f"turn latency p50 {p50 * 1e3:.0f} ms, p95 {p95 * 1e3:.0f} ms, p99 {p99 * 1e3:.0f} ms "
+        f"(simulated backend {args.latency * 1e3:.0f} ms)"
+    )
+    _, metrics, _ = await http_request(port, "GET", "/metrics")
+    print(f"server metrics: {metrics.decode('utf-8')}")
+    print(
+        f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB"
+    )
+    await server.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test the game server against the offline simulated backend."
+    )
+    parser.add_argument("--idle", type=int, default=5000)
+    parser.add_argument("--active", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--max-active-turns", type=int, default=200)
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="measure memory per idle session with tracemalloc (slows turns down)",
+    )
+    args = parser.parse_args(argv)
+    asyncio.run(load_test(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import threading
+from typing import Optional, Tuple
+
+# US dollars per million (prompt, completion) tokens. Models are matched by
+# the longest listed prefix, unknown models are priced like the most
+# expensive one so a dollar limit is never undercounted.
+PRICES_PER_MILLION_TOKENS = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o-2024-05-13": (5.00, 15.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+DEFAULT_PRICE_PER_MILLION_TOKENS = max(PRICES_PER_MILLION_TOKENS.values())
+
+
+def price(model: str) -> Tuple[float, float]:
+    matches = [
+        prefix for prefix in PRICES_PER_MILLION_TOKENS if model.startswith(prefix)
+    ]
+    if not matches:
+        return DEFAULT_PRICE_PER_MILLION_TOKENS
+    return PRICES_PER_MILLION_TOKENS[max(matches, key=len)]
+
+
+def cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = price(model)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+class BudgetExceeded(Exception):
+    # `budget` is the one that ran out: the game's own or a parent's.
+    def __init__(self, message: str, budget: Optional["Budget"] = None) -> None:
+        super().__init__(message)
+        self.budget = budget
+
+
+class Budget:
+    # Token and dollar limits for everything charged to it. A game's budget
+    # has the sweep's budget as its parent, so a charge counts against both
+    # and a call is only allowed what is left in the tighter of the two.
+    #
+    # Calls are charged when they return, so games running concurrently on
+    # one parent can overshoot it by at most one call each.
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        max_dollars: Optional[float] = None,
+        parent: Optional["Budget"] = None,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.max_dollars = max_dollars
+        self.parent = parent
+        self.tokens = 0
+        self.dollars = 0.0
+        self._lock = threading.Lock()
+
+    def charge(self, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.tokens += prompt_tokens + completion_tokens
+            self.dollars += cost(model, prompt_tokens, completion_tokens)
+        if self.parent is not None:
+            self.parent.charge(model, prompt_tokens, completion_tokens)
+
+    def exhausted(self) -> bool:
+        with self._lock:
+            exhausted = (
+                self.max_tokens is not None and self.tokens >= self.max_tokens
+            ) or (self.max_dollars is not None and self.dollars >= self.max_dollars)
+        return exhausted or (self.parent is not None and self.parent.exhausted())
+
+    def spent(self) -> Optional["Budget"]:
+        # The exhausted budget, a parent's first, None when none is.
+        if self.parent is not None and self.parent.exhausted():
+            return self.parent.spent()
+        return self if self.exhausted() else None
+
+    def own_allowance(self, model: str, prompt_tokens: int) -> Optional[int]:
+        # Like completion_allowance, for this budget's own limits only.
+        allowances = []
+        with self._lock:
+            if self.max_tokens is not None:
+                allowances.append(self.max_tokens - self.tokens - prompt_tokens)
+            if self.max_dollars is not None:
+                prompt_price, completion_price = price(model)
+                dollars_left = (
+                    self.max_dollars - self.dollars - prompt_tokens * prompt_price / 1e6
+                )
+                allowances.append(int(dollars_left * 1e6 / completion_price))
+        return min(allowances) if allowances else None
+
+    def completion_allowance(self, model: str, prompt_tokens: int) -> Optional[int]:
+        # Completion tokens a call with this prompt may still use, None when
+        # nothing limits it.
+        allowances = [self.own_allowance(model, prompt_tokens)]
+        if self.parent is not None:
+            allowances.append(self.parent.completion_allowance(model, prompt_tokens))
+        limits = [allowance for allowance in allowances if allowance is not None]
+        return min(limits) if limits else None
+
+    def tightest(self, model: str, prompt_tokens: int) -> "Budget":
+        # The budget, this one or a parent, that leaves a call the fewest
+        # completion tokens; a parent's on a tie.
+        own = self.own_allowance(model, prompt_tokens)
+        if self.parent is not None:
+            parent_allowance = self.parent.completion_allowance(model, prompt_tokens)
+            if parent_allowance is not None and (
+                own is None or parent_allowance <= own
+            ):
+                return self.parent.tightest(model, prompt_tokens)
+        return self
+
+    def cap(
+        self, model: str, prompt_tokens: int, max_tokens: Optional[int] = None
+    ) -> Optional[int]:
+        # The max_tokens to send with a call, raising BudgetExceeded when the
+        # prompt alone would not fit.
+        allowance = self.completion_allowance(model, prompt_tokens)
+        if allowance is None:
+            return max_tokens
+        if allowance < 1:
+            raise BudgetExceeded(
+                f"a {prompt_tokens} token prompt to {model} does not fit the remaining budget",
+                budget=self.tightest(model, prompt_tokens),
+            )
+        return min(max_tokens, allowance) if max_tokens else allowance
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tokens": self.tokens,
+                "dollars": round(self.dollars, 6),
+                "max_tokens": self.max_tokens,
+                "max_dollars": self.max_dollars,
+            }
@@ -0,0 +1,168 @@
+import functools
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_KNOWLEDGE_BASE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json"
+)
+
+
+def binary_entropy(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+
+
+class KnowledgeBase:
+    # Items x attributes matrix of the probability that the host answers "yes"
+    # to the attribute's question about the item. The last row is a stand-in
+    # for every item outside the base, which is equally likely to be a yes or
+    # a no to anything.
+    def __init__(
+        self,
+        items: List[str],
+        attributes: List[str],
+        questions: List[str],
+        probabilities: np.ndarray,
+    ) -> None:
+        self.items = items
+        self.attributes = attributes
+        self.questions = questions
+        self.probabilities = np.vstack(
+            [probabilities, np.full(len(attributes), 0.5)]
+        ).astype(np.float64)
+        self.log_yes = np.log(self.probabilities)
+        self.log_no = np.log1p(-self.probabilities)
+        self.answer_entropy = binary_entropy(self.probabilities)
+        self.item_index = {item: i for i, item in enumerate(items)}
+        self.question_index = {
+            question.lower(): i for i, question in enumerate(questions)
+        }
+
+    @classmethod
+    def from_json(
+        cls, path: str = DEFAULT_KNOWLEDGE_BASE_PATH, yes_probability: float = 0.95
+    ) -> "KnowledgeBase":
+        # {"attributes": {name: question}, "items": {item: [names answered yes]}};
+        # the host is assumed to answer wrongly 1 - yes_probability of the time.
+        with open(path) as f:
+            data = json.load(f)
+        attributes = list(data["attributes"])
+        items = list(data["items"])
+        probabilities = np.full(
+            (len(items), len(attributes)), 1 - yes_probability, dtype=np.float64
+        )
+        column = {attribute: j for j, attribute in enumerate(attributes)}
+        for i, item in enumerate(items):
+            for attribute in data["items"][item]:
+                probabilities[i, column[attribute]] = yes_probability
+        return cls(
+            items,
+            attributes,
+            [data["attributes"][attribute] for attribute in attributes],
+            probabilities,
+        )
+
+    def answer(self, item: str, question: str) -> Optional[str]:
+        i = self.item_index.get(item.lower())
+        j = self.question_index.get(question.strip().lower())
+        if i is None or j is None:
+            return None
+        return "yes" if self.probabilities[i, j] >= 0.5 else "no"
+
+
+@functools.lru_cache(maxsize=None)
+def load_knowledge_base(path: Optional[str] = None) -> KnowledgeBase:
+    return KnowledgeBase.from_json(path or DEFAULT_KNOWLEDGE_BASE_PATH)
+
+
+def guess_question(item: str) -> str:
+    article = "an" if item[0].lower() in "aeiou" else "a"
+    return f"Is it {article} {item}?"
+
+
+class CandidateTracker:
+    # Posterior over the items of a knowledge base, updated in log space after
+    # every host answer. The next question is the unasked attribute with the
+    # largest expected information gain, computed for all attributes at once;
+    # the top item is guessed once it is likely enough or nothing informative
+    # is left to ask. When the out-of-base row takes over (or every item has
+    # been ruled out) the tracker gives up and the LLM guesser takes over.
+    def __init__(
+        self,
+        knowledge_base: KnowledgeBase,
+        guess_threshold: float = 0.8,
+        fallback_threshold: float = 0.5,
+        out_of_base_prior: float = 0.1,
+        min_information_gain: float = 0.05,
+    ) -> None:
+        self.knowledge_base = knowledge_base
+        self.guess_threshold = guess_threshold
+        self.fallback_threshold = fallback_threshold
+        self.min_information_gain = min_information_gain
+        n_items = len(knowledge_base.items)
+        self.log_posterior = np.full(
+            n_items + 1, np.log((1 - out_of_base_prior) / n_items)
+        )
+        self.log_posterior[-1] = np.log(out_of_base_prior)
+        self.asked = np.zeros(len(knowledge_base.attributes), dtype=bool)
+        self.pending: Optional[Tuple[str, int]] = None
+        self.active = True
+        self.local_questions = 0
+
+    def posterior(self) -> np.ndarray:
+        posterior = np.exp(self.log_posterior - self.log_posterior.max())
+        return posterior / posterior.sum()
+
+    def observe(self, answer: str) -> None:
+        # `answer` is "yes", "no" or "unknown", for the last question asked.
+        if self.pending is None:
+            return
+        kind, index = self.pending
+        self.pending = None
+        if kind == "question" and answer == "yes":
+            self.log_posterior += self.knowledge_base.log_yes[:, index]
+        elif kind == "question" and answer == "no":
+            self.log_posterior += self.knowledge_base.log_no[:, index]
+        elif kind == "guess" and answer != "yes":
+            self.log_posterior[index] = -np.inf
+
+    def information_gain(self, posterior: np.ndarray) -> np.ndarray:
+        # I(item; answer) = H(answer) - E_item[H(answer | item)] per attribute.
+        p_yes = posterior @ self.knowledge_base.probabilities
+        gain = binary_entropy(p_yes) - posterior @ self.knowledge_base.answer_entropy
+        gain[self.asked] = -np.inf
+        return gain
+
+    def next_question(self) -> Optional[str]:
+        if not self.active:
+            return None
+        posterior = self.posterior()
+        best = int(np.argmax(posterior[:-1]))
+        if posterior[-1] >= self.fallback_threshold or not np.isfinite(
+            self.log_posterior[best]
+        ):
+            self.active = False
+            return None
+        gain = self.information_gain(posterior)
+        attribute = int(np.argmax(gain))
+        self.local_questions += 1
+        if (
+            posterior[best] >= self.guess_threshold
+            or gain[attribute] < self.min_information_gain
+        ):
+            self.pending = ("guess", best)
+            return guess_question(self.knowledge_base.items[best])
+        self.asked[attribute] = True
+        self.pending = ("question", attribute)
+        return self.knowledge_base.questions[attribute]
+
+    def top_candidates(self, n: int = 3) -> List[Tuple[str, float]]:
+        posterior = self.posterior()
+        names = self.knowledge_base.items + ["(out of base)"]
+        return [
+            (names[i], round(float(posterior[i]), 4))
+            for i in np.argsort(-posterior)[:n]
+        ]
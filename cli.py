@@ -0,0 +1,128 @@
+import argparse
+import importlib
+import json
+from typing import List, Optional
+
+# Only argparse is imported up front: every subcommand imports what it needs
+# when it runs, so `--help` and the offline tools never load openai (or scipy)
+# and never build a client, and no subcommand needs an API key until an agent
+# is actually called.
+
+# Subcommands that hand the rest of the command line to another module's main.
+DELEGATED = {
+    "sweep": ("sweep", "run, merge or summarize a resumable sweep over game variables"),
+    "report": ("rescore", "re-score stored games and recompute their statistics"),
+    "tournament": (
+        "tournament",
+        "rank several guessing agents playing against one shared host",
+    ),
+}
+BENCHMARKS = {
+    "engine": "benchmarks.bench_engine",
+    "rescore": "benchmarks.bench_rescore",
+    "transcript": "benchmarks.bench_transcript",
+    "server": "benchmarks.load_server",
+    "startup": "benchmarks.bench_startup",
+}
+
+
+def play(args: argparse.Namespace) -> None:
+    from game_on_shell import main
+
+    main()
+
+
+def selfplay(args: argparse.Namespace) -> None:
+    from agent_client import AgentClient
+    from backends import SimulatedBackend
+    from game import Game
+    from main import GAME_VARIABLES
+    from routing import POLICIES
+
+    if args.routing_policy is not None and args.routing_policy not in POLICIES:
+        raise SystemExit(
+            f"unknown routing policy {args.routing_policy!r}, "
+            f"choose from {', '.join(POLICIES)}"
+        )
+    game_variables = GAME_VARIABLES.model_copy(
+        update={
+            "topic": args.topic,
+            "guessing_agent_temperature": args.guessing_agent_temperature,
+            "host_agent_temperature": args.host_agent_temperature,
+            "stream": not args.no_stream,
+            "routing": (
+                POLICIES[args.routing_policy]
+                if args.routing_policy is not None
+                else None
+            ),
+        }
+    )
+    client = (
+        AgentClient(backend=SimulatedBackend(topic=args.topic))
+        if args.simulated
+        else None
+    )
+    for _ in range(args.runs):
+        result = Game(game_variables, client=client, verbose=not args.json).run()
+        if args.json:
+            print(json.dumps(result.model_dump()))
+        else:
+            print(f"Game ID: {result.id}")
+            print(f"Game success: {result.success}")
+            print(f"Number of questions: {result.number_of_questions}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Play, evaluate and benchmark the game of 20 questions."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    play_parser = subparsers.add_parser(
+        "play", help="play against the agent on the shell"
+    )
+    play_parser.set_defaults(handler=play)
+    selfplay_parser = subparsers.add_parser(
+        "selfplay", help="let the guessing agent play against the host agent"
+    )
+    selfplay_parser.add_argument("--topic", default="pear")
+    selfplay_parser.add_argument(
+        "--guessing-agent-temperature", type=float, default=0.8
+    )
+    selfplay_parser.add_argument("--host-agent-temperature", type=float, default=0.8)
+    selfplay_parser.add_argument("--runs", type=int, default=1)
+    selfplay_parser.add_argument("--no-stream", action="store_true")
+    selfplay_parser.add_argument(
+        "--routing-policy", help="one of the policies in routing.POLICIES"
+    )
+    selfplay_parser.add_argument(
+        "--simulated",
+        action="store_true",
+        help="play against the offline simulated backend instead of OpenAI",
+    )
+    selfplay_parser.add_argument(
+        "--json", action="store_true", help="print each GameResult as a JSON line"
+    )
+    selfplay_parser.set_defaults(handler=selfplay)
+    # Delegated subcommands parse their own arguments (and --help).
+    for command, (_, description) in DELEGATED.items():
+        subparsers.add_parser(command, help=description, add_help=False)
+    bench_parser = subparsers.add_parser(
+        "bench", help="run one of the benchmarks", add_help=False
+    )
+    bench_parser.add_argument("benchmark", choices=list(BENCHMARKS))
+    args, rest = parser.parse_known_args(argv)
+
+    if args.command in DELEGATED:
+        module_name = DELEGATED[args.command][0]
+    elif args.command == "bench":
+        module_name = BENCHMARKS[args.benchmark]
+    else:
+        if rest:
+            parser.error(f"unrecognized arguments: {' '.join(rest)}")
+        args.handler(args)
+        return
+    importlib.import_module(module_name).main(rest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from agent_client import AgentClient, AsyncAgentClient
+from backends import AsyncSimulatedBackend, SimulatedBackend
+from budget import Budget, BudgetExceeded
+from game import Game
+from runner import run_games
+from utils import GameVariables
+
+MODEL = "gpt-4o-mini"
+
+
+def test_cap_is_the_tighter_of_a_budget_and_its_parent():
+    parent = Budget(max_tokens=1000)
+    budget = Budget(max_tokens=500, parent=parent)
+    assert budget.cap(MODEL, 100, 40) == 40
+    assert budget.cap(MODEL, 100) == 400
+    parent.charge(MODEL, 700, 0)
+    assert budget.cap(MODEL, 100) == 200
+    with pytest.raises(BudgetExceeded) as error:
+        budget.cap(MODEL, 300)
+    assert error.value.budget is parent
+
+
+def test_dollar_limit_caps_completion_tokens():
+    budget = Budget(max_dollars=0.001)
+    # $0.60 per million completion tokens after $0.15 per million prompt tokens.
+    assert budget.cap(MODEL, 1000) == int((0.001 - 1000 * 0.15e-6) * 1e6 / 0.60)
+
+
+def test_game_over_its_own_budget_is_a_failure():
+    game = Game(
+        GameVariables(max_game_tokens=1500),
+        client=AgentClient(backend=SimulatedBackend()),
+        verbose=False,
+    )
+    result = game.run()
+    assert result.status == "over_budget"
+    assert not result.success
+    assert not game.cut_off
+    assert result.prompt_tokens + result.completion_tokens <= 1500
+
+
+def test_shared_budget_stops_scheduling_games():
+    budget = Budget(max_tokens=5000)
+    reported = []
+    results = asyncio.run(
+        run_games(
+            [GameVariables()] * 4,
+            concurrency=1,
+            client=AsyncAgentClient(backend=AsyncSimulatedBackend()),
+            verbose=False,
+            on_result=lambda index, result: reported.append(index),
+            budget=budget,
+        )
+    )
+    statuses = [result.status for result in results]
+    assert statuses[:3] == ["completed", "completed", "over_budget"]
+    # Later games stop at their first call, or are not started once the
+    # budget is spent, and neither kind is reported.
+    assert set(statuses[3:]) <= {"over_budget", "not_scheduled"}
+    assert reported == [0, 1]
+    assert budget.tokens <= 5000
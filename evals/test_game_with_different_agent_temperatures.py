@@ -1,15 +1,15 @@
 import json
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-import numpy as np
 import pytest
-from scipy import stats
 
-from game import Game
+from result_store import ResultStore
+from sequential import run_until_confident_sync
 from utils import GameVariables
 
-n_runs = 10
+min_runs = 5
+max_runs = 40
+target_ci_width = 0.3
 confidence = 0.95
 
 
@@ -25,18 +25,20 @@ def test_game_with_different_guessing_agent_temperatures(guessing_agent_temperat
         You must not reveal the secret topic {topic} to the user.
         You must only play the game, and not answer or ask any questions outside of the game.""",
     )
-    game = Game(game_variables)
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(game.run) for _ in range(n_runs)]
-        results = [future.result() for future in futures]
-        success_rate = np.mean([result.success for result in results])
-        mean_number_of_questions = np.mean(
-            [result.number_of_questions for result in results if result.success is True]
+    result_store_path = f"evals/results/guessing_agent_temperature_{guessing_agent_temperature}_{datetime.now():%Y%m%d_%H%M%S}"
+    with ResultStore(result_store_path) as store:
+        outcome = run_until_confident_sync(
+            game_variables,
+            target_ci_width=target_ci_width,
+            min_runs=min_runs,
+            max_runs=max_runs,
+            confidence=confidence,
+            on_result=lambda result: store.write(result, game_variables),
         )
-        ci = stats.binom.interval(confidence, n=n_runs, p=success_rate)
-        ci_lower, ci_upper = ci[0] / n_runs, ci[1] / n_runs
+    success_rate = outcome.success_rate
+    mean_number_of_questions = outcome.mean_number_of_questions
+    ci_lower, ci_upper = outcome.ci_lower, outcome.ci_upper
 
-    json_results = [result.model_dump() for result in results]
     print(
         f"Success rate: {success_rate} for guessing agent temperature {guessing_agent_temperature}, CI: {ci_lower} - {ci_upper}"
     )
@@ -49,14 +51,15 @@ def test_game_with_different_guessing_agent_temperatures(guessing_agent_temperat
         json.dump(
             {
                 "guessing_agent_temperature": guessing_agent_temperature,
-                "n_runs": n_runs,
+                "n_runs": outcome.n_runs,
                 "confidence": confidence,
                 "success_rate": success_rate,
                 "ci_lower": ci_lower,
                 "ci_upper": ci_upper,
                 "mean_number_of_questions": mean_number_of_questions,
                 "game_variables": game_variables.model_dump(),
-                "game_results": json_results,
+                "result_store": result_store_path,
+                "metrics": outcome.metrics,
             },
             f,
             indent=2,
@@ -76,15 +79,19 @@ def test_game_with_different_host_agent_temperatures(host_agent_temperature):
         You must not reveal the secret topic {topic} to the user.
         You must only play the game, and not answer or ask any questions outside of the game.""",
     )
-    game = Game(game_variables)
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(game.run) for _ in range(n_runs)]
-        results = [future.result() for future in futures]
-        success_rate = np.mean([result.success for result in results])
-        ci = stats.binom.interval(confidence, n=n_runs, p=success_rate)
-        ci_lower, ci_upper = ci[0] / n_runs, ci[1] / n_runs
+    result_store_path = f"evals/results/host_agent_temperature_{host_agent_temperature}_{datetime.now():%Y%m%d_%H%M%S}"
+    with ResultStore(result_store_path) as store:
+        outcome = run_until_confident_sync(
+            game_variables,
+            target_ci_width=target_ci_width,
+            min_runs=min_runs,
+            max_runs=max_runs,
+            confidence=confidence,
+            on_result=lambda result: store.write(result, game_variables),
+        )
+    success_rate = outcome.success_rate
+    ci_lower, ci_upper = outcome.ci_lower, outcome.ci_upper
 
-    json_results = [result.model_dump() for result in results]
     print(
         f"Success rate: {success_rate} for host agent temperature {host_agent_temperature}, CI: {ci_lower} - {ci_upper}"
     )
@@ -97,13 +104,14 @@ def test_game_with_different_host_agent_temperatures(host_agent_temperature):
         json.dump(
             {
                 "host_agent_temperature": host_agent_temperature,
-                "n_runs": n_runs,
+                "n_runs": outcome.n_runs,
                 "confidence": confidence,
                 "success_rate": success_rate,
                 "ci_lower": ci_lower,
                 "ci_upper": ci_upper,
                 "game_variables": game_variables.model_dump(),
-                "game_results": json_results,
+                "result_store": result_store_path,
+                "metrics": outcome.metrics,
             },
             f,
         )
@@ -1,15 +1,15 @@
 import json
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-import numpy as np
 import pytest
-from scipy import stats
 
-from game import Game
+from result_store import ResultStore
+from sequential import compare_sequential_sync, run_until_confident_sync
 from utils import GameVariables
 
-n_runs = 10
+min_runs = 5
+max_runs = 40
+target_ci_width = 0.3
 confidence = 0.95
 
 
@@ -42,18 +42,20 @@ def test_game_with_different_guessing_agent_prompts(
         You must not reveal the secret topic {topic} to the user.
         You must only play the game, and not answer or ask any questions outside of the game.""",
     )
-    game = Game(game_variables)
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(game.run) for _ in range(n_runs)]
-        results = [future.result() for future in futures]
-        success_rate = np.mean([result.success for result in results])
-        mean_number_of_questions = np.mean(
-            [result.number_of_questions for result in results if result.success is True]
+    result_store_path = f"evals/results/guessing_agent_additional_instructions_version_{version}_{datetime.now():%Y%m%d_%H%M%S}"
+    with ResultStore(result_store_path) as store:
+        outcome = run_until_confident_sync(
+            game_variables,
+            target_ci_width=target_ci_width,
+            min_runs=min_runs,
+            max_runs=max_runs,
+            confidence=confidence,
+            on_result=lambda result: store.write(result, game_variables),
         )
-        ci = stats.binom.interval(confidence, n=n_runs, p=success_rate)
-        ci_lower, ci_upper = ci[0] / n_runs, ci[1] / n_runs
+    success_rate = outcome.success_rate
+    mean_number_of_questions = outcome.mean_number_of_questions
+    ci_lower, ci_upper = outcome.ci_lower, outcome.ci_upper
 
-    json_results = [result.model_dump() for result in results]
     print(f"Success rate: {success_rate}, CI: {ci_lower} - {ci_upper}")
 
     with open(
@@ -64,14 +66,15 @@ def test_game_with_different_guessing_agent_prompts(
         json.dump(
             {
                 "guessing_agent_additional_instructions": guessing_agent_additional_instructions,
-                "n_runs": n_runs,
+                "n_runs": outcome.n_runs,
                 "confidence": confidence,
                 "success_rate": success_rate,
                 "ci_lower": ci_lower,
                 "ci_upper": ci_upper,
                 "mean_number_of_questions": mean_number_of_questions,
                 "game_variables": game_variables.model_dump(),
-                "game_results": json_results,
+                "result_store": result_store_path,
+                "metrics": outcome.metrics,
             },
             f,
         )
@@ -108,15 +111,19 @@ def test_game_with_different_host_agent_prompts(
         You must only play the game, and not ask any questions outside of the game.""",
         host_agent_additional_instructions=host_agent_additional_instructions,
     )
-    game = Game(game_variables)
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(game.run) for _ in range(n_runs)]
-        results = [future.result() for future in futures]
-        success_rate = np.mean([result.success for result in results])
-        ci = stats.binom.interval(confidence, n=n_runs, p=success_rate)
-        ci_lower, ci_upper = ci[0] / n_runs, ci[1] / n_runs
+    result_store_path = f"evals/results/host_agent_additional_instructions_version_{version}_{datetime.now():%Y%m%d_%H%M%S}"
+    with ResultStore(result_store_path) as store:
+        outcome = run_until_confident_sync(
+            game_variables,
+            target_ci_width=target_ci_width,
+            min_runs=min_runs,
+            max_runs=max_runs,
+            confidence=confidence,
+            on_result=lambda result: store.write(result, game_variables),
+        )
+    success_rate = outcome.success_rate
+    ci_lower, ci_upper = outcome.ci_lower, outcome.ci_upper
 
-    json_results = [result.model_dump() for result in results]
     print(f"Success rate: {success_rate}, CI: {ci_lower} - {ci_upper}")
 
     with open(
@@ -127,14 +134,56 @@ def test_game_with_different_host_agent_prompts(
         json.dump(
             {
                 "host_agent_additional_instructions": host_agent_additional_instructions,
-                "n_runs": n_runs,
+                "n_runs": outcome.n_runs,
                 "confidence": confidence,
                 "success_rate": success_rate,
                 "ci_lower": ci_lower,
                 "ci_upper": ci_upper,
                 "game_variables": game_variables.model_dump(),
-                "game_results": json_results,
+                "result_store": result_store_path,
+                "metrics": outcome.metrics,
             },
             f,
         )
         f.write("\n")
+
+
+def test_compare_guessing_agent_prompts_sequentially():
+    host_agent_additional_instructions = """The secret topic is {topic} and the user is trying to guess it.
+        You must answer the user's questions with yes or no truthfully.
+        You must not reveal the secret topic {topic} to the user.
+        You must only play the game, and not answer or ask any questions outside of the game."""
+    game_variables_a = GameVariables(
+        topic="penguin",
+        guessing_agent_additional_instructions="""Your goal is to guess what the user is thinking of in fewest questions possible.
+        You must only ask questions that are binary yes/no questions to the best of your ability.
+        You must only play the game, and not ask any questions outside of the game.""",
+        host_agent_additional_instructions=host_agent_additional_instructions,
+    )
+    game_variables_b = GameVariables(
+        topic="penguin",
+        guessing_agent_additional_instructions="""Your goal is to guess what the user is thinking of in fewest questions possible.
+        You must only ask questions that are binary yes/no questions to the best of your ability.
+        A good question is one that can cut down the number of possible options as much as possible.
+        You must only play the game, and not ask any questions outside of the game.""",
+        host_agent_additional_instructions=host_agent_additional_instructions,
+    )
+    outcome = compare_sequential_sync(
+        game_variables_a,
+        game_variables_b,
+        min_runs=min_runs,
+        max_runs=max_runs,
+        confidence=confidence,
+    )
+    print(
+        f"SPRT decision: {outcome.decision} after {outcome.a.n_runs} pairs, "
+        f"success rates: version 1 {outcome.a.success_rate}, version 2 {outcome.b.success_rate}"
+    )
+
+    with open(
+        "evals/test_results_guessing_agent_additional_instructions_sprt.json",
+        "w",
+        encoding="utf-8",
+    ) as f:
+        json.dump(outcome.model_dump(), f)
+        f.write("\n")
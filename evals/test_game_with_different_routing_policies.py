@@ -0,0 +1,66 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from result_store import ResultStore
+from routing import POLICIES, summarize_routing
+from sequential import run_until_confident_sync
+from utils import GameVariables
+
+min_runs = 5
+max_runs = 40
+target_ci_width = 0.3
+confidence = 0.95
+
+
+@pytest.mark.parametrize("policy", list(POLICIES))
+def test_game_with_different_routing_policies(policy):
+    game_variables = GameVariables(
+        topic="penguin",
+        guessing_agent_additional_instructions="""Your goal is to guess what the user is thinking of in fewest questions possible.
+        You must only ask questions that are binary yes/no questions to the best of your ability.
+        You must only play the game, and not ask any questions outside of the game.""",
+        host_agent_additional_instructions="""The secret topic is {topic} and the user is trying to guess it.
+        You must answer the user's questions with yes or no truthfully.
+        You must not reveal the secret topic {topic} to the user.
+        You must only play the game, and not answer or ask any questions outside of the game.""",
+        routing=POLICIES[policy],
+    )
+    result_store_path = f"evals/results/routing_{policy}_{datetime.now():%Y%m%d_%H%M%S}"
+    with ResultStore(result_store_path) as store:
+        outcome = run_until_confident_sync(
+            game_variables,
+            target_ci_width=target_ci_width,
+            min_runs=min_runs,
+            max_runs=max_runs,
+            confidence=confidence,
+            on_result=lambda result: store.write(result, game_variables),
+        )
+    routing = summarize_routing(outcome.results)
+    ci_lower, ci_upper = outcome.ci_lower, outcome.ci_upper
+
+    print(
+        f"Success rate: {outcome.success_rate} for routing policy {policy}, CI: {ci_lower} - {ci_upper}, "
+        f"mean cost: ${routing['mean_cost_dollars']:.4f}, mean duration: {routing['mean_duration_seconds']:.1f}s, "
+        f"escalation rate: {routing['escalation_rate']}"
+    )
+
+    with open(f"evals/test_results_routing_{policy}.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "routing_policy": policy,
+                "n_runs": outcome.n_runs,
+                "confidence": confidence,
+                "success_rate": outcome.success_rate,
+                "ci_lower": ci_lower,
+                "ci_upper": ci_upper,
+                "mean_number_of_questions": outcome.mean_number_of_questions,
+                "game_variables": game_variables.model_dump(),
+                "result_store": result_store_path,
+                "routing": routing,
+                "metrics": outcome.metrics,
+            },
+            f,
+        )
+        f.write("\n")
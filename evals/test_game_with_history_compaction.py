@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from result_store import ResultStore
+from sequential import run_until_confident_sync
+from utils import GameVariables
+
+min_runs = 5
+max_runs = 40
+target_ci_width = 0.3
+confidence = 0.95
+
+
+@pytest.mark.parametrize(
+    "compact_history, raw_turns_to_keep", [(False, 0), (True, 1), (True, 3)]
+)
+def test_game_with_history_compaction(compact_history, raw_turns_to_keep):
+    game_variables = GameVariables(
+        compact_history=compact_history,
+        raw_turns_to_keep=raw_turns_to_keep,
+        guessing_agent_additional_instructions="""Your goal is to guess what the user is thinking of in fewest questions possible.
+        You must only ask questions that are binary yes/no questions to the best of your ability.
+        You must only play the game, and not ask any questions outside of the game.""",
+        host_agent_additional_instructions="""The secret topic is {topic} and the user is trying to guess it.
+        You must answer the user's questions with yes or no truthfully.
+        You must not reveal the secret topic {topic} to the user.
+        You must only play the game, and not answer or ask any questions outside of the game.""",
+    )
+    history_mode = (
+        f"compact_{raw_turns_to_keep}_raw_turns" if compact_history else "full"
+    )
+    result_store_path = (
+        f"evals/results/history_{history_mode}_{datetime.now():%Y%m%d_%H%M%S}"
+    )
+    with ResultStore(result_store_path) as store:
+        outcome = run_until_confident_sync(
+            game_variables,
+            target_ci_width=target_ci_width,
+            min_runs=min_runs,
+            max_runs=max_runs,
+            confidence=confidence,
+            on_result=lambda result: store.write(result, game_variables),
+        )
+    success_rate = outcome.success_rate
+    mean_number_of_questions = outcome.mean_number_of_questions
+    mean_prompt_tokens = np.mean([result.prompt_tokens for result in outcome.results])
+    mean_completion_tokens = np.mean(
+        [result.completion_tokens for result in outcome.results]
+    )
+    ci_lower, ci_upper = outcome.ci_lower, outcome.ci_upper
+
+    print(
+        f"Success rate: {success_rate} for {history_mode} history, CI: {ci_lower} - {ci_upper}, "
+        f"prompt tokens per game: {mean_prompt_tokens}, completion tokens per game: {mean_completion_tokens}"
+    )
+
+    with open(
+        f"evals/test_results_history_{history_mode}.json", "w", encoding="utf-8"
+    ) as f:
+        json.dump(
+            {
+                "compact_history": compact_history,
+                "raw_turns_to_keep": raw_turns_to_keep,
+                "n_runs": outcome.n_runs,
+                "confidence": confidence,
+                "success_rate": success_rate,
+                "ci_lower": ci_lower,
+                "ci_upper": ci_upper,
+                "mean_number_of_questions": mean_number_of_questions,
+                "mean_prompt_tokens": mean_prompt_tokens,
+                "mean_completion_tokens": mean_completion_tokens,
+                "game_variables": game_variables.model_dump(),
+                "result_store": result_store_path,
+                "metrics": outcome.metrics,
+            },
+            f,
+        )
+        f.write("\n")
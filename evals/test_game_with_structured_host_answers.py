@@ -0,0 +1,92 @@
+import json
+from datetime import datetime
+
+import numpy as np
+
+from result_store import ResultStore
+from sequential import run_until_confident_sync
+from utils import HOST_AGENT_NAME, GameVariables
+
+min_runs = 5
+max_runs = 40
+target_ci_width = 0.3
+confidence = 0.95
+
+
+def host_answer_completion_tokens(results):
+    # Completion tokens of the host's answers to questions (turn 0 is its
+    # opening message), including free-text retries of invalid answers.
+    return [
+        call["completion_tokens"]
+        for result in results
+        for call in result.agent_calls
+        if call["agent"] == HOST_AGENT_NAME
+        and call["turn"] > 0
+        and not call["discarded"]
+    ]
+
+
+def test_game_with_structured_host_answers():
+    outcomes = {}
+    for structured_host_answers in (False, True):
+        game_variables = GameVariables(
+            structured_host_answers=structured_host_answers,
+            guessing_agent_additional_instructions="""Your goal is to guess what the user is thinking of in fewest questions possible.
+            You must only ask questions that are binary yes/no questions to the best of your ability.
+            You must only play the game, and not ask any questions outside of the game.""",
+            host_agent_additional_instructions="""The secret topic is {topic} and the user is trying to guess it.
+            You must answer the user's questions with yes or no truthfully.
+            You must not reveal the secret topic {topic} to the user.
+            You must only play the game, and not answer or ask any questions outside of the game.""",
+        )
+        host_answers = "structured" if structured_host_answers else "free_text"
+        result_store_path = (
+            f"evals/results/host_answers_{host_answers}_{datetime.now():%Y%m%d_%H%M%S}"
+        )
+        with ResultStore(result_store_path) as store:
+            outcome = run_until_confident_sync(
+                game_variables,
+                target_ci_width=target_ci_width,
+                min_runs=min_runs,
+                max_runs=max_runs,
+                confidence=confidence,
+                on_result=lambda result: store.write(result, game_variables),
+            )
+        tokens_per_answer = float(
+            np.mean(host_answer_completion_tokens(outcome.results))
+        )
+        print(
+            f"Success rate: {outcome.success_rate} for {host_answers} host answers, CI: {outcome.ci_lower} - {outcome.ci_upper}, "
+            f"completion tokens per host answer: {tokens_per_answer}"
+        )
+        outcomes[host_answers] = {
+            "n_runs": outcome.n_runs,
+            "success_rate": outcome.success_rate,
+            "ci_lower": outcome.ci_lower,
+            "ci_upper": outcome.ci_upper,
+            "mean_number_of_questions": outcome.mean_number_of_questions,
+            "completion_tokens_per_host_answer": tokens_per_answer,
+            "game_variables": game_variables.model_dump(),
+            "result_store": result_store_path,
+            "metrics": outcome.metrics,
+        }
+
+    # Measured against the free-text answers the host gives without the protocol.
+    completion_tokens_saved = (
+        outcomes["free_text"]["completion_tokens_per_host_answer"]
+        - outcomes["structured"]["completion_tokens_per_host_answer"]
+    )
+    print(f"Completion tokens saved per host answer: {completion_tokens_saved}")
+
+    with open(
+        "evals/test_results_structured_host_answers.json", "w", encoding="utf-8"
+    ) as f:
+        json.dump(
+            {
+                "confidence": confidence,
+                "completion_tokens_saved_per_host_answer": completion_tokens_saved,
+                **outcomes,
+            },
+            f,
+        )
+        f.write("\n")
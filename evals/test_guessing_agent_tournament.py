@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from tournament import TournamentSpec, format_leaderboard, run_tournament
+from utils import GameVariables
+
+n_runs = 10
+confidence = 0.95
+
+guessing_agent_additional_instructions = {
+    1: """Your goal is to guess what the user is thinking of in fewest questions possible.
+        You must only ask questions that are binary yes/no questions to the best of your ability.
+        You must only play the game, and not ask any questions outside of the game.""",
+    2: """Your goal is to guess what the user is thinking of in fewest questions possible.
+        You must only ask questions that are binary yes/no questions to the best of your ability.
+        A good question is one that can cut down the number of possible options as much as possible.
+        You must only play the game, and not ask any questions outside of the game.""",
+}
+
+
+def test_guessing_agent_tournament():
+    spec = TournamentSpec(
+        base=GameVariables(
+            host_agent_additional_instructions="""The secret topic is {topic} and the user is trying to guess it.
+        You must answer the user's questions with yes or no truthfully.
+        You must not reveal the secret topic {topic} to the user.
+        You must only play the game, and not answer or ask any questions outside of the game.""",
+        ),
+        contenders={
+            f"version_{version}_temperature_{temperature}": {
+                "guessing_agent_additional_instructions": instructions,
+                "guessing_agent_temperature": temperature,
+            }
+            for version, instructions in guessing_agent_additional_instructions.items()
+            for temperature in [0.2, 0.8, 1.1]
+        },
+        topics=["penguin", "polar bear", "apple", "strawberry", "notebook"],
+        n_runs=n_runs,
+    )
+    outcome = asyncio.run(run_tournament(spec, confidence=confidence))
+
+    print(format_leaderboard(outcome.leaderboard))
+    print(f"Host calls: {outcome.host}")
+
+    with open(
+        "evals/test_results_guessing_agent_tournament.json", "w", encoding="utf-8"
+    ) as f:
+        json.dump({"spec": spec.model_dump(), **outcome.model_dump()}, f)
+        f.write("\n")
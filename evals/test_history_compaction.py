@@ -0,0 +1,64 @@
+import pydantic
+import pytest
+
+from agent_client import AgentClient
+from backends import SimulatedBackend
+from game import Game
+from game_state import GameState
+from utils import GUESSING_AGENT_NAME, HOST_AGENT_NAME, Agent, GameVariables
+
+
+def play(game_variables):
+    client = AgentClient(backend=SimulatedBackend(topic=game_variables.topic))
+    return Game(game_variables, client=client, verbose=False).run()
+
+
+def game_state(raw_turns_to_keep, n_questions):
+    host_agent = Agent(name=HOST_AGENT_NAME, instructions="You are the host agent.")
+    guessing_agent = Agent(name=GUESSING_AGENT_NAME, instructions="Guess.")
+    state = GameState(host_agent, guessing_agent, raw_turns_to_keep=raw_turns_to_keep)
+    state.append({"role": HOST_AGENT_NAME, "content": "Ask your first question."})
+    for number in range(1, n_questions + 1):
+        state.append({"role": GUESSING_AGENT_NAME, "content": f"Question {number}?"})
+        state.append({"role": HOST_AGENT_NAME, "content": "Yes."})
+    return state
+
+
+def test_compacted_game_plays_the_same_game():
+    full = play(GameVariables())
+    compacted = play(GameVariables(compact_history=True))
+    assert compacted.chat_history == full.chat_history
+    assert compacted.success and compacted.number_of_questions == 12
+    assert [fact["answer"] for fact in compacted.ledger] == [
+        fact["answer"] for fact in full.ledger
+    ]
+
+
+def test_prompt_keeps_the_ledger_and_the_last_raw_turns():
+    state = game_state(raw_turns_to_keep=2, n_questions=5)
+    messages = state.messages_for(state.guessing_agent)
+    assert len(messages) == 1 + 1 + 4
+    ledger = messages[1]["content"]
+    assert "1. Question 1? -> yes" in ledger and "3. Question 3? -> yes" in ledger
+    assert "Question 4?" not in ledger
+    assert [message["content"] for message in messages[2:]] == [
+        "Question 4?",
+        "Yes.",
+        "Question 5?",
+        "Yes.",
+    ]
+    assert len(state.messages_for(state.guessing_agent)) < len(
+        state.views[GUESSING_AGENT_NAME]
+    )
+
+
+def test_host_always_sees_the_question_it_answers():
+    state = game_state(raw_turns_to_keep=1, n_questions=3)
+    state.append({"role": GUESSING_AGENT_NAME, "content": "Question 4?"})
+    assert state.messages_for(state.host_agent)[-1]["content"] == "Question 4?"
+
+
+def test_raw_turns_to_keep_must_be_at_least_1():
+    with pytest.raises(pydantic.ValidationError):
+        GameVariables(compact_history=True, raw_turns_to_keep=0)
+    assert play(GameVariables(compact_history=True, raw_turns_to_keep=1)).success
@@ -0,0 +1,74 @@
+import httpx
+import openai
+import pytest
+
+import backends
+from backends import Completion, OpenAIBackend, settle_usage
+from rate_limit import RateLimiter, TokenBucket, configure_rate_limit, rate_limiter
+
+# Refills one token a minute, so the tests see no refill.
+TOKENS_PER_MINUTE = 1.0
+CAPACITY = 1000.0
+
+
+def bucket() -> TokenBucket:
+    return TokenBucket(TOKENS_PER_MINUTE, capacity=CAPACITY)
+
+
+def test_reservation_is_settled_to_the_tokens_used():
+    limiter = RateLimiter()
+    limiter.tokens = bucket()
+    limiter.reserve(300)
+    assert limiter.tokens.tokens == pytest.approx(700, abs=1)
+    limiter.settle(300, 120)
+    assert limiter.tokens.tokens == pytest.approx(880, abs=1)
+    assert limiter.metrics()["requests"] == 1
+
+
+def test_bucket_in_debt_makes_the_caller_wait():
+    tokens = bucket()
+    assert tokens.reserve(CAPACITY) == 0.0
+    # 60 tokens of debt at one token a minute.
+    assert tokens.reserve(60) == pytest.approx(3600, rel=1e-3)
+
+
+def test_stream_cut_short_keeps_its_reservation():
+    configure_rate_limit("test-cut-short", tokens_per_minute=TOKENS_PER_MINUTE)
+    limiter = rate_limiter("test-cut-short")
+    limiter.tokens = bucket()
+    limiter.reserve(300)
+    settle_usage("test-cut-short", 300, Completion())
+    assert limiter.tokens.tokens == pytest.approx(700, abs=1)
+
+
+class FailingCompletions:
+    def __init__(self):
+        self.calls = 0
+        self.with_raw_response = self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        raise openai.APIConnectionError(request=httpx.Request("POST", "https://x"))
+
+
+class FailingClient:
+    def __init__(self):
+        self.completions = FailingCompletions()
+        self.chat = self
+
+
+def test_failed_request_reserves_once_and_gives_it_back(monkeypatch):
+    client = FailingClient()
+    monkeypatch.setattr(backends, "openai_client", lambda: client)
+    configure_rate_limit("test-failing", tokens_per_minute=TOKENS_PER_MINUTE)
+    limiter = rate_limiter("test-failing")
+    limiter.tokens = bucket()
+    limiter.base_backoff = 0.001
+    with pytest.raises(openai.APIConnectionError):
+        OpenAIBackend(max_retries=2).complete(
+            "test-failing", [{"role": "user", "content": "Is it alive?"}], 0.0
+        )
+    assert client.completions.calls == 3
+    metrics = limiter.metrics()
+    assert metrics["requests"] == 1 and metrics["rate_limited"] == 2
+    assert limiter.tokens.tokens == pytest.approx(CAPACITY, abs=1)
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend
+from rescore import parse_record, rescore
+from sweep import SweepGrid, merge_checkpoints, run_sweep
+
+
+def sweep(grid, checkpoint_path, backend_topic="penguin", **kwargs):
+    client = AsyncAgentClient(backend=AsyncSimulatedBackend(topic=backend_topic))
+    return asyncio.run(run_sweep(grid, checkpoint_path, client=client, **kwargs))
+
+
+def test_stricter_judge_rejects_games_won_on_an_alias(tmp_path):
+    checkpoint_path = str(tmp_path / "sweep.jsonl")
+    grid = SweepGrid(base={"topic_aliases": ["flightless bird"]}, n_runs=3)
+    sweep(grid, checkpoint_path, backend_topic="flightless bird")
+    [cascade] = rescore([checkpoint_path])
+    assert cascade["success_rate"] == cascade["stored_success_rate"] == 1.0
+    assert cascade["n_changed"] == 0
+    [exact] = rescore([checkpoint_path], judge="exact")
+    assert exact["success_rate"] == 0.0
+    assert exact["n_changed"] == 3
+    assert exact["question_histogram"] == [0] * 22
+
+
+def test_games_found_twice_are_counted_once(tmp_path):
+    grid = SweepGrid(axes={"host_agent_temperature": [0.0, 0.8]}, n_runs=2)
+    shards = [str(tmp_path / f"sweep_shard_{index}.jsonl") for index in range(2)]
+    for index, shard in enumerate(shards):
+        sweep(grid, shard, shard_index=index, n_shards=2)
+    merged = str(tmp_path / "sweep.jsonl")
+    assert merge_checkpoints(shards, merged) == 4
+    summary = rescore([merged, *shards, str(tmp_path)])
+    assert sorted(cell["n_runs"] for cell in summary) == [2, 2]
+    for cell in summary:
+        assert cell["questions_p50"] == 12
+        assert cell["question_histogram"][12] == 2
+
+
+def test_fast_parse_matches_json(tmp_path):
+    checkpoint_path = str(tmp_path / "sweep.jsonl")
+    sweep(SweepGrid(axes={"max_game_tokens": [None, 1500]}, n_runs=1), checkpoint_path)
+    with open(checkpoint_path, encoding="utf-8") as f:
+        for line in f:
+            record, parsed = json.loads(line), parse_record(line)
+            assert parsed["config_hash"] == record["config_hash"]
+            for key in ("id", "success", "status", "chat_history"):
+                assert parsed["result"][key] == record["result"][key]
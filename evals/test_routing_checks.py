@@ -0,0 +1,34 @@
+from agent_client import AgentClient
+from backends import SimulatedBackend
+from game import Game
+from routing import POLICIES, question_problem
+from utils import GameVariables
+
+
+class ExclaimingBackend(SimulatedBackend):
+    # Guesses without a question mark, and the small model always hedges.
+    def __init__(self) -> None:
+        super().__init__(
+            questions_before_guess=5, model_profiles={"gpt-4o-mini": (1.0, 1.0)}
+        )
+
+    def guessing_reply(self, messages):
+        reply = super().guessing_reply(messages)
+        return f"It's a {self.topic}!" if reply == f"Is it a {self.topic}?" else reply
+
+
+def test_guess_naming_the_topic_is_not_escalated():
+    assert question_problem("It's a penguin!", [], guessed=True) is None
+    assert question_problem("It's a penguin!", []) == "not_a_question"
+    assert question_problem("", [], guessed=True) == "empty"
+
+
+def test_closing_host_reply_is_not_escalated():
+    game_variables = GameVariables(stream=False, routing=POLICIES["cascade_both"])
+    client = AgentClient(backend=ExclaimingBackend())
+    result = Game(game_variables, client=client, verbose=False).run()
+    assert result.success
+    escalations = result.routing["escalations"]
+    assert not [step for step in escalations if step["role"] == "guesser"]
+    # Every answer to a question escalates, the reply to the guess does not.
+    assert [step["question"] for step in escalations] == list(range(1, 5))
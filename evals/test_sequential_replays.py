@@ -0,0 +1,28 @@
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend
+from response_cache import ResponseCache
+from sequential import run_until_confident_sync
+from utils import GameVariables
+
+
+def play(game_variables, cache=None):
+    client = AsyncAgentClient(backend=AsyncSimulatedBackend(seed=0), cache=cache)
+    return run_until_confident_sync(
+        game_variables, min_runs=5, max_runs=10, client=client, verbose=False
+    )
+
+
+def test_cached_temperature_0_games_count_once(tmp_path):
+    game_variables = GameVariables(
+        guessing_agent_temperature=0.0, host_agent_temperature=0.0, stream=False
+    )
+    for _ in range(2):
+        outcome = play(game_variables, ResponseCache(str(tmp_path / "cache.sqlite")))
+        assert len(outcome.results) == 10
+        assert (outcome.n_runs, outcome.n_replayed) == (1, 9)
+        assert outcome.stopped_reason == "max_runs"
+
+
+def test_games_without_cached_calls_all_count():
+    outcome = play(GameVariables(host_agent_temperature=0.0, stream=False))
+    assert (outcome.n_runs, outcome.n_replayed) == (10, 0)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import struct
+
+import httpx
+import openai
+import pytest
+
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend
+from server import MAX_BODY_BYTES, GameServer
+
+
+def test_host_session_without_topic_plays_past_its_first_question():
+    async def play():
+        server = GameServer(
+            AsyncAgentClient(backend=AsyncSimulatedBackend(latency=0.0, seed=0))
+        )
+        created = await server.create_session(json.dumps({"mode": "host"}).encode())
+        session = server.session(created["session_id"])
+        assert not session.finished
+        # Questions 2 and 3 are asked, so the game did not end on the first.
+        for _ in range(2):
+            await server.agent_turn(session, "No.")
+            assert not session.finished
+        while not session.finished:
+            await server.agent_turn(session, "No.")
+        return session
+
+    session = asyncio.run(play())
+    assert not session.success
+    assert session.state.number_of_questions > 20
+
+
+class FailingBackend(AsyncSimulatedBackend):
+    # Fails every stream after its first chunk, and unless streams_only
+    # every completion too.
+    def __init__(self, error: Exception, streams_only: bool = False) -> None:
+        super().__init__(latency=0.0, seed=0)
+        self.error = error
+        self.streams_only = streams_only
+
+    async def complete(self, *args, **kwargs):
+        if self.streams_only:
+            return await super().complete(*args, **kwargs)
+        raise self.error
+
+    async def stream(self, *args, **kwargs):
+        async for chunk in super().stream(*args, **kwargs):
+            yield chunk
+            raise self.error
+
+
+async def http_request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+    )
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), head.decode("latin-1"), content
+
+
+def serve(backend, scenario):
+    async def run():
+        server = GameServer(AsyncAgentClient(backend=backend))
+        port = await server.start(port=0)
+        try:
+            return await scenario(server, port)
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def rate_limit_error():
+    return openai.RateLimitError(
+        "rate limited",
+        response=httpx.Response(
+            429, request=httpx.Request("POST", "https://api.openai.com")
+        ),
+        body=None,
+    )
+
+
+@pytest.mark.parametrize(
+    "error, status",
+    [
+        (rate_limit_error(), 429),
+        (openai.APIConnectionError(request=httpx.Request("POST", "https://x")), 503),
+        (RuntimeError("bug"), 500),
+    ],
+)
+def test_agent_errors_get_a_status_code(error, status):
+    async def scenario(server, port):
+        return await http_request(port, "POST", "/sessions", {"mode": "guess"})
+
+    code, head, content = serve(FailingBackend(error), scenario)
+    assert code == status
+    assert json.loads(content)["status"] == status
+    assert ("Retry-After" in head) == (status != 500)
+
+
+def test_agent_error_mid_stream_is_an_error_event():
+    async def scenario(server, port):
+        # The opening message is not streamed, so the session starts.
+        _, _, content = await http_request(port, "POST", "/sessions", {})
+        session_id = json.loads(content)["session_id"]
+        return await http_request(
+            port,
+            "POST",
+            f"/sessions/{session_id}/messages",
+            {"content": "Is it alive?"},
+        )
+
+    code, _, content = serve(
+        FailingBackend(RuntimeError("bug"), streams_only=True), scenario
+    )
+    assert code == 200
+    assert b"event: token" in content
+    assert b"event: error" in content and b'"status": 500' in content
+
+
+def test_oversized_websocket_frame_is_closed_with_1009():
+    async def scenario(server, port):
+        _, _, content = await http_request(port, "POST", "/sessions", {})
+        session_id = json.loads(content)["session_id"]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            f"GET /sessions/{session_id}/ws HTTP/1.1\r\nHost: localhost\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n".encode("latin-1")
+        )
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(struct.pack("!BBQ", 0x81, 0xFF, MAX_BODY_BYTES + 1))
+        frame = await reader.read()
+        writer.close()
+        return frame
+
+    frame = serve(AsyncSimulatedBackend(latency=0.0, seed=0), scenario)
+    assert frame[0] == 0x88
+    assert struct.unpack("!H", frame[2:4])[0] == 1009
@@ -0,0 +1,65 @@
+import pytest
+
+from judge import SuccessJudge, alias_pattern, extract_guess, topic_forms
+
+
+@pytest.mark.parametrize(
+    "topic, guess",
+    [
+        ("cat", "Is it a cart?"),
+        ("seal", "Is it a steal?"),
+        ("bat", "Is it a bait?"),
+        ("horse", "Is it a house?"),
+        ("mouse", "Is it a house?"),
+        ("chain", "Is it a chair?"),
+        ("plane", "Is it a plant?"),
+        ("fountain", "Is it a mountain?"),
+        ("commuter", "Is it a computer?"),
+    ],
+)
+def test_words_a_few_edits_away_are_not_wins(topic, guess):
+    assert SuccessJudge(topic).local_verdict(guess).correct is not True
+
+
+@pytest.mark.parametrize(
+    "topic, guess",
+    [("penguin", "Is it a pengiun?"), ("polar bear", "Is it a polar baer?")],
+)
+def test_typos_are_left_to_the_llm_judge(topic, guess):
+    verdict = SuccessJudge(topic).local_verdict(guess)
+    assert verdict.correct is None
+    assert verdict.stage == "similarity"
+
+
+def test_dissimilar_guesses_are_rejected():
+    assert SuccessJudge("penguin").local_verdict("Is it a pigeon?").correct is False
+
+
+@pytest.mark.parametrize(
+    "topic, text",
+    [
+        ("news", "Is it new?"),
+        ("pants", "Is it a pant?"),
+        ("glasses", "Is it made of glass?"),
+    ],
+)
+def test_words_ending_in_s_are_not_singularized(topic, text):
+    assert not SuccessJudge(topic).matches(text)
+
+
+def test_irregular_plurals_match_their_singular():
+    assert SuccessJudge("mice").matches("Is it a mouse?")
+    assert SuccessJudge("mouse").matches("Are they mice?")
+
+
+def test_article_needs_a_space_before_the_guess():
+    assert extract_guess("Is it ample?") == "ample"
+    assert extract_guess("Is it an apple?") == "apple"
+
+
+def test_empty_topic_matches_nothing():
+    assert topic_forms("", ["polar bear"]) == []
+    assert alias_pattern("").search("Is it a penguin?") is None
+    judge = SuccessJudge("")
+    assert not judge.matches("Is it a penguin?")
+    assert judge.local_verdict("Is it a penguin?").correct is not True
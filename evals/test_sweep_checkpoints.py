@@ -0,0 +1,67 @@
+import asyncio
+
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend
+from budget import Budget
+from rescore import rescore
+from sweep import SweepGrid, read_checkpoint, run_sweep, summarize_checkpoint
+
+GRID = SweepGrid(axes={"host_agent_temperature": [0.0, 0.8]}, n_runs=3)
+
+
+def sweep(grid, checkpoint_path, budget=None):
+    client = AsyncAgentClient(backend=AsyncSimulatedBackend())
+    return asyncio.run(run_sweep(grid, checkpoint_path, client=client, budget=budget))
+
+
+def tasks(checkpoint_path):
+    return sorted(
+        (record["config_hash"], record["run_index"])
+        for record in read_checkpoint(checkpoint_path)
+    )
+
+
+def test_interrupted_sweep_resumes_where_it_stopped(tmp_path):
+    checkpoint_path = str(tmp_path / "sweep.jsonl")
+    assert sweep(GRID, checkpoint_path) == 6
+    with open(checkpoint_path, encoding="utf-8") as f:
+        lines = f.readlines()
+    # A crash after two games, halfway through writing the third.
+    with open(checkpoint_path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:2] + [lines[2][:100]])
+    assert sweep(GRID, checkpoint_path) == 4
+    assert tasks(checkpoint_path) == sorted(
+        (cell_hash, run_index) for cell_hash, run_index, _ in GRID.tasks()
+    )
+    assert sweep(GRID, checkpoint_path) == 0
+
+
+def test_sweep_cut_off_by_its_budget_resumes_with_more(tmp_path):
+    checkpoint_path = str(tmp_path / "sweep.jsonl")
+    n_played = sweep(GRID, checkpoint_path, Budget(max_tokens=5000))
+    assert 0 < n_played < 6
+    # Games the budget cut off or kept from starting are not checkpointed.
+    statuses = [
+        record["result"]["status"] for record in read_checkpoint(checkpoint_path)
+    ]
+    assert statuses == ["completed"] * n_played
+    assert sweep(GRID, checkpoint_path) == 6 - n_played
+
+
+def test_cell_over_its_game_budget_is_summarized_like_rescore(tmp_path):
+    checkpoint_path = str(tmp_path / "sweep.jsonl")
+    grid = SweepGrid(axes={"max_game_tokens": [None, 1500]}, n_runs=3)
+    assert sweep(grid, checkpoint_path) == 6
+    summary = {
+        cell["config_hash"]: cell for cell in summarize_checkpoint(checkpoint_path)
+    }
+    rescored = {cell["config_hash"]: cell for cell in rescore([checkpoint_path])}
+    assert summary.keys() == rescored.keys() and len(summary) == 2
+    for cell_hash, cell in summary.items():
+        over_budget = cell["game_variables"]["max_game_tokens"] is not None
+        assert cell["n_runs"] == 3
+        assert cell["n_over_budget"] == (3 if over_budget else 0)
+        assert cell["success_rate"] == (0.0 if over_budget else 1.0)
+        for key in ("n_runs", "n_over_budget", "success_rate"):
+            assert rescored[cell_hash][key] == cell[key], key
+        assert rescored[cell_hash]["n_changed"] == 0
@@ -0,0 +1,32 @@
+import pytest
+
+from agent_client import AgentClient
+from backends import SimulatedBackend
+from game import Game
+from routing import POLICIES
+from transcript import CompactGameResult, decode_result, encode_result
+from utils import GameVariables
+
+
+@pytest.mark.parametrize(
+    "game_variables",
+    [
+        GameVariables(),
+        GameVariables(compact_history=True, routing=POLICIES["cascade_both"]),
+        GameVariables(structured_host_answers=True, max_game_tokens=1500),
+    ],
+)
+def test_encoded_result_decodes_to_the_same_game(game_variables):
+    result = Game(
+        game_variables,
+        client=AgentClient(backend=SimulatedBackend(seed=0)),
+        verbose=False,
+    ).run()
+    assert decode_result(encode_result(result)).to_result() == result
+    compact = CompactGameResult.from_result(result)
+    assert decode_result(encode_result(compact)).to_dict() == result.model_dump()
+
+
+def test_decoding_rejects_other_data():
+    with pytest.raises(ValueError):
+        decode_result(b'{"id": "not encoded"}')
@@ -1,23 +1,84 @@
-import re
+import asyncio
+import dataclasses
+import hashlib
+import time
 import uuid
-from collections import defaultdict
-from typing import Any, Callable, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generator, List, Optional, Tuple
 
-from agent_client import AgentClient
-from utils import Agent, GameResult, GameVariables, bcolors
+from agent_client import AgentClient, AsyncAgentClient
+from backends import estimated_request_tokens
+from budget import Budget, BudgetExceeded
+from candidate_tracker import CandidateTracker, load_knowledge_base
+from game_state import GameState, yes_no_answer
+from host_answers import HOST_ANSWER_INSTRUCTIONS, parse_host_answer, render_host_answer
+from judge import (
+    SuccessJudge,
+    Verdict,
+    judge_agent,
+    judge_messages,
+    parse_judge_verdict,
+    verdict_cache,
+)
+from routing import (
+    Router,
+    host_answer_problem,
+    question_problem,
+    structured_answer_problem,
+)
+from semantic_cache import SemanticAnswerCache
+from utils import (
+    GUESSING_AGENT_NAME,
+    HOST_AGENT_NAME,
+    Agent,
+    GameResult,
+    GameVariables,
+    Response,
+    bcolors,
+)
+
+SPECULATIVE_ANSWERS = {"yes": "Yes.", "no": "No."}
 
 
 class Game:
-    def __init__(self, game_variables: GameVariables):
+    def __init__(
+        self,
+        game_variables: GameVariables,
+        client: Optional[Any] = None,
+        verbose: bool = True,
+        host_answer_cache: Optional[SemanticAnswerCache] = None,
+        budget: Optional[Budget] = None,
+    ):
         self.run_id = str(uuid.uuid4())
-        self.client = AgentClient()
+        self._client = client
+        self.host_answer_cache = host_answer_cache
+        self.budget = budget
+        self.cut_off = False
         self.game_variables = game_variables
+        self.verbose = verbose
+        self.judge = SuccessJudge(
+            self.game_variables.topic, self.game_variables.topic_aliases
+        )
+        self.router = Router(self.game_variables)
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = self.default_client()
+        return self._client
 
-    def host_agent_instructions(self) -> str:
+    def default_client(self) -> Any:
+        return AgentClient()
+
+    def host_agent_instructions(self, structured: Optional[bool] = None) -> str:
         topic = self.game_variables.topic
         additional_instructions = (
             self.game_variables.host_agent_additional_instructions.format(topic=topic)
         )
+        if structured is None:
+            structured = self.game_variables.structured_host_answers
+        if structured:
+            additional_instructions += "\n        " + HOST_ANSWER_INSTRUCTIONS
         host_agent_prompt = """You are playing a game of 20 questions as the host agent.
         {additional_instructions}
         """
@@ -34,91 +95,632 @@ class Game:
             additional_instructions=additional_instructions
         )
 
-    def run(self) -> GameResult:
+    def log(self, color: str, text: str) -> None:
+        if self.verbose:
+            print(color + text + bcolors.ENDC)
+
+    def guessed(self, text: str, pos: int = 0, partial: bool = False) -> bool:
+        return self.judge.matches(text, pos, partial)
+
+    def token_printer(self, agent: Agent, color: str) -> Callable[[str, str], bool]:
+        def on_token(delta: str, text: str) -> bool:
+            if self.verbose:
+                if len(text) == len(delta):
+                    print(color + f"{agent.name}: ", end="")
+                print(delta, end="", flush=True)
+            return False
+
+        return on_token
+
+    def guess_detector(self, agent: Agent) -> Callable[[str, str], bool]:
+        print_token = self.token_printer(agent, bcolors.AGENT)
+        longest_match = self.judge.longest_form + 1
+
+        def on_token(delta: str, text: str) -> bool:
+            print_token(delta, text)
+            # Only the tail that the new delta can complete needs rescanning.
+            pos = max(0, len(text) - len(delta) - longest_match)
+            return self.guessed(text, pos, partial=True)
+
+        return on_token
+
+    def request(
+        self,
+        agent: Agent,
+        state: GameState,
+        temperature: float,
+        on_token: Optional[Callable[[str, str], bool]] = None,
+        structured: bool = False,
+        stream: bool = True,
+    ) -> dict:
+        messages = state.messages_for(agent)
+        request = dict(
+            agent=agent,
+            messages=messages,
+            temperature=temperature,
+            json_response=structured,
+        )
+        max_tokens = self.game_variables.host_answer_max_tokens if structured else None
+        if state.budget is not None:
+            max_tokens = state.budget.cap(
+                agent.model, estimated_request_tokens(messages), max_tokens
+            )
+        if max_tokens:
+            request.update(max_tokens=max_tokens)
+        if not structured and stream and self.game_variables.stream:
+            request.update(stream=True, on_token=on_token)
+        return request
+
+    def show(self, color: str, response: Response, streamed: bool = True) -> None:
+        if self.game_variables.stream and streamed:
+            if self.verbose:
+                print(bcolors.ENDC)
+        else:
+            self.log(
+                color,
+                f"{response.messages[-1]['role']}: {response.messages[-1]['content']}",
+            )
+
+    def host_turn(
+        self,
+        host_agent: Agent,
+        state: GameState,
+        on_token: Callable[[str, str], bool],
+        background: bool = False,
+        speculative: Optional[List[dict]] = None,
+        closing: bool = False,
+    ) -> Generator[Any, Any, List[Response]]:
+        temperature = self.game_variables.host_agent_temperature
+        question = state.chat_history.texts[-1] if state.number_of_questions else None
+        agents = self.router.route("host", host_agent, state.number_of_questions)
+        if closing:
+            # Nothing depends on the closing reply, which is rarely a yes/no
+            # answer, so it is never escalated.
+            agents = agents[:1]
+        host_agent = agents[0]
+        # Answers that may still be escalated are checked before they are
+        # shown, so only single-model routes stream.
+        stream = len(agents) == 1
+        if self.host_answer_cache is not None and question is not None:
+            cached_answer = self.host_answer_cache.lookup(
+                self.host_cache_partition(host_agent), question
+            )
+            if cached_answer is not None:
+                # The answer is known already, so there is nothing to speculate on.
+                state.host_cache_hits += 1
+                response = Response(
+                    messages=[{"role": host_agent.name, "content": cached_answer}],
+                    agent=host_agent,
+                )
+                self.show(bcolors.HOST, response, streamed=False)
+                state.add_response(response)
+                return []
+        # Answers to questions use the compact JSON protocol when enabled, the
+        # opening message of the host is always free text.
+        structured = (
+            self.game_variables.structured_host_answers
+            and state.number_of_questions > 0
+        )
+        if not structured:
+            request = self.request(
+                host_agent, state, temperature, on_token, stream=stream
+            )
+            if background:
+                request["background"] = True
+            response, speculated = yield from self.with_speculation(
+                request, speculative
+            )
+            if response is not None:
+                opening = question is None
+                response = yield from self.cascade(
+                    "host",
+                    agents,
+                    state,
+                    response,
+                    lambda text: host_answer_problem(text, opening),
+                    lambda agent: self.request(agent, state, temperature, stream=False),
+                )
+                self.show(bcolors.HOST, response, streamed=stream)
+                state.add_response(response)
+                self.remember_answer(host_agent, question, response)
+            return speculated
+        response, speculated = yield from self.with_speculation(
+            self.request(host_agent, state, temperature, structured=True), speculative
+        )
+        assert response is not None
+        response = yield from self.cascade(
+            "host",
+            agents,
+            state,
+            response,
+            structured_answer_problem,
+            lambda agent: self.request(agent, state, temperature, structured=True),
+        )
+        raw_answer = response.messages[-1]["content"] or ""
+        host_answer = parse_host_answer(raw_answer)
+        if host_answer is None:
+            self.log(
+                bcolors.LOG, "Host answer was not valid, asking again in free text."
+            )
+            state.add_usage(response)
+            # Asked again without the JSON instructions in the system prompt.
+            free_text_agent = (response.agent or host_agent).model_copy(
+                update={"instructions": self.host_agent_instructions(structured=False)}
+            )
+            request = self.request(free_text_agent, state, temperature, on_token)
+            request["messages"] = [
+                {"role": "system", "content": free_text_agent.instructions}
+            ] + request["messages"][1:]
+            structured_tokens = response.completion_tokens
+            response = yield request
+            assert response is not None
+            state.host_answers.append(
+                {
+                    "parsed": False,
+                    "completion_tokens": structured_tokens,
+                    "free_text_completion_tokens": response.completion_tokens,
+                }
+            )
+            self.show(bcolors.HOST, response)
+            state.add_response(response)
+            self.remember_answer(host_agent, question, response)
+            return speculated
+        content = render_host_answer(host_answer)
+        state.host_answers.append(
+            {
+                "parsed": True,
+                "answer": host_answer.answer,
+                "clarification": host_answer.clarification,
+                "completion_tokens": response.completion_tokens,
+            }
+        )
+        response = dataclasses.replace(
+            response, messages=[{"role": host_agent.name, "content": content}]
+        )
+        self.show(bcolors.HOST, response, streamed=False)
+        state.add_response(response)
+        self.remember_answer(host_agent, question, response)
+        return speculated
+
+    def cascade(
+        self,
+        role: str,
+        agents: List[Agent],
+        state: GameState,
+        response: Response,
+        problem: Callable[[str], Optional[str]],
+        build: Callable[[Agent], dict],
+    ) -> Generator[Any, Any, Response]:
+        # `response` came from the first agent of the cascade. While its answer
+        # has a problem, the call is made again with the next agent; the
+        # answers escalated from are charged but discarded.
+        self.router.calls[role] += 1
+        for previous, agent in zip(agents, agents[1:]):
+            reason = problem(response.messages[-1]["content"] or "")
+            if reason is None:
+                break
+            self.log(
+                bcolors.LOG,
+                f"{agent.name} answer from {previous.model} is {reason}, asking {agent.model}.",
+            )
+            state.add_usage(response, discarded=True)
+            self.router.escalate(
+                role, state.number_of_questions, previous.model, agent.model, reason
+            )
+            response = yield build(agent)
+        return response
+
+    def host_cache_partition(self, host_agent: Agent) -> str:
+        # Cached answers are only shared between games whose host would
+        # answer the same way: same topic, model and instructions.
+        instructions = hashlib.sha256(
+            str(host_agent.instructions).encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{self.game_variables.topic}/{host_agent.model}/{instructions}"
+
+    def remember_answer(
+        self, host_agent: Agent, question: Optional[str], response: Response
+    ) -> None:
+        content = response.messages[-1]["content"]
+        if self.host_answer_cache is not None and question is not None and content:
+            self.host_answer_cache.store(
+                self.host_cache_partition(host_agent), question, content
+            )
+
+    def with_speculation(
+        self, request: dict, speculative: Optional[List[dict]]
+    ) -> Generator[Any, Any, Tuple[Optional[Response], List[Response]]]:
+        # Yielding a list of requests asks the driver to run them concurrently.
+        if not speculative:
+            response = yield request
+            return response, []
+        responses = yield [request] + speculative
+        return responses[0], responses[1:]
+
+    def speculative_requests(
+        self, guessing_agent: Agent, state: GameState
+    ) -> List[dict]:
+        # The guessing agent's next question for each possible host answer,
+        # generated while the host is still answering.
+        messages = state.messages_for(guessing_agent)
+        requests = [
+            dict(
+                agent=guessing_agent,
+                messages=messages + [{"role": "user", "content": answer}],
+                temperature=self.game_variables.guessing_agent_temperature,
+                json_response=False,
+            )
+            for answer in SPECULATIVE_ANSWERS.values()
+        ]
+        if state.budget is not None:
+            try:
+                for request in requests:
+                    max_tokens = state.budget.cap(
+                        guessing_agent.model,
+                        estimated_request_tokens(request["messages"]),
+                    )
+                    if max_tokens:
+                        request.update(max_tokens=max_tokens)
+            except BudgetExceeded:
+                return []
+        return requests
+
+    def commit_speculation(
+        self, state: GameState, speculated: List[Response]
+    ) -> Optional[Response]:
+        answer = yes_no_answer(state.chat_history.texts[-1])
+        committed = None
+        for branch, response in zip(SPECULATIVE_ANSWERS, speculated):
+            if branch == answer:
+                committed = response
+            else:
+                state.add_usage(response, discarded=True)
+                state.speculation["wasted_prompt_tokens"] += response.prompt_tokens
+                state.speculation[
+                    "wasted_completion_tokens"
+                ] += response.completion_tokens
+        state.speculation["hits" if committed else "misses"] += 1
+        return committed
+
+    def judge_turn(self, state: GameState, text: str) -> Generator[Any, Any, Verdict]:
+        # The alias matcher and similarity check decide most turns locally;
+        # only undecided guesses go to the LLM judge, once per distinct guess.
+        verdict = self.judge.local_verdict(text)
+        if verdict.correct is not None or verdict.guess is None:
+            return verdict
+        if not self.game_variables.llm_judge:
+            return verdict.model_copy(update={"correct": False})
+        cached = verdict_cache.get(self.game_variables.topic, verdict.guess)
+        if cached is not None:
+            return verdict.model_copy(update={"correct": cached, "stage": "llm_cache"})
+        agent = judge_agent()
+        messages = judge_messages(self.game_variables.topic, verdict.guess)
+        max_tokens: Optional[int] = 20
+        if state.budget is not None:
+            max_tokens = state.budget.cap(
+                agent.model, estimated_request_tokens(messages), max_tokens
+            )
+        response = yield dict(
+            agent=agent,
+            messages=messages,
+            temperature=0.0,
+            json_response=True,
+            max_tokens=max_tokens,
+        )
+        state.add_usage(response)
+        correct = parse_judge_verdict(response.messages[-1]["content"])
+        if correct is not None:
+            verdict_cache.put(self.game_variables.topic, verdict.guess, correct)
+        self.log(bcolors.LOG, f"Judge Agent: {verdict.guess!r} is correct: {correct}")
+        return verdict.model_copy(update={"correct": bool(correct), "stage": "llm"})
+
+    def questions_asked(self, state: GameState) -> List[str]:
+        return [
+            message["content"]
+            for message in state.chat_history
+            if message["role"] == state.guessing_agent.name
+        ]
+
+    def candidate_tracker(self) -> Optional[CandidateTracker]:
+        if not self.game_variables.candidate_tracking:
+            return None
+        return CandidateTracker(
+            load_knowledge_base(self.game_variables.knowledge_base_path)
+        )
+
+    def local_question(
+        self, tracker: CandidateTracker, guessing_agent: Agent, state: GameState
+    ) -> Optional[Response]:
+        # Questions from the knowledge base cost no agent call; None hands the
+        # turn to the LLM guesser.
+        if state.number_of_questions:
+            tracker.observe(yes_no_answer(state.chat_history.texts[-1]))
+        question = tracker.next_question()
+        if question is None:
+            return None
+        return Response(
+            messages=[{"role": guessing_agent.name, "content": question}],
+            agent=guessing_agent,
+        )
+
+    def game_budget(self) -> Optional[Budget]:
+        max_tokens = self.game_variables.max_game_tokens
+        max_dollars = self.game_variables.max_game_dollars
+        if max_tokens is None and max_dollars is None:
+            return self.budget
+        return Budget(max_tokens, max_dollars, parent=self.budget)
+
+    def play(self) -> Generator[dict, Response, GameResult]:
+        # The game logic is written once as a generator that yields the keyword
+        # arguments of the next agent call and receives its Response, so the
+        # sync and async drivers below share every rule of the game.
         host_agent = Agent(
-            name="Host Agent", instructions=self.host_agent_instructions()
+            name=HOST_AGENT_NAME, instructions=self.host_agent_instructions()
         )
         guessing_agent = Agent(
-            name="Guessing Agent",
+            name=GUESSING_AGENT_NAME,
             instructions=self.guessing_agent_instructions(),
         )
-        chat_history: List[dict] = []
+        start = time.perf_counter()
+        state = GameState(
+            host_agent,
+            guessing_agent,
+            raw_turns_to_keep=(
+                self.game_variables.raw_turns_to_keep
+                if self.game_variables.compact_history
+                else None
+            ),
+            budget=self.game_budget(),
+        )
+        host_on_token = self.token_printer(host_agent, bcolors.HOST)
+        guessing_on_token = self.guess_detector(guessing_agent)
+        tracker = self.candidate_tracker()
+        success = False
+        status = "completed"
+        judgement: Optional[Verdict] = None
         try:
             while True:
-                host_agent_response = self.client.run(
-                    host_agent,
-                    chat_history=chat_history,
-                    temperature=self.game_variables.host_agent_temperature,
-                    json_response=False,
+                if state.budget is not None and state.budget.exhausted():
+                    raise BudgetExceeded(
+                        "the budget is spent", budget=state.budget.spent()
+                    )
+                speculate = (
+                    self.game_variables.speculative_questions
+                    and state.number_of_questions > 0
+                    and (tracker is None or not tracker.active)
                 )
-                print(
-                    bcolors.HOST
-                    + f"Host Agent: {host_agent_response.messages[-1]['content']}"
-                    + bcolors.ENDC
+                guessing_agents = self.router.route(
+                    "guesser", guessing_agent, state.number_of_questions
                 )
-                chat_history.extend(host_agent_response.messages)
-
-                guessing_agent_response = self.client.run(
-                    guessing_agent,
-                    chat_history=chat_history,
-                    temperature=self.game_variables.guessing_agent_temperature,
-                    json_response=False,
+                speculated = yield from self.host_turn(
+                    host_agent,
+                    state,
+                    host_on_token,
+                    speculative=(
+                        self.speculative_requests(guessing_agents[0], state)
+                        if speculate
+                        else None
+                    ),
                 )
-                print(
-                    bcolors.AGENT
-                    + f"Guessing Agent: {guessing_agent_response.messages[-1]['content']}"
-                    + bcolors.ENDC
+                guessing_agent_response = (
+                    self.commit_speculation(state, speculated) if speculated else None
                 )
+                local = False
+                if guessing_agent_response is None and tracker is not None:
+                    guessing_agent_response = self.local_question(
+                        tracker, guessing_agent, state
+                    )
+                    local = guessing_agent_response is not None
+                streamed = False
+                if guessing_agent_response is None:
+                    streamed = len(guessing_agents) == 1
+                    guessing_agent_response = yield self.request(
+                        guessing_agents[0],
+                        state,
+                        self.game_variables.guessing_agent_temperature,
+                        guessing_on_token,
+                        stream=streamed,
+                    )
+                if not local:
+                    guessing_agent_response = yield from self.cascade(
+                        "guesser",
+                        guessing_agents,
+                        state,
+                        guessing_agent_response,
+                        lambda text: question_problem(
+                            text, self.questions_asked(state), self.guessed(text)
+                        ),
+                        lambda agent: self.request(
+                            agent,
+                            state,
+                            self.game_variables.guessing_agent_temperature,
+                            stream=False,
+                        ),
+                    )
+                self.show(bcolors.AGENT, guessing_agent_response, streamed=streamed)
 
-                chat_history.extend(guessing_agent_response.messages)
+                state.add_response(guessing_agent_response)
 
                 last_guessing_agent_response = guessing_agent_response.messages[-1][
                     "content"
-                ].lower()
-                number_of_questions = len(
-                    [
-                        message
-                        for message in chat_history
-                        if message["role"] == guessing_agent.name
-                    ]
+                ]
+                number_of_questions = state.number_of_questions
+                verdict = yield from self.judge_turn(
+                    state, last_guessing_agent_response
                 )
-                if re.search(
-                    r"\b" + re.escape(self.game_variables.topic) + r"\b",
-                    last_guessing_agent_response,
-                ):
-                    print(
-                        bcolors.LOG
-                        + f"Guessing Agent guessed the secret topic in {number_of_questions} questions!"
-                        + bcolors.ENDC
+                if verdict.correct:
+                    judgement = verdict
+                    self.log(
+                        bcolors.LOG,
+                        f"Guessing Agent guessed the secret topic in {number_of_questions} questions!",
                     )
                     success = True
                     break
                 if number_of_questions > 20:
-                    print(
-                        bcolors.LOG
-                        + "Game over, too many questions asked."
-                        + bcolors.ENDC
-                    )
+                    self.log(bcolors.LOG, "Game over, too many questions asked.")
                     success = False
                     break
-            host_agent_response = self.client.run(
-                host_agent,
-                chat_history=chat_history,
-                temperature=self.game_variables.host_agent_temperature,
-                json_response=False,
-            )
-            print(
-                bcolors.HOST
-                + f"Host Agent: {host_agent_response.messages[-1]['content']}"
-                + bcolors.ENDC
-            )
-            chat_history.extend(host_agent_response.messages)
+            if self.game_variables.final_host_turn:
+                # When streaming, the async driver runs the host's closing
+                # reply in the background and sends None straight away.
+                yield from self.host_turn(
+                    host_agent,
+                    state,
+                    host_on_token,
+                    background=self.game_variables.stream,
+                    closing=True,
+                )
         except KeyboardInterrupt:
-            print(bcolors.LOG + "Stopping game." + bcolors.ENDC)
+            self.log(bcolors.LOG, "Stopping game.")
             success = False
+            status = "interrupted"
+        except BudgetExceeded as error:
+            # Only the host's closing reply is left once the topic is guessed.
+            if not success:
+                self.log(bcolors.LOG, f"Game over, {error}.")
+                status = "over_budget"
+                # Stopped by the budget shared with other games rather than by
+                # the game's own limits.
+                self.cut_off = (
+                    state.budget is self.budget or error.budget is not state.budget
+                )
+        # Kept so the async driver can record the host's closing reply, when it
+        # ran in the background, and build the result again.
+        self.state = state
+        self.outcome = dict(
+            success=success,
+            status=status,
+            judgement=judgement,
+            tracker=tracker,
+            duration_seconds=time.perf_counter() - start,
+        )
+        return self.game_result(state, **self.outcome)
+
+    def game_result(
+        self,
+        state: GameState,
+        success: bool,
+        status: str,
+        judgement: Optional[Verdict],
+        tracker: Optional[CandidateTracker],
+        duration_seconds: float,
+    ) -> GameResult:
         return GameResult(
             id=self.run_id,
             success=success,
-            number_of_questions=number_of_questions,
-            chat_history=chat_history,
+            status=status,
+            number_of_questions=state.number_of_questions,
+            chat_history=state.chat_history.to_list(),
+            ledger=state.ledger,
+            prompt_tokens=state.prompt_tokens,
+            completion_tokens=state.completion_tokens,
+            cost_dollars=state.cost_dollars,
+            duration_seconds=duration_seconds,
+            host_answers=(
+                state.host_answers
+                if self.game_variables.structured_host_answers
+                else None
+            ),
+            speculation=(
+                state.speculation if self.game_variables.speculative_questions else None
+            ),
+            host_cache_hits=(
+                state.host_cache_hits if self.host_answer_cache is not None else None
+            ),
+            agent_calls=state.agent_calls.to_list(),
+            judgement=judgement.model_dump() if judgement is not None else None,
+            routing=(
+                self.router.summary(state.model_usage) if self.router.active else None
+            ),
+            candidate_tracking=(
+                {
+                    "local_questions": tracker.local_questions,
+                    "fell_back": not tracker.active,
+                    "top_candidates": tracker.top_candidates(),
+                }
+                if tracker is not None
+                else None
+            ),
         )
+
+    def run(self) -> GameResult:
+        turns = self.play()
+        try:
+            request = next(turns)
+            while True:
+                try:
+                    if isinstance(request, list):
+                        with ThreadPoolExecutor(len(request)) as executor:
+                            response = list(
+                                executor.map(
+                                    lambda request: self.client.run(**request), request
+                                )
+                            )
+                    else:
+                        request.pop("background", None)
+                        response = self.client.run(**request)
+                except KeyboardInterrupt:
+                    request = turns.throw(KeyboardInterrupt())
+                    continue
+                request = turns.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+
+class AsyncGame(Game):
+    def __init__(
+        self,
+        game_variables: GameVariables,
+        client: Optional[AsyncAgentClient] = None,
+        verbose: bool = True,
+        host_answer_cache: Optional[SemanticAnswerCache] = None,
+        budget: Optional[Budget] = None,
+    ):
+        super().__init__(
+            game_variables,
+            client=client,
+            verbose=verbose,
+            host_answer_cache=host_answer_cache,
+            budget=budget,
+        )
+        self.background_tasks: List[asyncio.Task] = []
+
+    def default_client(self) -> Any:
+        return AsyncAgentClient()
+
+    async def run(self) -> GameResult:  # type: ignore[override]
+        turns = self.play()
+        try:
+            request = next(turns)
+            while True:
+                if isinstance(request, list):
+                    request = turns.send(
+                        list(
+                            await asyncio.gather(
+                                *(self.client.run(**request) for request in request)
+                            )
+                        )
+                    )
+                elif request.pop("background", False):
+                    self.background_tasks.append(
+                        asyncio.create_task(self.client.run(**request))
+                    )
+                    request = turns.send(None)
+                else:
+                    request = turns.send(await self.client.run(**request))
+        except StopIteration as stop:
+            return stop.value
+
+    async def finish(self, result: GameResult) -> GameResult:
+        # The host's closing reply runs in the background when streaming, so
+        # run returns without it; this waits for it and records it (messages,
+        # tokens, cost, agent call and budget charge) like any other reply.
+        if not self.background_tasks:
+            return result
+        for response in await asyncio.gather(
+            *self.background_tasks, return_exceptions=True
+        ):
+            if isinstance(response, Response):
+                self.show(bcolors.HOST, response)
+                self.state.add_response(response)
+        return self.game_result(self.state, **self.outcome)
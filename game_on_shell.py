@@ -1,21 +1,12 @@
-import os
 from typing import List, Optional
 
-from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
-
+from backends import OpenAIBackend
 from utils import bcolors
 
-load_dotenv()
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
 
 class OpenAIClient:
     def __init__(self) -> None:
-        self.client = OpenAI(
-            api_key=OPENAI_API_KEY,
-        )
+        self.backend = OpenAIBackend()
         self.model = "gpt-4o-2024-05-13"
 
     def generate(
@@ -23,15 +14,12 @@ class OpenAIClient:
         messages: List,
         temperature: Optional[float] = 0.8,
     ) -> str | None:
-        response = self.client.chat.completions.create(
+        return self.backend.complete(
             model=self.model,
             messages=messages,
-            temperature=temperature,
-        )
-        return response.choices[0].message.content
-
+            temperature=temperature if temperature is not None else 0.8,
+        ).content
 
-client = OpenAIClient()
 
 system_prompt = """You are playing a game of 20 questions with the user. 
 You must only play the game, and not answer or ask any questions outside of the game. 
@@ -39,6 +27,7 @@ You start by asking whether the user would like to guess or be asked questions."
 
 
 def main():
+    client = OpenAIClient()
     start_trigger = "Hello!"
     messages = [
         {"role": "system", "content": system_prompt},
@@ -0,0 +1,163 @@
+import re
+from typing import Dict, List, Optional
+
+from budget import Budget, cost
+from transcript import AgentCallLog, Transcript
+from utils import Agent, Response
+
+YES_NO_PATTERN = re.compile(r"^\W*(yes|no)\b", re.IGNORECASE)
+
+
+def yes_no_answer(text: str) -> str:
+    match = YES_NO_PATTERN.match(text or "")
+    return match.group(1).lower() if match else "unknown"
+
+
+class GameState:
+    # Keeps the shared transcript plus one API-ready message list per agent
+    # (system prompt first, own messages as "assistant", the other agent's as
+    # "user"). Each message is mapped once when it is appended, so agent calls
+    # can read their view directly instead of rebuilding it every turn.
+    #
+    # With `raw_turns_to_keep` set, agents instead see a ledger of the earlier
+    # (question, answer) pairs plus only the last few raw turns, so the prompt
+    # stops growing with the whole transcript.
+    #
+    # The transcript and the agent calls are compact records (see
+    # transcript.py); Game.play turns them into GameResult lists at the end.
+    def __init__(
+        self,
+        host_agent: Agent,
+        guessing_agent: Agent,
+        raw_turns_to_keep: Optional[int] = None,
+        budget: Optional[Budget] = None,
+    ) -> None:
+        self.host_agent = host_agent
+        self.guessing_agent = guessing_agent
+        self.raw_turns_to_keep = raw_turns_to_keep
+        self.budget = budget
+        self.chat_history = Transcript()
+        self.views: Dict[str, List[dict]] = {
+            agent.name: [{"role": "system", "content": agent.instructions}]
+            for agent in (host_agent, guessing_agent)
+        }
+        self.ledger: List[dict] = []
+        self.ledger_lines: List[str] = []
+        self.ledger_positions: List[int] = []
+        self.number_of_questions = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_dollars = 0.0
+        self.host_answers: List[dict] = []
+        self.host_cache_hits = 0
+        self.agent_calls = AgentCallLog()
+        # Calls, latency, tokens and cost per model, for GameResult.routing.
+        self.model_usage: Dict[str, dict] = {}
+        self.speculation = {
+            "hits": 0,
+            "misses": 0,
+            "wasted_prompt_tokens": 0,
+            "wasted_completion_tokens": 0,
+        }
+
+    def messages_for(self, agent: Agent) -> List[dict]:
+        view = self.views[agent.name]
+        if self.raw_turns_to_keep is None:
+            return view
+        # A raw turn is one question and its answer.
+        window_start = max(1, len(view) - 2 * self.raw_turns_to_keep)
+        n_facts = 0
+        while (
+            n_facts < len(self.ledger_positions)
+            and self.ledger_positions[n_facts] < window_start
+        ):
+            n_facts += 1
+        if not n_facts:
+            return view[:1] + view[window_start:]
+        ledger_message = {
+            "role": "user",
+            "content": "Questions asked so far and the host's answers:\n"
+            + "\n".join(self.ledger_lines[:n_facts]),
+        }
+        return view[:1] + [ledger_message] + view[window_start:]
+
+    def append(self, message: dict) -> None:
+        if (
+            message["role"] == self.host_agent.name
+            and self.chat_history
+            and self.chat_history.role(-1) == self.guessing_agent.name
+        ):
+            self.record_fact(self.chat_history.texts[-1], message["content"])
+        self.chat_history.append(message["role"], message["content"])
+        for name, view in self.views.items():
+            view.append(
+                {
+                    "role": "assistant" if message["role"] == name else "user",
+                    "content": message["content"],
+                }
+            )
+        if message["role"] == self.guessing_agent.name:
+            self.number_of_questions += 1
+
+    def record_fact(self, question: str, answer: str) -> None:
+        fact = {"question": question, "answer": yes_no_answer(answer)}
+        self.ledger.append(fact)
+        self.ledger_lines.append(
+            f"{len(self.ledger)}. {fact['question']} -> {fact['answer']}"
+        )
+        # Position of the question in the per-agent views (after the system
+        # prompt), used to leave out facts that are still in the raw window.
+        self.ledger_positions.append(len(self.chat_history))
+
+    def extend(self, messages: List[dict]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def add_response(self, response: Response) -> None:
+        self.extend(response.messages)
+        self.add_usage(response)
+
+    def add_usage(self, response: Response, discarded: bool = False) -> None:
+        self.prompt_tokens += response.prompt_tokens
+        self.completion_tokens += response.completion_tokens
+        if response.agent is not None:
+            self.cost_dollars += cost(
+                response.agent.model, response.prompt_tokens, response.completion_tokens
+            )
+            if self.budget is not None:
+                self.budget.charge(
+                    response.agent.model,
+                    response.prompt_tokens,
+                    response.completion_tokens,
+                )
+        if response.latency_seconds is not None and response.agent is not None:
+            usage = self.model_usage.setdefault(
+                response.agent.model,
+                {
+                    "calls": 0,
+                    "latency_seconds": 0.0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost_dollars": 0.0,
+                },
+            )
+            usage["calls"] += 1
+            usage["latency_seconds"] += response.latency_seconds
+            usage["prompt_tokens"] += response.prompt_tokens
+            usage["completion_tokens"] += response.completion_tokens
+            usage["cost_dollars"] += cost(
+                response.agent.model, response.prompt_tokens, response.completion_tokens
+            )
+            # The turn of a question and of the host's answer to it is the
+            # question's number; discarded calls are unused speculation.
+            self.agent_calls.append(
+                self.number_of_questions,
+                response.agent.name,
+                response.latency_seconds,
+                response.queue_seconds,
+                response.prompt_tokens,
+                response.completion_tokens,
+                response.retries,
+                response.cached,
+                discarded,
+            )
@@ -0,0 +1,30 @@
+import json
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ValidationError
+
+HOST_ANSWER_INSTRUCTIONS = """When the user asks a question, reply only with a JSON object of the form
+        {"answer": "yes" | "no" | "unknown", "clarification": "<optional, at most five words>"}"""
+
+
+class HostAnswer(BaseModel):
+    answer: Literal["yes", "no", "unknown"]
+    clarification: Optional[str] = None
+
+
+def parse_host_answer(text: Optional[str]) -> Optional[HostAnswer]:
+    try:
+        data = json.loads(text or "")
+        if isinstance(data, dict) and isinstance(data.get("answer"), str):
+            data["answer"] = data["answer"].strip().lower()
+        return HostAnswer.model_validate(data)
+    except (ValueError, ValidationError):
+        return None
+
+
+def render_host_answer(host_answer: HostAnswer) -> str:
+    # The compact text that goes into the transcript every later turn resends.
+    answer = {"yes": "Yes", "no": "No", "unknown": "I don't know"}[host_answer.answer]
+    if host_answer.clarification:
+        return f"{answer}, {host_answer.clarification.strip().rstrip('.')}."
+    return f"{answer}."
@@ -0,0 +1,243 @@
+import difflib
+import functools
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from utils import Agent
+
+JUDGE_INSTRUCTIONS = """You are the judge of a game of 20 questions.
+You are given the secret topic and the guessing agent's guess.
+Decide whether the guess names the secret topic: synonyms, plurals and more specific kinds of the topic count, a different or broader thing does not.
+Reply only with a JSON object {"correct": true} or {"correct": false}."""
+
+IRREGULAR_PLURALS = {
+    "child": "children",
+    "foot": "feet",
+    "goose": "geese",
+    "man": "men",
+    "mouse": "mice",
+    "person": "people",
+    "tooth": "teeth",
+    "woman": "women",
+    "fish": "fish",
+    "sheep": "sheep",
+    "deer": "deer",
+}
+IRREGULAR_SINGULARS = {
+    plural: singular for singular, plural in IRREGULAR_PLURALS.items()
+}
+GUESS_PATTERN = re.compile(
+    r"\b(?:is it|is this|are they|are you thinking of|could it be|might it be|"
+    r"my guess is|i guess|i think it is|i think it's|is the secret topic)"
+    r"\s+(?:(?:an?|the|some)\s+)?([a-z][a-z' -]{0,40}?)\s*(?:[?.!,]|$)"
+)
+NEVER_PATTERN = re.compile(r"(?!)")
+NON_WORD_PATTERN = re.compile(r"[^a-z0-9 ]+")
+SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    text = NON_WORD_PATTERN.sub(" ", text.lower().replace("-", " "))
+    return SPACE_PATTERN.sub(" ", text).strip()
+
+
+def pluralize(word: str) -> str:
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if re.search(r"[^aeiou]y$", word):
+        return word[:-1] + "ies"
+    if re.search(r"(s|x|z|ch|sh)$", word):
+        return word + "es"
+    if word.endswith("fe"):
+        return word[:-2] + "ves"
+    if word.endswith("f") and not word.endswith("ff"):
+        return word[:-1] + "ves"
+    return word + "s"
+
+
+def topic_forms(topic: str, aliases: Sequence[str] = ()) -> List[str]:
+    # Every alias and its plural; for several words only the last one is
+    # inflected ("polar bear" -> "polar bears"). Singulars are only added for
+    # the irregular plurals, since a word ending in "s" may be singular or
+    # plural only ("news", "glasses"); list other singulars as aliases.
+    # Without a topic there is nothing to guess, whatever the aliases.
+    if not normalize(topic):
+        return []
+    forms = set()
+    for name in [topic, *aliases]:
+        words = normalize(name).split()
+        if not words:
+            continue
+        *head, last = words
+        for inflected in (last, pluralize(last), IRREGULAR_SINGULARS.get(last, last)):
+            if len(inflected) >= 3:
+                forms.add(" ".join([*head, inflected]))
+    return sorted(forms, key=len, reverse=True)
+
+
+@functools.lru_cache(maxsize=4096)
+def alias_pattern(topic: str, aliases: Tuple[str, ...] = ()) -> "re.Pattern[str]":
+    # One alternation over all forms, longest first, compiled once per topic.
+    # Words may be separated by any run of spaces or hyphens.
+    alternatives = [
+        r"[\s-]+".join(re.escape(word) for word in form.split())
+        for form in topic_forms(topic, aliases)
+    ]
+    if not alternatives:
+        # An empty alternation would match everywhere.
+        return NEVER_PATTERN
+    return re.compile(r"\b(?:" + "|".join(alternatives) + r")\b")
+
+
+def edit_distance(a: str, b: str) -> int:
+    # Insertions, deletions, substitutions and swaps of adjacent letters.
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous = previous, current
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if (
+                before is not None
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def typo_tolerance(form: str) -> int:
+    # Edits a guess may be away from a form to possibly be a typo of it: none
+    # up to four letters ("cart" is not a typo of "cat"), then one more per
+    # four letters.
+    return max(0, (len(form.replace(" ", "")) - 1) // 4)
+
+
+def extract_guess(text: str) -> Optional[str]:
+    match = GUESS_PATTERN.search(text.lower())
+    return normalize(match.group(1)) if match else None
+
+
+class Verdict(BaseModel):
+    # `correct` is None when the local stages could not decide.
+    correct: Optional[bool] = None
+    stage: str = "none"
+    guess: Optional[str] = None
+    score: Optional[float] = None
+
+
+class SuccessJudge:
+    # Cascade for "did the guessing agent name the topic": the compiled alias
+    # matcher first, then for guess-shaped questions ("Is it a ...?") a
+    # string similarity between the guess and the topic's forms. A guess a
+    # few edits away may be a typo or another word ("house" for "horse"),
+    # so those, like similar guesses and ones sharing a word with the topic,
+    # are left undecided for the LLM judge (see Game.judge_turn); only
+    # dissimilar guesses are rejected locally.
+    def __init__(
+        self,
+        topic: str,
+        aliases: Sequence[str] = (),
+        reject_similarity: float = 0.6,
+    ) -> None:
+        self.topic = topic
+        self.forms = topic_forms(topic, aliases)
+        self.pattern = alias_pattern(topic, tuple(aliases))
+        self.longest_form = max((len(form) for form in self.forms), default=0)
+        self.form_words = {word for form in self.forms for word in form.split()}
+        self.reject_similarity = reject_similarity
+
+    def matches(self, text: str, pos: int = 0, partial: bool = False) -> bool:
+        # On partial (still streaming) text a match touching the end of the
+        # text does not count yet, the next token could still extend the word.
+        lowered = text.lower()
+        return any(
+            not partial or match.end() < len(lowered)
+            for match in self.pattern.finditer(lowered, pos)
+        )
+
+    def similarity(self, guess: str) -> float:
+        return max(
+            difflib.SequenceMatcher(None, guess, form).ratio() for form in self.forms
+        )
+
+    def is_typo(self, guess: str) -> bool:
+        return any(
+            edit_distance(guess, form) <= typo_tolerance(form) for form in self.forms
+        )
+
+    def local_verdict(self, text: str) -> Verdict:
+        if self.matches(text):
+            return Verdict(correct=True, stage="alias")
+        guess = extract_guess(text)
+        if not guess or not self.forms:
+            return Verdict(correct=False)
+        score = round(self.similarity(guess), 3)
+        shares_word = bool(self.form_words & set(guess.split()))
+        if (
+            score < self.reject_similarity
+            and not shares_word
+            and not self.is_typo(guess)
+        ):
+            return Verdict(correct=False, stage="similarity", guess=guess, score=score)
+        return Verdict(stage="similarity", guess=guess, score=score)
+
+
+def judge_agent() -> Agent:
+    return Agent(name="Judge Agent", instructions=JUDGE_INSTRUCTIONS)
+
+
+def judge_messages(topic: str, guess: str) -> List[dict]:
+    return [
+        {"role": "system", "content": JUDGE_INSTRUCTIONS},
+        {"role": "user", "content": f"Secret topic: {topic}\nGuess: {guess}"},
+    ]
+
+
+def parse_judge_verdict(text: Optional[str]) -> Optional[bool]:
+    try:
+        correct = json.loads(text or "").get("correct")
+    except (ValueError, AttributeError):
+        return None
+    return correct if isinstance(correct, bool) else None
+
+
+class VerdictCache:
+    # LLM judge verdicts per (topic, normalized guess), shared by every game
+    # in the process.
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self.max_entries = max_entries
+        self.verdicts: "OrderedDict[Tuple[str, str], bool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, topic: str, guess: str) -> Optional[bool]:
+        key = (normalize(topic), guess)
+        with self._lock:
+            verdict = self.verdicts.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.verdicts.move_to_end(key)
+            return verdict
+
+    def put(self, topic: str, guess: str, correct: bool) -> None:
+        with self._lock:
+            self.verdicts[(normalize(topic), guess)] = correct
+            if len(self.verdicts) > self.max_entries:
+                self.verdicts.popitem(last=False)
+
+
+verdict_cache = VerdictCache()
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# A span is one agent call, see AgentClient.run for its fields.
+SpanHook = Callable[[dict], None]
+
+PERCENTILES = (50, 95, 99)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_span_hooks: List[SpanHook] = []
+
+
+def add_span_hook(hook: SpanHook) -> None:
+    _span_hooks.append(hook)
+
+
+def remove_span_hook(hook: SpanHook) -> None:
+    _span_hooks.remove(hook)
+
+
+def emit_span(span: dict) -> None:
+    for hook in _span_hooks:
+        hook(span)
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not len(values):
+        return {}
+    points = np.percentile(np.asarray(values, dtype=np.float64), PERCENTILES)
+    return {f"p{q}": float(point) for q, point in zip(PERCENTILES, points)}
+
+
+def summarize_agent_calls(games: Sequence[List[dict]]) -> dict:
+    # `games` holds the `agent_calls` of each GameResult. Latencies are
+    # aggregated per agent, token totals per game.
+    by_agent: Dict[str, List[dict]] = defaultdict(list)
+    tokens_per_game = []
+    for calls in games:
+        tokens_per_game.append(
+            sum(call["prompt_tokens"] + call["completion_tokens"] for call in calls)
+        )
+        for call in calls:
+            by_agent[call["agent"]].append(call)
+    agents = {}
+    for agent, calls in by_agent.items():
+        columns = {
+            field: np.array([call[field] for call in calls], dtype=np.float64)
+            for field in (
+                "latency_seconds",
+                "queue_seconds",
+                "prompt_tokens",
+                "completion_tokens",
+                "retries",
+            )
+        }
+        agents[agent] = {
+            "calls": len(calls),
+            "cached": sum(call["cached"] for call in calls),
+            "discarded": sum(call["discarded"] for call in calls),
+            "retries": int(columns["retries"].sum()),
+            "prompt_tokens": int(columns["prompt_tokens"].sum()),
+            "completion_tokens": int(columns["completion_tokens"].sum()),
+            "latency_seconds": percentiles(columns["latency_seconds"]),
+            "queue_seconds": percentiles(columns["queue_seconds"]),
+        }
+    return {
+        "games": len(games),
+        "tokens_per_game": {
+            "mean": float(np.mean(tokens_per_game)) if tokens_per_game else None,
+            **percentiles(tokens_per_game),
+        },
+        "agents": agents,
+    }
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LiveMetrics:
+    # Span hook that keeps running totals and a latency histogram per
+    # (agent, model), for watching a sweep while it runs.
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series: Dict[Tuple[str, str], dict] = {}
+
+    def __call__(self, span: dict) -> None:
+        key = (span["agent"], span["model"])
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    "calls": 0,
+                    "cached": 0,
+                    "retries": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "latency_seconds_sum": 0.0,
+                    "queue_seconds_sum": 0.0,
+                    "latency_buckets": [0] * len(self.buckets),
+                }
+            series["calls"] += 1
+            series["cached"] += span["cached"]
+            series["retries"] += span["retries"]
+            series["prompt_tokens"] += span["prompt_tokens"]
+            series["completion_tokens"] += span["completion_tokens"]
+            series["latency_seconds_sum"] += span["latency_seconds"]
+            series["queue_seconds_sum"] += span["queue_seconds"]
+            for i, bound in enumerate(self.buckets):
+                if span["latency_seconds"] <= bound:
+                    series["latency_buckets"][i] += 1
+
+    def to_json(self) -> dict:
+        with self.lock:
+            return {
+                "buckets": list(self.buckets),
+                "series": [
+                    {"agent": agent, "model": model, **dict(series)}
+                    for (agent, model), series in self.series.items()
+                ],
+            }
+
+    def prometheus_text(self) -> str:
+        counters = {
+            "calls": "Agent calls.",
+            "cached": "Agent calls answered from the response cache.",
+            "retries": "Retried agent call attempts.",
+            "prompt_tokens": "Prompt tokens used by agent calls.",
+            "completion_tokens": "Completion tokens used by agent calls.",
+            "queue_seconds_sum": "Seconds agent calls waited on the rate limiter.",
+        }
+        lines = []
+        with self.lock:
+            series = [
+                (
+                    f'agent="{escape_label(agent)}",model="{escape_label(model)}"',
+                    values,
+                )
+                for (agent, model), values in self.series.items()
+            ]
+            for field, description in counters.items():
+                name = f"game_agent_{field.removesuffix('_sum')}_total"
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+                lines += [
+                    f"{name}{{{labels}}} {values[field]}" for labels, values in series
+                ]
+            name = "game_agent_latency_seconds"
+            lines += [
+                f"# HELP {name} Wall-clock latency of agent calls.",
+                f"# TYPE {name} histogram",
+            ]
+            for labels, values in series:
+                for bound, count in zip(self.buckets, values["latency_buckets"]):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {values["calls"]}')
+                lines.append(f"{name}_sum{{{labels}}} {values['latency_seconds_sum']}")
+                lines.append(f"{name}_count{{{labels}}} {values['calls']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        # Prometheus text format for *.prom files (node_exporter's textfile
+        # collector reads them), JSON otherwise.
+        text = (
+            self.prometheus_text()
+            if path.endswith(".prom")
+            else json.dumps(self.to_json(), indent=2)
+        )
+        # Written to a temporary file and renamed, so a scraper never reads a
+        # half-written dump.
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
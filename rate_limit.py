@@ -0,0 +1,175 @@
+import random
+import re
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    # Rate-limit reset headers look like "1s", "6m0s" or "20ms".
+    if not value:
+        return None
+    matches = DURATION_PATTERN.findall(value)
+    if not matches:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in matches)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        # Takes `amount` right away, going into debt if needed, and returns how
+        # long the caller has to wait until the debt is paid back. Reserving
+        # up front keeps the bucket fair between threads and coroutines.
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float) -> None:
+        # Gives back (or, when negative, takes) tokens after the fact.
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.blocked_until = 0.0
+        self.random = random.Random()
+        self._lock = threading.Lock()
+        self.n_requests = 0
+        self.n_rate_limited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_backoff = 0.0
+
+    def reserve(self, estimated_tokens: int) -> float:
+        wait = max(0.0, self.blocked_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        with self._lock:
+            self.n_requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def settle(self, reserved_tokens: int, used_tokens: int) -> None:
+        # A request reserves its estimate once, however often it is retried,
+        # and is settled to what it actually used (nothing, if it never got
+        # through) once that is known.
+        if self.tokens:
+            self.tokens.adjust(reserved_tokens - used_tokens)
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        # Pause everyone sharing this limiter when the server reports that the
+        # request or token allowance is used up until it resets.
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and reset and float(remaining) <= 0:
+                self.block(reset)
+
+    def backoff(
+        self, attempt: int, headers: Optional[Mapping[str, str]] = None
+    ) -> float:
+        headers = headers or {}
+        retry_after: Optional[float] = None
+        if headers.get("retry-after-ms"):
+            retry_after = float(headers["retry-after-ms"]) / 1000
+        elif headers.get("retry-after"):
+            try:
+                retry_after = float(headers["retry-after"])
+            except ValueError:
+                retry_after = None
+        if retry_after is None:
+            ceiling = min(self.max_backoff, self.base_backoff * 2**attempt)
+            delay = self.random.uniform(0, ceiling)
+        else:
+            delay = retry_after * self.random.uniform(1.0, 1.2)
+        with self._lock:
+            self.n_rate_limited += 1
+            self.total_backoff += delay
+        self.block(delay)
+        return delay
+
+    def blocked_for(self) -> float:
+        # Seconds until requests are let through again after a backoff or an
+        # exhausted allowance.
+        with self._lock:
+            return max(0.0, self.blocked_until - time.monotonic())
+
+    def block(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.n_requests,
+                "rate_limited": self.n_rate_limited,
+                "total_queue_seconds": self.total_wait,
+                "mean_queue_seconds": (
+                    self.total_wait / self.n_requests if self.n_requests else 0.0
+                ),
+                "max_queue_seconds": self.max_wait,
+                "total_backoff_seconds": self.total_backoff,
+            }
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+_limits: Dict[str, Dict[str, Optional[float]]] = {}
+
+
+def configure_rate_limit(
+    model: str,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+) -> None:
+    with _rate_limiters_lock:
+        _limits[model] = {
+            "requests_per_minute": requests_per_minute,
+            "tokens_per_minute": tokens_per_minute,
+        }
+        _rate_limiters.pop(model, None)
+
+
+def rate_limiter(model: str, default_limits: Optional[dict] = None) -> RateLimiter:
+    with _rate_limiters_lock:
+        if model not in _rate_limiters:
+            limits = _limits.get(model) or default_limits or {}
+            _rate_limiters[model] = RateLimiter(**limits)
+        return _rate_limiters[model]
+
+
+def rate_limit_metrics() -> Dict[str, dict]:
+    with _rate_limiters_lock:
+        limiters = dict(_rate_limiters)
+    return {model: limiter.metrics() for model, limiter in limiters.items()}
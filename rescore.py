@@ -0,0 +1,411 @@
+import argparse
+import functools
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import special
+
+from judge import SuccessJudge
+from result_store import TRANSCRIPTS_FILE
+from utils import GUESSING_AGENT_NAME, UNPLAYED_STATUSES, GameVariables, config_hash
+
+DEFAULT_TOPIC = GameVariables().topic
+# Games end after the 21st question, see Game.play.
+MAX_QUESTIONS = 21
+
+# A judge is built once per topic and aliases and tells whether one guessing
+# agent message names the topic; a question counter maps the guessing agent's
+# messages up to the end of the game to its number of questions.
+Judge = Callable[[str], bool]
+JudgeFactory = Callable[[str, Tuple[str, ...]], Judge]
+QuestionCounter = Callable[[List[str]], int]
+# A loader streams the games of one file as records shaped like sweep
+# checkpoint lines: {"config_hash", "game_variables", "result"}.
+Loader = Callable[[str], Iterator[dict]]
+
+
+@functools.lru_cache(maxsize=1024)
+def exact_judge(topic: str, aliases: Tuple[str, ...] = ()) -> Judge:
+    # The rule games were scored with before judge.SuccessJudge.
+    pattern = re.compile(r"\b" + re.escape(topic) + r"\b")
+    return functools.lru_cache(maxsize=65536)(
+        lambda text: pattern.search(text.lower()) is not None
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def alias_judge(topic: str, aliases: Tuple[str, ...] = ()) -> Judge:
+    judge = SuccessJudge(topic, aliases)
+    return functools.lru_cache(maxsize=65536)(lambda text: judge.matches(text))
+
+
+@functools.lru_cache(maxsize=1024)
+def cascade_judge(topic: str, aliases: Tuple[str, ...] = ()) -> Judge:
+    # The local stages of the game's cascade; guesses they leave undecided
+    # count as wrong, as in games played without llm_judge. Guessing agents
+    # repeat themselves a lot, so verdicts are memoized per message (here and
+    # in the other judges).
+    judge = SuccessJudge(topic, aliases)
+    return functools.lru_cache(maxsize=65536)(
+        lambda text: judge.local_verdict(text).correct is True
+    )
+
+
+def count_turns(guesses: List[str]) -> int:
+    # What Game.play records: every guessing agent message.
+    return len(guesses)
+
+
+def count_questions(guesses: List[str]) -> int:
+    # Only messages that ask something.
+    return sum("?" in guess for guess in guesses)
+
+
+JUDGES: Dict[str, JudgeFactory] = {
+    "exact": exact_judge,
+    "alias": alias_judge,
+    "cascade": cascade_judge,
+}
+COUNTERS: Dict[str, QuestionCounter] = {
+    "turns": count_turns,
+    "questions": count_questions,
+}
+
+
+RESULT_KEY = '"result": {'
+decoder = json.JSONDecoder()
+
+
+def decode_field(line: str, key: str, start: int = 0) -> Any:
+    position = line.find(f'"{key}": ', start)
+    if position < 0:
+        raise KeyError(key)
+    return decoder.raw_decode(line, position + len(key) + 4)[0]
+
+
+def parse_record(line: str) -> dict:
+    # Checkpoint and ResultStore lines are mostly agent_calls and ledger,
+    # which re-scoring never looks at, so only the fields it needs are
+    # decoded in place. A quote inside a JSON string is always escaped, so a
+    # '"key": ' match is a real key; the result's id, success, status and
+    # chat_history come before any of its nested objects. Lines written any
+    # other way fall back to a full parse.
+    try:
+        result_start = line.index(RESULT_KEY)
+        chat_history_start = line.index('"chat_history": ', result_start)
+        result = {
+            key: decode_field(line, key, result_start)
+            for key in ("id", "success", "chat_history")
+        }
+        # Games stored before there were budgets have no status.
+        if '"status": ' in line[result_start:chat_history_start]:
+            result["status"] = decode_field(line, "status", result_start)
+        return {
+            "config_hash": decode_field(line[:result_start], "config_hash"),
+            "game_variables": decode_field(line[:result_start], "game_variables"),
+            "result": result,
+        }
+    except (ValueError, KeyError):
+        return json.loads(line)
+
+
+def load_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            # A crash can leave a partially written last line behind.
+            try:
+                yield parse_record(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def load_result_store(path: str) -> Iterator[dict]:
+    return load_jsonl(os.path.join(path, TRANSCRIPTS_FILE))
+
+
+def load_eval_results(path: str) -> Iterator[dict]:
+    # The JSON files the evals write: older ones embed the games under
+    # "game_results", newer ones point at the ResultStore they streamed to.
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        return
+    for result in data.get("game_results", []):
+        yield {
+            "config_hash": "",
+            "game_variables": data.get("game_variables"),
+            "result": result,
+        }
+    result_store = data.get("result_store")
+    if result_store and os.path.isdir(result_store):
+        yield from load_result_store(result_store)
+
+
+def is_result_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, TRANSCRIPTS_FILE))
+
+
+# Consulted in order, the first format whose check accepts a path loads it.
+FORMATS: List[Tuple[str, Callable[[str], bool], Loader]] = [
+    ("result_store", is_result_store, load_result_store),
+    ("checkpoint", lambda path: path.endswith(".jsonl"), load_jsonl),
+    ("eval_results", lambda path: path.endswith(".json"), load_eval_results),
+]
+
+
+def register_format(name: str, matches: Callable[[str], bool], loader: Loader) -> None:
+    FORMATS.insert(0, (name, matches, loader))
+
+
+def iter_records(paths: Sequence[str]) -> Iterator[dict]:
+    # Directories that are not a ResultStore are searched recursively.
+    for path in paths:
+        for name, matches, loader in FORMATS:
+            if matches(path):
+                yield from loader(path)
+                break
+        else:
+            if os.path.isdir(path):
+                yield from iter_records(
+                    [os.path.join(path, entry) for entry in sorted(os.listdir(path))]
+                )
+
+
+def rescore_game(
+    chat_history: List[dict], judge: Judge, count: QuestionCounter
+) -> Tuple[bool, int]:
+    # The game is won at the first guessing agent message the judge accepts.
+    # A stricter judge than the one the game was played with can only reject
+    # the stored transcript, it cannot know how the game would have gone on.
+    guesses = [
+        message["content"] or ""
+        for message in chat_history
+        if message["role"] == GUESSING_AGENT_NAME
+    ]
+    for i, guess in enumerate(guesses):
+        if judge(guess):
+            return True, count(guesses[: i + 1])
+    return False, count(guesses)
+
+
+def wilson_intervals(
+    successes: np.ndarray, n: np.ndarray, confidence: float = 0.95
+) -> Tuple[np.ndarray, np.ndarray]:
+    z = special.ndtri(1 - (1 - confidence) / 2)
+    n_safe = np.maximum(n, 1)
+    p = np.clip(successes / n_safe, 0.0, 1.0)
+    denominator = 1 + z**2 / n_safe
+    centre = (p + z**2 / (2 * n_safe)) / denominator
+    half_width = (
+        z * np.sqrt(p * (1 - p) / n_safe + z**2 / (4 * n_safe**2)) / denominator
+    )
+    empty = n == 0
+    return (
+        np.where(empty, 0.0, np.maximum(0.0, centre - half_width)),
+        np.where(empty, 1.0, np.minimum(1.0, centre + half_width)),
+    )
+
+
+def clopper_pearson_intervals(
+    successes: np.ndarray, n: np.ndarray, confidence: float = 0.95
+) -> Tuple[np.ndarray, np.ndarray]:
+    alpha = 1 - confidence
+    with np.errstate(invalid="ignore"):
+        lower = special.betaincinv(successes, n - successes + 1, alpha / 2)
+        upper = special.betaincinv(successes + 1, n - successes, 1 - alpha / 2)
+    return (
+        np.where((successes == 0) | (n == 0), 0.0, lower),
+        np.where((successes == n) | (n == 0), 1.0, upper),
+    )
+
+
+VECTORIZED_INTERVALS = {
+    "wilson": wilson_intervals,
+    "clopper_pearson": clopper_pearson_intervals,
+}
+
+
+def aggregate(
+    config_index: np.ndarray,
+    success: np.ndarray,
+    questions: np.ndarray,
+    n_configs: int,
+    confidence: float = 0.95,
+    method: str = "wilson",
+) -> Dict[str, np.ndarray]:
+    # One pass over all games of all configs: per-config counts come from
+    # bincount, the question-count distribution of successful games from a
+    # (config, questions) histogram.
+    n = np.bincount(config_index, minlength=n_configs)
+    successes = np.bincount(config_index, weights=success, minlength=n_configs)
+    ci_lower, ci_upper = VECTORIZED_INTERVALS[method](successes, n, confidence)
+
+    won = config_index[success]
+    won_questions = np.minimum(questions[success], MAX_QUESTIONS)
+    histogram = np.bincount(
+        won * (MAX_QUESTIONS + 1) + won_questions,
+        minlength=n_configs * (MAX_QUESTIONS + 1),
+    ).reshape(n_configs, MAX_QUESTIONS + 1)
+    values = np.arange(MAX_QUESTIONS + 1)
+    n_won = histogram.sum(axis=1)
+    n_won_safe = np.maximum(n_won, 1)
+    mean = histogram @ values / n_won_safe
+    variance = (histogram @ values**2 - n_won * mean**2) / np.maximum(n_won - 1, 1)
+    sem = np.sqrt(np.maximum(variance, 0.0) / n_won_safe)
+    t = special.stdtrit(np.maximum(n_won - 1, 1), 1 - (1 - confidence) / 2)
+    # Percentiles are the first bin where the cumulative share reaches q.
+    cumulative = np.cumsum(histogram, axis=1) / n_won_safe[:, None]
+    question_percentiles = {
+        f"p{q}": np.argmax(cumulative >= q / 100 - 1e-9, axis=1) for q in (50, 90)
+    }
+    return {
+        "n_runs": n,
+        "successes": successes.astype(np.int64),
+        "success_rate": successes / np.maximum(n, 1),
+        "ci_lower": ci_lower,
+        "ci_upper": ci_upper,
+        "n_won": n_won,
+        "mean_number_of_questions": mean,
+        "questions_ci_lower": mean - t * sem,
+        "questions_ci_upper": mean + t * sem,
+        "question_histogram": histogram,
+        **{
+            f"questions_{name}": points for name, points in question_percentiles.items()
+        },
+    }
+
+
+def rescore(
+    paths: Sequence[str],
+    judge: str = "cascade",
+    counter: str = "turns",
+    confidence: float = 0.95,
+    method: str = "wilson",
+) -> List[dict]:
+    # Re-applies a judge and question counter to every stored transcript and
+    # recomputes the per-config statistics; no agent is called. Games found
+    # twice (a merged checkpoint and its shards, an eval file and its
+    # ResultStore) are counted once.
+    judge_factory = JUDGES[judge]
+    count = COUNTERS[counter]
+    configs: Dict[str, int] = {}
+    config_variables: List[Optional[dict]] = []
+    hashes_by_variables: Dict[str, str] = {}
+    seen_ids = set()
+    config_index: List[int] = []
+    success: List[bool] = []
+    stored_success: List[bool] = []
+    over_budget: List[bool] = []
+    questions: List[int] = []
+    for record in iter_records(paths):
+        result = record["result"]
+        if result.get("id") in seen_ids or result.get("status") in UNPLAYED_STATUSES:
+            continue
+        seen_ids.add(result.get("id"))
+        game_variables = record.get("game_variables") or {}
+        cell_hash = record.get("config_hash")
+        if not cell_hash and game_variables:
+            key = json.dumps(game_variables, sort_keys=True)
+            cell_hash = hashes_by_variables.get(key)
+            if cell_hash is None:
+                cell_hash = hashes_by_variables[key] = config_hash(
+                    GameVariables.model_validate(game_variables)
+                )
+        index = configs.setdefault(cell_hash or "", len(configs))
+        if index == len(config_variables):
+            config_variables.append(record.get("game_variables"))
+        topic = game_variables.get("topic", DEFAULT_TOPIC)
+        is_correct = judge_factory(
+            topic, tuple(game_variables.get("topic_aliases", ()))
+        )
+        game_success, game_questions = rescore_game(
+            result.get("chat_history", []), is_correct, count
+        )
+        config_index.append(index)
+        success.append(game_success)
+        stored_success.append(bool(result.get("success")))
+        over_budget.append(result.get("status") == "over_budget")
+        questions.append(game_questions)
+
+    config_array = np.array(config_index, dtype=np.int64)
+    success_array = np.array(success, dtype=bool)
+    stored_array = np.array(stored_success, dtype=bool)
+    columns = aggregate(
+        config_array,
+        success_array,
+        np.array(questions, dtype=np.int64),
+        len(configs),
+        confidence,
+        method,
+    )
+    n_changed = np.bincount(
+        config_array, weights=success_array != stored_array, minlength=len(configs)
+    )
+    stored_successes = np.bincount(
+        config_array, weights=stored_array, minlength=len(configs)
+    )
+    n_over_budget = np.bincount(
+        config_array,
+        weights=np.array(over_budget, dtype=bool),
+        minlength=len(configs),
+    )
+    summary = []
+    for cell_hash, i in configs.items():
+        n_won = int(columns["n_won"][i])
+        summary.append(
+            {
+                "config_hash": cell_hash,
+                "game_variables": config_variables[i],
+                "n_runs": int(columns["n_runs"][i]),
+                "n_over_budget": int(n_over_budget[i]),
+                "success_rate": float(columns["success_rate"][i]),
+                "ci_lower": float(columns["ci_lower"][i]),
+                "ci_upper": float(columns["ci_upper"][i]),
+                "mean_number_of_questions": (
+                    float(columns["mean_number_of_questions"][i]) if n_won else None
+                ),
+                "questions_ci_lower": (
+                    float(columns["questions_ci_lower"][i]) if n_won > 1 else None
+                ),
+                "questions_ci_upper": (
+                    float(columns["questions_ci_upper"][i]) if n_won > 1 else None
+                ),
+                "questions_p50": int(columns["questions_p50"][i]) if n_won else None,
+                "questions_p90": int(columns["questions_p90"][i]) if n_won else None,
+                "question_histogram": columns["question_histogram"][i].tolist(),
+                "stored_success_rate": float(
+                    stored_successes[i] / max(1, columns["n_runs"][i])
+                ),
+                "n_changed": int(n_changed[i]),
+            }
+        )
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Re-score stored games with another success judge or question counter, without calling any agent."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="eval result JSON files, sweep checkpoints, ResultStore directories or directories of these",
+    )
+    parser.add_argument("--judge", choices=list(JUDGES), default="cascade")
+    parser.add_argument("--counter", choices=list(COUNTERS), default="turns")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument(
+        "--method", choices=list(VECTORIZED_INTERVALS), default="wilson"
+    )
+    args = parser.parse_args(argv)
+    summary = rescore(
+        args.paths, args.judge, args.counter, args.confidence, args.method
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
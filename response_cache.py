@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from typing import List, Optional
+
+from utils import load_env
+
+EVICTION_INTERVAL = 100
+SAMPLED_CACHE_WARNING = (
+    "caching completions sampled at temperature > 0 replays identical games on "
+    "every run, and success-rate intervals count the copies as independent games"
+)
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str,
+        max_entries: Optional[int] = 100_000,
+        max_bytes: Optional[int] = None,
+        max_age_seconds: Optional[float] = None,
+        deterministic_only: bool = True,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.deterministic_only = deterministic_only
+        if not deterministic_only:
+            warnings.warn(SAMPLED_CACHE_WARNING, stacklevel=2)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )"""
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used_at ON responses (last_used_at)"
+        )
+        self._connection.commit()
+        self.evict()
+
+    @classmethod
+    def from_env(cls, deterministic_only: bool = True) -> Optional["ResponseCache"]:
+        # Caching sampled calls is opted into per eval, by passing
+        # deterministic_only=False here, never process-wide from the environment.
+        load_env()
+        path = os.getenv("RESPONSE_CACHE_PATH")
+        if not path:
+            return None
+        if os.getenv("RESPONSE_CACHE_POLICY") == "all" and deterministic_only:
+            warnings.warn(
+                "RESPONSE_CACHE_POLICY=all is ignored, only temperature 0 calls are "
+                "cached unless an eval passes deterministic_only=False",
+                stacklevel=2,
+            )
+        return cls(path, deterministic_only=deterministic_only)
+
+    @staticmethod
+    def key(
+        model: str,
+        messages: List[dict],
+        temperature: float,
+        json_response: bool,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        request_fields: List = [model, messages, temperature, json_response]
+        if max_tokens is not None:
+            request_fields.append(max_tokens)
+        request = json.dumps(
+            request_fields,
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def should_cache(self, temperature: float) -> bool:
+        # Sampling at temperature > 0 is expected to vary between runs, so by
+        # default only deterministic calls are served from the cache.
+        return not self.deterministic_only or temperature == 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (
+                self.max_age_seconds is None or now - row[1] <= self.max_age_seconds
+            ):
+                self._connection.execute(
+                    "UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key)
+                )
+                self._connection.commit()
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, content: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            self._connection.commit()
+            self._puts += 1
+            evict = self._puts % EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            if self.max_age_seconds is not None:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.max_age_seconds,),
+                )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_used_at DESC
+                        LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,),
+                )
+            if self.max_bytes is not None:
+                total_bytes = 0
+                for key, size in self._connection.execute(
+                    "SELECT key, LENGTH(content) FROM responses ORDER BY last_used_at DESC"
+                ).fetchall():
+                    total_bytes += size
+                    if total_bytes > self.max_bytes:
+                        self._connection.execute(
+                            "DELETE FROM responses WHERE key = ?", (key,)
+                        )
+            self._connection.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
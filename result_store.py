@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+
+from utils import GameResult, GameVariables, config_hash, drop_partial_line
+
+TRANSCRIPTS_FILE = "transcripts.jsonl"
+INDEX_FILE = "index.bin"
+INDEX_DTYPE = np.dtype(
+    [
+        ("id", "S36"),
+        ("config_hash", "S16"),
+        ("success", "?"),
+        ("number_of_questions", "<i2"),
+        ("prompt_tokens", "<i4"),
+        ("completion_tokens", "<i4"),
+        ("duration_seconds", "<f4"),
+        ("offset", "<i8"),
+    ]
+)
+
+
+class ResultStore:
+    # Append-only store for game results: every game is written as one JSON
+    # line to transcripts.jsonl as soon as it finishes, and a fixed-size
+    # summary record (pointing at the line's byte offset) goes to index.bin,
+    # which read_index memory-maps without touching the transcripts.
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        drop_partial_line(os.path.join(directory, TRANSCRIPTS_FILE))
+        self.transcripts = open(os.path.join(directory, TRANSCRIPTS_FILE), "ab")
+        self.index = open(os.path.join(directory, INDEX_FILE), "ab")
+        # Drop a partially written index record left behind by a crash, and
+        # records of transcript lines that were cut off above.
+        n_records = self.index.tell() // INDEX_DTYPE.itemsize
+        offsets = np.array(read_index(directory)["offset"])
+        n_records = min(
+            n_records, int(np.searchsorted(offsets, self.transcripts.tell()))
+        )
+        self.index.truncate(n_records * INDEX_DTYPE.itemsize)
+        self.index.seek(0, os.SEEK_END)
+
+    def write(
+        self, result: GameResult, game_variables: Optional[GameVariables] = None
+    ) -> None:
+        record = {
+            "config_hash": config_hash(game_variables) if game_variables else "",
+            "game_variables": game_variables.model_dump() if game_variables else None,
+            "result": result.model_dump(),
+        }
+        offset = self.transcripts.tell()
+        self.transcripts.write(json.dumps(record).encode("utf-8") + b"\n")
+        self.transcripts.flush()
+        summary = np.array(
+            [
+                (
+                    result.id,
+                    record["config_hash"],
+                    result.success,
+                    result.number_of_questions or 0,
+                    result.prompt_tokens,
+                    result.completion_tokens,
+                    (
+                        result.duration_seconds
+                        if result.duration_seconds is not None
+                        else np.nan
+                    ),
+                    offset,
+                )
+            ],
+            dtype=INDEX_DTYPE,
+        )
+        self.index.write(summary.tobytes())
+        self.index.flush()
+
+    def close(self) -> None:
+        self.transcripts.close()
+        self.index.close()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_index(directory: str) -> np.ndarray:
+    path = os.path.join(directory, INDEX_FILE)
+    n_records = os.path.getsize(path) // INDEX_DTYPE.itemsize
+    if n_records == 0:
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.memmap(path, dtype=INDEX_DTYPE, mode="r", shape=(n_records,))
+
+
+def read_transcript(directory: str, offset: int) -> dict:
+    with open(os.path.join(directory, TRANSCRIPTS_FILE), "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+def iter_transcripts(directory: str) -> Iterator[dict]:
+    with open(os.path.join(directory, TRANSCRIPTS_FILE), "rb") as f:
+        for line in f:
+            # A crash can leave a partially written last line behind.
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
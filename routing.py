@@ -0,0 +1,194 @@
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from game_state import yes_no_answer
+from host_answers import parse_host_answer
+from utils import Agent, GameResult, GameVariables, ModelRoute, RoutingPolicy
+
+FAST_MODEL = "gpt-4o-mini"
+STRONG_MODEL = "gpt-4o-2024-05-13"
+
+# Policies the routing eval compares. The host answers yes/no about a topic
+# it knows, which a small model mostly gets right; the guesser's late
+# questions and its guess are where a stronger model pays off.
+POLICIES = {
+    "flagship": RoutingPolicy(name="flagship"),
+    "fast_host": RoutingPolicy(
+        name="fast_host", host=[ModelRoute(models=[FAST_MODEL])]
+    ),
+    "cascade_host": RoutingPolicy(
+        name="cascade_host", host=[ModelRoute(models=[FAST_MODEL, STRONG_MODEL])]
+    ),
+    "cascade_both": RoutingPolicy(
+        name="cascade_both",
+        host=[ModelRoute(models=[FAST_MODEL, STRONG_MODEL])],
+        guesser=[
+            ModelRoute(models=[FAST_MODEL, STRONG_MODEL]),
+            ModelRoute(models=[STRONG_MODEL], from_question=10),
+        ],
+    ),
+}
+
+ROLES = ("host", "guesser")
+HEDGE_PATTERN = re.compile(
+    r"\b(maybe|perhaps|possibly|probably|not sure|it depends|depends on|sometimes|"
+    r"hard to say|unclear|i think|i don't know|i do not know)\b",
+    re.IGNORECASE,
+)
+
+
+# Each check returns why an answer should be escalated, or None to accept it.
+def host_answer_problem(text: str, opening: bool = False) -> Optional[str]:
+    if not text.strip():
+        return "empty"
+    if opening:
+        return None
+    if HEDGE_PATTERN.search(text):
+        return "low_confidence"
+    if yes_no_answer(text) == "unknown":
+        return "not_yes_no"
+    return None
+
+
+def structured_answer_problem(text: str) -> Optional[str]:
+    host_answer = parse_host_answer(text)
+    if host_answer is None:
+        return "invalid_json"
+    if host_answer.answer == "unknown":
+        return "low_confidence"
+    return None
+
+
+def question_problem(
+    text: str, asked: Sequence[str], guessed: bool = False
+) -> Optional[str]:
+    # A reply that names the topic ends the game, whatever its punctuation.
+    question = text.strip()
+    if not question:
+        return "empty"
+    if guessed:
+        return None
+    if "?" not in question:
+        return "not_a_question"
+    if question.lower() in (earlier.strip().lower() for earlier in asked):
+        return "repeated"
+    return None
+
+
+class Router:
+    # Picks the model of every host and guesser call of one game and records
+    # the routing decisions for its GameResult.
+    def __init__(self, game_variables: GameVariables) -> None:
+        self.policy = game_variables.routing
+        self.default_models = {
+            "host": game_variables.host_agent_model,
+            "guesser": game_variables.guessing_agent_model,
+        }
+        self.calls: Counter = Counter()
+        self.escalated: Counter = Counter()
+        self.escalations: List[dict] = []
+        self.agents: Dict[Tuple[str, str], Agent] = {}
+
+    @property
+    def active(self) -> bool:
+        return self.policy is not None or any(self.default_models.values())
+
+    def models(self, role: str, agent: Agent, number_of_questions: int) -> List[str]:
+        # The cascade for a call made when `number_of_questions` questions
+        # have been asked: the last route of the role that has started.
+        routes = getattr(self.policy, role) if self.policy is not None else []
+        started = [
+            route for route in routes if route.from_question <= number_of_questions
+        ]
+        if started:
+            return max(started, key=lambda route: route.from_question).models
+        return [self.default_models[role] or agent.model]
+
+    def agent(self, agent: Agent, model: str) -> Agent:
+        if model == agent.model:
+            return agent
+        key = (agent.name, model)
+        if key not in self.agents:
+            self.agents[key] = agent.model_copy(update={"model": model})
+        return self.agents[key]
+
+    def route(self, role: str, agent: Agent, number_of_questions: int) -> List[Agent]:
+        # Game.cascade counts the calls actually answered by a model.
+        return [
+            self.agent(agent, model)
+            for model in self.models(role, agent, number_of_questions)
+        ]
+
+    def escalate(
+        self, role: str, number_of_questions: int, source: str, target: str, reason: str
+    ) -> None:
+        self.escalated[role] += 1
+        self.escalations.append(
+            {
+                "role": role,
+                "question": number_of_questions,
+                "from": source,
+                "to": target,
+                "reason": reason,
+            }
+        )
+
+    def summary(self, model_usage: Dict[str, dict]) -> dict:
+        return {
+            "policy": self.policy.name if self.policy is not None else None,
+            "calls": {role: self.calls[role] for role in ROLES},
+            "escalated": {role: self.escalated[role] for role in ROLES},
+            "escalations": self.escalations,
+            "models": model_usage,
+        }
+
+
+def summarize_routing(results: Sequence[GameResult]) -> dict:
+    # Success, cost and latency of a set of games played under one policy,
+    # with escalation rates per role and latency and cost per model.
+    played = [result for result in results if result.status != "not_scheduled"]
+    routed = [result.routing for result in played if result.routing is not None]
+    calls = {role: sum(routing["calls"][role] for routing in routed) for role in ROLES}
+    escalated = {
+        role: sum(routing["escalated"][role] for routing in routed) for role in ROLES
+    }
+    models: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for routing in routed:
+        for model, usage in routing["models"].items():
+            for field, value in usage.items():
+                models[model][field] += value
+    durations = [
+        result.duration_seconds
+        for result in played
+        if result.duration_seconds is not None
+    ]
+    return {
+        "games": len(played),
+        "success_rate": (
+            float(np.mean([result.success for result in played])) if played else None
+        ),
+        "mean_cost_dollars": (
+            float(np.mean([result.cost_dollars for result in played]))
+            if played
+            else None
+        ),
+        "mean_duration_seconds": float(np.mean(durations)) if durations else None,
+        "escalation_rate": {
+            role: escalated[role] / calls[role] if calls[role] else None
+            for role in ROLES
+        },
+        "models": {
+            model: {
+                "calls": int(usage["calls"]),
+                "mean_latency_seconds": usage["latency_seconds"] / usage["calls"],
+                "cost_dollars": usage["cost_dollars"],
+                "prompt_tokens": int(usage["prompt_tokens"]),
+                "completion_tokens": int(usage["completion_tokens"]),
+            }
+            for model, usage in models.items()
+            if usage["calls"]
+        },
+    }
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import uuid
+from typing import Any, Callable, List, Optional, Sequence
+
+from agent_client import AsyncAgentClient
+from budget import Budget
+from game import AsyncGame
+from response_cache import ResponseCache
+from semantic_cache import SemanticAnswerCache
+from transcript import CompactGameResult
+from utils import GameResult, GameVariables, load_env
+
+
+def default_concurrency() -> int:
+    load_env()
+    return int(os.getenv("GAME_CONCURRENCY", "100"))
+
+
+async def run_games(
+    games: Sequence[GameVariables],
+    concurrency: Optional[int] = None,
+    client: Optional[AsyncAgentClient] = None,
+    verbose: bool = True,
+    on_result: Optional[Callable[[int, Any], None]] = None,
+    host_answer_cache: Optional[SemanticAnswerCache] = None,
+    budget: Optional[Budget] = None,
+    compact: bool = False,
+) -> List[Any]:
+    # One client (and connection pool) is shared by every game; the semaphore
+    # bounds how many games have a request in flight at the same time. Once
+    # `budget` is spent, games that have not started yet are not played and
+    # come back with status "not_scheduled", and games it cut off come back
+    # with status "over_budget", both without calling on_result.
+    # With `compact`, each result is kept (and passed to on_result) as a
+    # transcript.CompactGameResult, for holding many games in memory.
+    client = client or AsyncAgentClient(cache=ResponseCache.from_env())
+    semaphore = asyncio.Semaphore(concurrency or default_concurrency())
+
+    async def run_game(index: int, game_variables: GameVariables) -> Any:
+        async with semaphore:
+            if budget is not None and budget.exhausted():
+                return GameResult(
+                    id=str(uuid.uuid4()),
+                    success=False,
+                    status="not_scheduled",
+                    chat_history=[],
+                )
+            game = AsyncGame(
+                game_variables,
+                client=client,
+                verbose=verbose,
+                host_answer_cache=host_answer_cache,
+                budget=budget,
+            )
+            result = await game.run()
+        # The host's closing reply runs off the critical path, so the next game
+        # may start while it is on its way into the result.
+        result = await game.finish(result)
+        if compact:
+            result = CompactGameResult.from_result(result)
+        if on_result is not None and not game.cut_off:
+            on_result(index, result)
+        return result
+
+    results = await asyncio.gather(
+        *(run_game(index, game_variables) for index, game_variables in enumerate(games))
+    )
+    return list(results)
+
+
+def run_games_sync(
+    games: Sequence[GameVariables],
+    concurrency: Optional[int] = None,
+    verbose: bool = True,
+) -> List[GameResult]:
+    return asyncio.run(run_games(games, concurrency=concurrency, verbose=verbose))
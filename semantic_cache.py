@@ -0,0 +1,127 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+QUESTION_PREFIX_PATTERN = re.compile(r"^(question\s*\d+\s*[:.)-]\s*)")
+NON_WORD_PATTERN = re.compile(r"[^a-z0-9 ]+")
+SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    question = question.lower().strip()
+    question = QUESTION_PREFIX_PATTERN.sub("", question)
+    question = NON_WORD_PATTERN.sub(" ", question)
+    return SPACE_PATTERN.sub(" ", question).strip()
+
+
+class TopicPartition:
+    # Fixed-capacity matrix of unit-length hashed n-gram vectors; a lookup is
+    # one matrix-vector product. Rows are recycled least recently used first.
+    def __init__(self, capacity: int, dim: int) -> None:
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.answers: List[Optional[str]] = [None] * capacity
+        self.questions: Dict[str, int] = {}
+        self.row_questions: List[Optional[str]] = [None] * capacity
+        self.last_used = np.full(capacity, -1, dtype=np.int64)
+        self.size = 0
+
+    def lookup(self, vector: np.ndarray) -> Tuple[int, float]:
+        if self.size == 0:
+            return -1, 0.0
+        similarities = self.vectors[: self.size] @ vector
+        row = int(np.argmax(similarities))
+        return row, float(similarities[row])
+
+    def store(self, question: str, vector: np.ndarray, answer: str, tick: int) -> None:
+        row = self.questions.get(question)
+        if row is None:
+            if self.size < len(self.answers):
+                row = self.size
+                self.size += 1
+            else:
+                row = int(np.argmin(self.last_used))
+                del self.questions[self.row_questions[row]]  # type: ignore[arg-type]
+            self.questions[question] = row
+            self.row_questions[row] = question
+        self.vectors[row] = vector
+        self.answers[row] = answer
+        self.last_used[row] = tick
+
+
+class SemanticAnswerCache:
+    # Host answers keyed by (partition, normalized question), where near
+    # duplicates ("Is it alive?" / "is it alive") are found by cosine
+    # similarity of hashed character n-gram vectors. A partition is one topic
+    # (plus whatever else the host's answer depends on, see Game); partitions
+    # themselves are evicted least recently used once max_partitions is hit.
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries_per_topic: int = 1024,
+        max_partitions: int = 256,
+        dim: int = 1024,
+        ngram: int = 3,
+    ) -> None:
+        self.threshold = threshold
+        self.max_entries_per_topic = max_entries_per_topic
+        self.max_partitions = max_partitions
+        self.dim = dim
+        self.ngram = ngram
+        self.partitions: "OrderedDict[str, TopicPartition]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._tick = 0
+        self._lock = threading.Lock()
+
+    def vectorize(self, question: str) -> np.ndarray:
+        padded = f" {question} "
+        buckets = [
+            zlib.crc32(padded[i : i + self.ngram].encode("utf-8")) % self.dim
+            for i in range(max(1, len(padded) - self.ngram + 1))
+        ]
+        vector = np.bincount(buckets, minlength=self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def partition(self, key: str) -> TopicPartition:
+        if key in self.partitions:
+            self.partitions.move_to_end(key)
+        else:
+            if len(self.partitions) >= self.max_partitions:
+                self.partitions.popitem(last=False)
+            self.partitions[key] = TopicPartition(self.max_entries_per_topic, self.dim)
+        return self.partitions[key]
+
+    def lookup(self, key: str, question: str) -> Optional[str]:
+        question = normalize_question(question)
+        vector = self.vectorize(question)
+        with self._lock:
+            self._tick += 1
+            partition = self.partition(key)
+            row, similarity = partition.lookup(vector)
+            if row >= 0 and similarity >= self.threshold:
+                partition.last_used[row] = self._tick
+                self.hits += 1
+                return partition.answers[row]
+            self.misses += 1
+            return None
+
+    def store(self, key: str, question: str, answer: str) -> None:
+        question = normalize_question(question)
+        vector = self.vectorize(question)
+        with self._lock:
+            self._tick += 1
+            self.partition(key).store(question, vector, answer, self._tick)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "partitions": len(self.partitions),
+            "entries": sum(partition.size for partition in self.partitions.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import math
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+from scipy import special
+
+from agent_client import AsyncAgentClient
+from metrics import summarize_agent_calls
+from response_cache import ResponseCache
+from runner import run_games
+from utils import GameResult, GameVariables, bcolors
+
+
+def wilson_interval(
+    successes: int, n: int, confidence: float = 0.95
+) -> Tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    z = special.ndtri(1 - (1 - confidence) / 2)
+    p = successes / n
+    denominator = 1 + z**2 / n
+    centre = (p + z**2 / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return float(max(0.0, centre - half_width)), float(min(1.0, centre + half_width))
+
+
+def clopper_pearson_interval(
+    successes: int, n: int, confidence: float = 0.95
+) -> Tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    alpha = 1 - confidence
+    lower = (
+        0.0
+        if successes == 0
+        else special.betaincinv(successes, n - successes + 1, alpha / 2)
+    )
+    upper = (
+        1.0
+        if successes == n
+        else special.betaincinv(successes + 1, n - successes, 1 - alpha / 2)
+    )
+    return float(lower), float(upper)
+
+
+def mean_interval(
+    values: List[float], confidence: float = 0.95
+) -> Tuple[Optional[float], Optional[float]]:
+    if len(values) < 2:
+        return None, None
+    mean = float(np.mean(values))
+    sem = np.std(values, ddof=1) / math.sqrt(len(values))
+    if sem == 0:
+        return mean, mean
+    half_width = special.stdtrit(len(values) - 1, 1 - (1 - confidence) / 2) * sem
+    return float(mean - half_width), float(mean + half_width)
+
+
+INTERVALS = {"wilson": wilson_interval, "clopper_pearson": clopper_pearson_interval}
+
+
+class SequentialOutcome(BaseModel):
+    game_variables: GameVariables
+    results: List[GameResult]
+    n_runs: int
+    success_rate: float
+    ci_lower: float
+    ci_upper: float
+    mean_number_of_questions: Optional[float] = None
+    questions_ci_lower: Optional[float] = None
+    questions_ci_upper: Optional[float] = None
+    stopped_reason: str
+    metrics: dict = {}
+    # Games left out of the intervals as replays of a counted game.
+    n_replayed: int = 0
+
+
+def independent_games(results: List[GameResult]) -> List[GameResult]:
+    # A game that reused cached calls and has the same transcript as another
+    # game is a replay of it rather than an independent sample, so each such
+    # transcript counts once.
+    transcripts = [
+        json.dumps(result.chat_history, sort_keys=True) for result in results
+    ]
+    replayed = {
+        transcript
+        for transcript, result in zip(transcripts, results)
+        if any(call["cached"] for call in result.agent_calls)
+    }
+    counted = set()
+    independent = []
+    for transcript, result in zip(transcripts, results):
+        if transcript in replayed and transcript in counted:
+            continue
+        counted.add(transcript)
+        independent.append(result)
+    return independent
+
+
+def summarize(
+    game_variables: GameVariables,
+    results: List[GameResult],
+    confidence: float,
+    method: str,
+    stopped_reason: str = "",
+) -> SequentialOutcome:
+    independent = independent_games(results)
+    successes = sum(result.success for result in independent)
+    ci_lower, ci_upper = INTERVALS[method](successes, len(independent), confidence)
+    questions = [
+        result.number_of_questions
+        for result in independent
+        if result.success and result.number_of_questions is not None
+    ]
+    questions_ci_lower, questions_ci_upper = mean_interval(questions, confidence)
+    return SequentialOutcome(
+        game_variables=game_variables,
+        results=results,
+        n_runs=len(independent),
+        success_rate=successes / len(independent) if independent else 0.0,
+        ci_lower=ci_lower,
+        ci_upper=ci_upper,
+        mean_number_of_questions=float(np.mean(questions)) if questions else None,
+        questions_ci_lower=questions_ci_lower,
+        questions_ci_upper=questions_ci_upper,
+        stopped_reason=stopped_reason,
+        metrics=summarize_agent_calls([result.agent_calls for result in results]),
+        n_replayed=len(results) - len(independent),
+    )
+
+
+async def run_until_confident(
+    game_variables: GameVariables,
+    target_ci_width: float = 0.3,
+    target_questions_ci_width: Optional[float] = None,
+    min_runs: int = 10,
+    max_runs: int = 50,
+    wave_size: int = 5,
+    confidence: float = 0.95,
+    method: str = "wilson",
+    concurrency: Optional[int] = None,
+    client: Optional[AsyncAgentClient] = None,
+    verbose: bool = True,
+    on_result: Optional[Callable[[GameResult], None]] = None,
+) -> SequentialOutcome:
+    # Plays games in waves and stops as soon as the success-rate interval (and
+    # optionally the mean-questions interval) is narrow enough, or max_runs is hit.
+    client = client or AsyncAgentClient(cache=ResponseCache.from_env())
+    results: List[GameResult] = []
+    while True:
+        n_games = min(min_runs if not results else wave_size, max_runs - len(results))
+        results += await run_games(
+            [game_variables] * n_games,
+            concurrency=concurrency,
+            client=client,
+            verbose=verbose,
+            on_result=(lambda _, result: on_result(result)) if on_result else None,
+        )
+        outcome = summarize(game_variables, results, confidence, method)
+        questions_ci_width = (
+            outcome.questions_ci_upper - outcome.questions_ci_lower
+            if outcome.questions_ci_lower is not None
+            and outcome.questions_ci_upper is not None
+            else None
+        )
+        if outcome.ci_upper - outcome.ci_lower <= target_ci_width and (
+            target_questions_ci_width is None
+            or (
+                questions_ci_width is not None
+                and questions_ci_width <= target_questions_ci_width
+            )
+        ):
+            outcome.stopped_reason = "target_ci_width"
+            return outcome
+        if len(results) >= max_runs:
+            outcome.stopped_reason = "max_runs"
+            return outcome
+
+
+def run_until_confident_sync(
+    game_variables: GameVariables, **kwargs
+) -> SequentialOutcome:
+    return asyncio.run(run_until_confident(game_variables, **kwargs))
+
+
+class SPRTOutcome(BaseModel):
+    decision: str
+    log_likelihood_ratio_a: float
+    log_likelihood_ratio_b: float
+    a: SequentialOutcome
+    b: SequentialOutcome
+
+
+async def compare_sequential(
+    game_variables_a: GameVariables,
+    game_variables_b: GameVariables,
+    win_probability: float = 0.75,
+    alpha: float = 0.05,
+    beta: float = 0.1,
+    min_runs: int = 5,
+    max_runs: int = 50,
+    wave_size: int = 5,
+    confidence: float = 0.95,
+    method: str = "wilson",
+    concurrency: Optional[int] = None,
+    client: Optional[AsyncAgentClient] = None,
+    verbose: bool = True,
+) -> SPRTOutcome:
+    # Wald's SPRT on paired games: only pairs where exactly one version
+    # succeeds are informative. Two one-sided tests check "A wins a discordant
+    # pair with probability win_probability" (and the same for B) against 0.5.
+    client = client or AsyncAgentClient(cache=ResponseCache.from_env())
+    upper = math.log((1 - beta) / alpha)
+    lower = math.log(beta / (1 - alpha))
+    win = math.log(win_probability / 0.5)
+    loss = math.log((1 - win_probability) / 0.5)
+    results_a: List[GameResult] = []
+    results_b: List[GameResult] = []
+    llr_a = llr_b = 0.0
+    decision = "undecided"
+    while len(results_a) < max_runs:
+        n_games = min(
+            min_runs if not results_a else wave_size, max_runs - len(results_a)
+        )
+        wave = await run_games(
+            [game_variables_a] * n_games + [game_variables_b] * n_games,
+            concurrency=concurrency,
+            client=client,
+            verbose=verbose,
+        )
+        wave_a, wave_b = wave[:n_games], wave[n_games:]
+        results_a += wave_a
+        results_b += wave_b
+        for result_a, result_b in zip(wave_a, wave_b):
+            if result_a.success and not result_b.success:
+                llr_a, llr_b = llr_a + win, llr_b + loss
+            elif result_b.success and not result_a.success:
+                llr_a, llr_b = llr_a + loss, llr_b + win
+        if verbose:
+            print(
+                bcolors.LOG
+                + f"SPRT after {len(results_a)} pairs: LLR(A better) {llr_a:.2f}, LLR(B better) {llr_b:.2f}"
+                + bcolors.ENDC
+            )
+        if llr_a >= upper:
+            decision = "a"
+            break
+        if llr_b >= upper:
+            decision = "b"
+            break
+        if llr_a <= lower and llr_b <= lower:
+            decision = "equal"
+            break
+    return SPRTOutcome(
+        decision=decision,
+        log_likelihood_ratio_a=llr_a,
+        log_likelihood_ratio_b=llr_b,
+        a=summarize(game_variables_a, results_a, confidence, method, decision),
+        b=summarize(game_variables_b, results_b, confidence, method, decision),
+    )
+
+
+def compare_sequential_sync(
+    game_variables_a: GameVariables, game_variables_b: GameVariables, **kwargs
+) -> SPRTOutcome:
+    return asyncio.run(compare_sequential(game_variables_a, game_variables_b, **kwargs))
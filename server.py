@@ -0,0 +1,679 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agent_client import AsyncAgentClient
+from backends import AsyncSimulatedBackend, default_rate_limits, retryable_errors
+from candidate_tracker import load_knowledge_base
+from game import Game
+from game_state import GameState
+from rate_limit import rate_limit_metrics, rate_limiter
+from response_cache import ResponseCache
+from utils import GUESSING_AGENT_NAME, HOST_AGENT_NAME, Agent, GameVariables, bcolors
+
+SERVER_GAME_VARIABLES = GameVariables(
+    guessing_agent_additional_instructions="""Your goal is to guess what the user is thinking of in fewest questions possible.
+    You must only ask questions that are binary yes/no questions to the best of your ability.
+    You must only play the game, and not ask any questions outside of the game.""",
+    host_agent_additional_instructions="""The secret topic is {topic} and the user is trying to guess it.
+    You must answer the user's questions with yes or no truthfully.
+    You must not reveal the secret topic {topic} to the user.
+    You must only play the game, and not answer or ask any questions outside of the game.""",
+    compact_history=True,
+)
+HUMAN_HOST_OPENING = "I have a secret topic in mind. Ask your first question."
+MAX_MESSAGE_CHARS = 500
+MAX_BODY_BYTES = 16 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+# Fixed cost of a session next to its transcript: the Game, GameState and
+# per-agent views, about what benchmarks/load_server.py traces per session.
+SESSION_OVERHEAD_BYTES = 8 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SESSION_PATH_PATTERN = re.compile(r"^/sessions/([0-9a-f-]{36})(/messages|/ws)?$")
+STATUS_REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(
+        self, status: int, message: str, retry_after: Optional[float] = None
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+    def body(self) -> dict:
+        body: dict = {"error": self.message, "status": self.status}
+        if self.retry_after is not None:
+            body["retry_after"] = round(self.retry_after, 3)
+        return body
+
+
+class Session:
+    # One human-vs-agent game on the same agents and transcript as Game. In
+    # "guess" mode the human asks and the host agent answers, in "host" mode
+    # the human answers and the guessing agent asks. With compact_history the
+    # agents only see a ledger plus the last few turns, and the game ends
+    # after 20 questions, so a session's history is bounded.
+    def __init__(self, mode: str, game_variables: GameVariables) -> None:
+        self.id = str(uuid.uuid4())
+        self.mode = mode
+        self.game = Game(game_variables, verbose=False)
+        self.host_agent = Agent(
+            name=HOST_AGENT_NAME, instructions=self.game.host_agent_instructions()
+        )
+        self.guessing_agent = Agent(
+            name=GUESSING_AGENT_NAME,
+            instructions=self.game.guessing_agent_instructions(),
+        )
+        self.state = GameState(
+            self.host_agent,
+            self.guessing_agent,
+            raw_turns_to_keep=(
+                game_variables.raw_turns_to_keep
+                if game_variables.compact_history
+                else None
+            ),
+        )
+        self.agent = self.host_agent if mode == "guess" else self.guessing_agent
+        self.human = self.guessing_agent if mode == "guess" else self.host_agent
+        self.lock = asyncio.Lock()
+        self.finished = False
+        self.success = False
+        self.last_used = time.monotonic()
+        self.accounted_bytes = 0
+
+    def size_bytes(self) -> int:
+        # The transcript is held once in chat_history and once per agent view.
+        return SESSION_OVERHEAD_BYTES + 3 * sum(
+            len(text or "") for text in self.state.chat_history.texts
+        )
+
+    def temperature(self) -> float:
+        if self.mode == "guess":
+            return self.game.game_variables.host_agent_temperature
+        return self.game.game_variables.guessing_agent_temperature
+
+    def add_human_message(self, content: str) -> None:
+        self.state.append({"role": self.human.name, "content": content})
+        if self.mode == "guess" and self.game.guessed(content):
+            self.finished = self.success = True
+        elif self.state.number_of_questions > 20:
+            self.finished = True
+
+    def add_agent_message(self, content: str) -> None:
+        # Without a topic from the human there is nothing to match the
+        # guesses against, so the game only ends after 20 questions.
+        if self.mode == "host" and not self.finished:
+            if self.game.game_variables.topic and self.game.guessed(content):
+                self.finished = self.success = True
+            elif self.state.number_of_questions > 20:
+                self.finished = True
+
+    def summary(self) -> dict:
+        return {
+            "session_id": self.id,
+            "mode": self.mode,
+            "finished": self.finished,
+            "success": self.success,
+            "number_of_questions": self.state.number_of_questions,
+            "chat_history": self.state.chat_history.to_list(),
+        }
+
+
+class SessionStore:
+    # Sessions in least recently used order. Expired sessions are dropped
+    # from the front, then the least recently used ones until both the
+    # session count and the estimated memory are within their caps. Sessions
+    # with a turn in flight are never evicted.
+    def __init__(
+        self,
+        max_sessions: int = 10_000,
+        ttl_seconds: float = 1800.0,
+        max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = {"ttl": 0, "lru": 0, "memory": 0}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def add(self, session: Session) -> None:
+        self.sessions[session.id] = session
+        self.update(session)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_used > self.ttl_seconds:
+            self.remove(session_id)
+            self.evictions["ttl"] += 1
+            return None
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def update(self, session: Session) -> None:
+        if session.id not in self.sessions:
+            return
+        size = session.size_bytes()
+        self.total_bytes += size - session.accounted_bytes
+        session.accounted_bytes = size
+        self.evict()
+
+    def remove(self, session_id: str) -> None:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.total_bytes -= session.accounted_bytes
+
+    def evict(self) -> None:
+        now = time.monotonic()
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if now - session.last_used <= self.ttl_seconds or session.lock.locked():
+                break
+            self.remove(session.id)
+            self.evictions["ttl"] += 1
+        if len(self.sessions) <= self.max_sessions and (
+            self.total_bytes <= self.max_bytes
+        ):
+            return
+        for session in list(self.sessions.values()):
+            over_count = len(self.sessions) > self.max_sessions
+            over_memory = self.total_bytes > self.max_bytes
+            if not over_count and not over_memory:
+                break
+            if session.lock.locked():
+                continue
+            self.remove(session.id)
+            self.evictions["lru" if over_count else "memory"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "total_bytes": self.total_bytes,
+            "evictions": dict(self.evictions),
+        }
+
+
+def websocket_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    # Server frames are sent whole and unmasked.
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_websocket_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    # Fragmented messages are not needed for short chat messages, each frame
+    # is taken as a whole message.
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", await reader.readexactly(8))
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else b""
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return first & 0x0F, payload
+
+
+async def read_request(
+    reader: asyncio.StreamReader,
+) -> Tuple[str, str, Dict[str, str], bytes]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "headers too large")
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = request_line.split(" ", 2)
+    headers = {}
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def response_head(
+    status: int, content_type: str, extra_headers: Optional[Dict[str, str]] = None
+) -> bytes:
+    headers = {
+        "Content-Type": content_type,
+        "Connection": "close",
+        "Cache-Control": "no-cache",
+        **(extra_headers or {}),
+    }
+    lines = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}"] + [
+        f"{name}: {value}" for name, value in headers.items()
+    ]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def json_response(status: int, body: Any, retry_after: Optional[float] = None) -> bytes:
+    payload = json.dumps(body).encode("utf-8")
+    headers = {"Content-Length": str(len(payload))}
+    if retry_after is not None:
+        headers["Retry-After"] = str(max(1, round(retry_after)))
+    return response_head(status, "application/json", headers) + payload
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def parse_message(body: bytes) -> str:
+    try:
+        content = json.loads(body or b"{}").get("content")
+    except (ValueError, AttributeError):
+        raise HTTPError(400, "body must be a JSON object")
+    if not isinstance(content, str) or not content.strip():
+        raise HTTPError(400, "content must be a non-empty string")
+    return content.strip()[:MAX_MESSAGE_CHARS]
+
+
+class GameServer:
+    # asyncio HTTP server for human-vs-agent games:
+    #   POST   /sessions               {"mode": "guess" | "host", "topic"?}
+    #   GET    /sessions/{id}
+    #   DELETE /sessions/{id}
+    #   POST   /sessions/{id}/messages {"content"} -> agent reply as server-sent events
+    #   GET    /sessions/{id}/ws       the same turns over a WebSocket
+    #   GET    /metrics
+    # Every turn holds one of `max_active_turns` slots; when they are all
+    # taken, or the model's rate limiter is backing off for longer than
+    # `max_rate_limit_wait`, turns are turned away with 503/429 and a
+    # Retry-After instead of queueing without bound.
+    def __init__(
+        self,
+        client: AsyncAgentClient,
+        store: Optional[SessionStore] = None,
+        game_variables: GameVariables = SERVER_GAME_VARIABLES,
+        max_active_turns: int = 200,
+        max_rate_limit_wait: float = 2.0,
+        ttl_sweep_seconds: float = 60.0,
+    ) -> None:
+        self.client = client
+        self.store = store if store is not None else SessionStore()
+        self.game_variables = game_variables
+        self.max_active_turns = max_active_turns
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.ttl_sweep_seconds = ttl_sweep_seconds
+        self.active_turns = 0
+        self.rejected_turns = {429: 0, 503: 0}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.sweeper: Optional[asyncio.Task] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> int:
+        self.server = await asyncio.start_server(
+            self.handle, host, port, limit=MAX_HEADER_BYTES, backlog=1024
+        )
+        self.sweeper = asyncio.create_task(self.sweep_expired())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def sweep_expired(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl_sweep_seconds)
+            self.store.evict()
+
+    def admit(self, session: Session) -> None:
+        wait = rate_limiter(session.agent.model, default_rate_limits()).blocked_for()
+        if wait > self.max_rate_limit_wait:
+            self.rejected_turns[429] += 1
+            raise HTTPError(429, "the model is rate limited", retry_after=wait)
+        if self.active_turns >= self.max_active_turns:
+            self.rejected_turns[503] += 1
+            raise HTTPError(503, "too many games in progress", retry_after=1.0)
+        if session.lock.locked():
+            raise HTTPError(409, "a turn is already in progress")
+
+    def agent_error(self, session: Session, error: Exception) -> HTTPError:
+        # An agent call that failed after the backend's retries: rate limits
+        # and overloaded or unreachable models are worth retrying later.
+        rate_limit_error, *unavailable_errors = retryable_errors()
+        if isinstance(error, rate_limit_error):
+            wait = rate_limiter(
+                session.agent.model, default_rate_limits()
+            ).blocked_for()
+            return HTTPError(429, "the model is rate limited", retry_after=wait or 1.0)
+        if isinstance(error, tuple(unavailable_errors)):
+            return HTTPError(503, "the model is unavailable", retry_after=1.0)
+        return HTTPError(500, "internal server error")
+
+    async def agent_turn(
+        self,
+        session: Session,
+        content: Optional[str] = None,
+        on_token: Optional[Callable[[str, str], bool]] = None,
+        drain: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> str:
+        # The human's message (if any) and the agent's reply are added
+        # together, so a turn that fails leaves the transcript as it was.
+        self.check_turn(session, content)
+        self.active_turns += 1
+        try:
+            async with session.lock:
+                messages = session.state.messages_for(session.agent)
+                if content is not None:
+                    messages = messages + [{"role": "user", "content": content}]
+                try:
+                    response = await self.client.run(
+                        agent=session.agent,
+                        messages=messages,
+                        temperature=session.temperature(),
+                        stream=on_token is not None,
+                        on_token=on_token,
+                        drain=drain,
+                    )
+                except ConnectionError:
+                    # The human's connection, while draining tokens to it.
+                    raise
+                except Exception as error:
+                    raise self.agent_error(session, error) from error
+                if content is not None:
+                    session.add_human_message(content)
+                session.state.add_response(response)
+                content = response.messages[-1]["content"] or ""
+                session.add_agent_message(content)
+        finally:
+            self.active_turns -= 1
+            self.store.update(session)
+        return content
+
+    async def create_session(self, body: bytes) -> dict:
+        try:
+            options = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body must be a JSON object")
+        mode = options.get("mode", "guess")
+        if mode not in ("guess", "host"):
+            raise HTTPError(400, 'mode must be "guess" or "host"')
+        # The human's secret topic is optional in host mode; without it the
+        # game only ends after 20 questions.
+        topic = options.get("topic") or (
+            random.choice(load_knowledge_base().items) if mode == "guess" else ""
+        )
+        session = Session(
+            mode, self.game_variables.model_copy(update={"topic": str(topic)})
+        )
+        if mode == "host":
+            session.state.append(
+                {"role": session.host_agent.name, "content": HUMAN_HOST_OPENING}
+            )
+        self.store.add(session)
+        message = await self.agent_turn(session)
+        return {"session_id": session.id, "mode": mode, "message": message}
+
+    def session(self, session_id: str) -> Session:
+        session = self.store.get(session_id)
+        if session is None:
+            raise HTTPError(404, "no such session")
+        return session
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            method, path, headers, body = await read_request(reader)
+            await self.route(method, path, headers, body, reader, writer)
+        except HTTPError as error:
+            writer.write(json_response(error.status, error.body(), error.retry_after))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except Exception:
+            # Streaming turns report their own errors, so nothing has been
+            # written yet.
+            error = HTTPError(500, "internal server error")
+            writer.write(json_response(error.status, error.body()))
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def route(
+        self,
+        method: str,
+        path: str,
+        headers: Dict[str, str],
+        body: bytes,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        if path == "/metrics" and method == "GET":
+            writer.write(json_response(200, self.metrics()))
+            return
+        if path == "/sessions" and method == "POST":
+            writer.write(json_response(201, await self.create_session(body)))
+            return
+        match = SESSION_PATH_PATTERN.match(path)
+        if match is None:
+            raise HTTPError(404, "not found")
+        session_id, action = match.groups()
+        if action is None and method == "GET":
+            writer.write(json_response(200, self.session(session_id).summary()))
+        elif action is None and method == "DELETE":
+            self.session(session_id)
+            self.store.remove(session_id)
+            writer.write(json_response(200, {"deleted": session_id}))
+        elif action == "/messages" and method == "POST":
+            await self.stream_turn(
+                self.session(session_id), parse_message(body), writer
+            )
+        elif action == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+            await self.websocket(self.session(session_id), headers, reader, writer)
+        else:
+            raise HTTPError(405, "method not allowed")
+
+    def check_turn(self, session: Session, content: Optional[str]) -> None:
+        if content is not None and session.finished:
+            raise HTTPError(409, "the game is over")
+        self.admit(session)
+
+    def turn_result(self, session: Session, message: str) -> dict:
+        return {
+            "message": message,
+            "finished": session.finished,
+            "success": session.success,
+            "number_of_questions": session.state.number_of_questions,
+        }
+
+    async def stream_turn(
+        self, session: Session, content: str, writer: asyncio.StreamWriter
+    ) -> None:
+        # Errors found before the first byte is sent get a status code, later
+        # ones an "error" event.
+        self.check_turn(session, content)
+        writer.write(response_head(200, "text/event-stream"))
+
+        def on_token(delta: str, text: str) -> bool:
+            writer.write(sse_event("token", {"delta": delta}))
+            return False
+
+        try:
+            message = await self.agent_turn(session, content, on_token, writer.drain)
+        except HTTPError as error:
+            writer.write(sse_event("error", error.body()))
+            return
+        except ConnectionError:
+            raise
+        except Exception:
+            writer.write(
+                sse_event("error", HTTPError(500, "internal server error").body())
+            )
+            return
+        writer.write(sse_event("done", self.turn_result(session, message)))
+
+    async def websocket(
+        self,
+        session: Session,
+        headers: Dict[str, str],
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        key = headers.get("sec-websocket-key")
+        if not key:
+            raise HTTPError(400, "missing Sec-WebSocket-Key")
+        accept = base64.b64encode(
+            hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()
+        ).decode("ascii")
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+            b"Connection: Upgrade\r\nSec-WebSocket-Accept: "
+            + accept.encode("ascii")
+            + b"\r\n\r\n"
+        )
+
+        def send(data: dict) -> None:
+            writer.write(websocket_frame(json.dumps(data).encode("utf-8")))
+
+        def on_token(delta: str, text: str) -> bool:
+            send({"type": "token", "delta": delta})
+            return False
+
+        while True:
+            try:
+                opcode, payload = await read_websocket_frame(reader)
+            except HTTPError:
+                # The connection is a WebSocket now: close it with 1009
+                # (message too big) rather than answering in HTTP.
+                writer.write(
+                    websocket_frame(
+                        struct.pack("!H", 1009) + b"frame too large", opcode=0x8
+                    )
+                )
+                return
+            if opcode == 0x8:
+                writer.write(websocket_frame(payload[:2], opcode=0x8))
+                return
+            if opcode == 0x9:
+                writer.write(websocket_frame(payload, opcode=0xA))
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                message = await self.agent_turn(
+                    session, parse_message(payload), on_token, writer.drain
+                )
+            except HTTPError as error:
+                send({"type": "error", **error.body()})
+            except ConnectionError:
+                raise
+            except Exception:
+                send(
+                    {"type": "error", **HTTPError(500, "internal server error").body()}
+                )
+            else:
+                send({"type": "done", **self.turn_result(session, message)})
+            # A client that stops reading holds up only its own connection.
+            await writer.drain()
+
+    def metrics(self) -> dict:
+        return {
+            **self.store.stats(),
+            "active_turns": self.active_turns,
+            "rejected_turns": {
+                str(status): count for status, count in self.rejected_turns.items()
+            },
+            "rate_limits": rate_limit_metrics(),
+        }
+
+
+async def serve(args: argparse.Namespace) -> None:
+    backend = (
+        AsyncSimulatedBackend(
+            latency=args.simulated_latency, jitter=args.simulated_latency / 2
+        )
+        if args.simulated
+        else None
+    )
+    server = GameServer(
+        AsyncAgentClient(backend=backend, cache=ResponseCache.from_env()),
+        store=SessionStore(
+            max_sessions=args.max_sessions,
+            ttl_seconds=args.ttl,
+            max_bytes=args.max_memory_mb * 1024 * 1024,
+        ),
+        max_active_turns=args.max_active_turns,
+    )
+    port = await server.start(args.host, args.port)
+    print(
+        bcolors.LOG
+        + f"Serving 20 questions on http://{args.host}:{port}"
+        + bcolors.ENDC
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve human-vs-agent games of 20 questions over HTTP and WebSocket."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-sessions", type=int, default=10_000)
+    parser.add_argument("--ttl", type=float, default=1800.0)
+    parser.add_argument("--max-memory-mb", type=int, default=256)
+    parser.add_argument("--max-active-turns", type=int, default=200)
+    parser.add_argument(
+        "--simulated", action="store_true", help="use the offline simulated backend"
+    )
+    parser.add_argument("--simulated-latency", type=float, default=0.5)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("*** Stopping ***")
+
+
+if __name__ == "__main__":
+    main()
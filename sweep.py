@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from budget import Budget
+from metrics import LiveMetrics, add_span_hook, remove_span_hook, summarize_agent_calls
+from runner import run_games
+from semantic_cache import SemanticAnswerCache
+from utils import (
+    UNPLAYED_STATUSES,
+    GameResult,
+    GameVariables,
+    config_hash,
+    drop_partial_line,
+)
+
+
+class SweepGrid(BaseModel):
+    base: GameVariables = GameVariables()
+    axes: Dict[str, List[Any]] = {}
+    n_runs: int = 10
+
+    def cells(self) -> List[GameVariables]:
+        # Cartesian product of the axes over the base variables, with cells
+        # that end up with identical variables only kept once.
+        names = list(self.axes)
+        cells: Dict[str, GameVariables] = {}
+        for values in itertools.product(*(self.axes[name] for name in names)):
+            game_variables = self.base.model_copy(update=dict(zip(names, values)))
+            game_variables = GameVariables.model_validate(game_variables.model_dump())
+            cells.setdefault(config_hash(game_variables), game_variables)
+        return list(cells.values())
+
+    def tasks(
+        self, shard_index: int = 0, n_shards: int = 1
+    ) -> List[Tuple[str, int, GameVariables]]:
+        return [
+            (cell_hash, run_index, game_variables)
+            for game_variables in self.cells()
+            for cell_hash in [config_hash(game_variables)]
+            if int(cell_hash, 16) % n_shards == shard_index
+            for run_index in range(self.n_runs)
+        ]
+
+
+def read_checkpoint(path: str) -> Iterable[dict]:
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            # A crash can leave a partially written last line behind.
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def completed_tasks(path: str) -> Set[Tuple[str, int]]:
+    return {
+        (record["config_hash"], record["run_index"]) for record in read_checkpoint(path)
+    }
+
+
+async def run_sweep(
+    grid: SweepGrid,
+    checkpoint_path: str,
+    shard_index: int = 0,
+    n_shards: int = 1,
+    concurrency: Optional[int] = None,
+    client: Optional[Any] = None,
+    verbose: bool = False,
+    host_answer_cache: Optional[SemanticAnswerCache] = None,
+    metrics_path: Optional[str] = None,
+    budget: Optional[Budget] = None,
+) -> int:
+    # Every (cell, run) of this shard that is not yet in the checkpoint is
+    # scheduled on one shared pool; each finished game is appended and
+    # flushed right away, so an interrupted sweep resumes where it stopped.
+    # Games a spent budget kept from starting or cut off are left out of the
+    # checkpoint, so they are played when the sweep is resumed with more budget.
+    done = completed_tasks(checkpoint_path)
+    pending = [
+        task for task in grid.tasks(shard_index, n_shards) if task[:2] not in done
+    ]
+    # With metrics_path, live agent-call metrics are rewritten after every game.
+    live_metrics = LiveMetrics() if metrics_path else None
+    if live_metrics is not None:
+        add_span_hook(live_metrics)
+    n_played = 0
+    drop_partial_line(checkpoint_path)
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+
+        def on_result(index: int, result: GameResult) -> None:
+            nonlocal n_played
+            n_played += 1
+            cell_hash, run_index, game_variables = pending[index]
+            record = {
+                "config_hash": cell_hash,
+                "run_index": run_index,
+                "game_variables": game_variables.model_dump(),
+                "result": result.model_dump(),
+            }
+            checkpoint.write(json.dumps(record) + "\n")
+            checkpoint.flush()
+            if live_metrics is not None and metrics_path:
+                live_metrics.dump(metrics_path)
+
+        try:
+            await run_games(
+                [game_variables for _, _, game_variables in pending],
+                concurrency=concurrency,
+                client=client,
+                verbose=verbose,
+                on_result=on_result,
+                host_answer_cache=host_answer_cache,
+                budget=budget,
+            )
+        finally:
+            if live_metrics is not None and metrics_path:
+                remove_span_hook(live_metrics)
+                live_metrics.dump(metrics_path)
+    return n_played
+
+
+def merge_checkpoints(paths: List[str], output_path: str) -> int:
+    seen: Set[Tuple[str, int]] = set()
+    with open(output_path, "w", encoding="utf-8") as output:
+        for path in paths:
+            for record in read_checkpoint(path):
+                key = (record["config_hash"], record["run_index"])
+                if key not in seen:
+                    seen.add(key)
+                    output.write(json.dumps(record) + "\n")
+    return len(seen)
+
+
+def summarize_checkpoint(path: str) -> List[dict]:
+    cells: Dict[str, dict] = {}
+    for record in read_checkpoint(path):
+        if record["result"].get("status") in UNPLAYED_STATUSES:
+            continue
+        cell = cells.setdefault(
+            record["config_hash"],
+            {"game_variables": record["game_variables"], "results": []},
+        )
+        cell["results"].append(record["result"])
+    summary = []
+    for cell_hash, cell in cells.items():
+        results = cell["results"]
+        questions = [
+            result["number_of_questions"] for result in results if result["success"]
+        ]
+        summary.append(
+            {
+                "config_hash": cell_hash,
+                "game_variables": cell["game_variables"],
+                "n_runs": len(results),
+                "n_over_budget": sum(
+                    result.get("status") == "over_budget" for result in results
+                ),
+                "success_rate": float(
+                    np.mean([result["success"] for result in results])
+                ),
+                "mean_number_of_questions": (
+                    float(np.mean(questions)) if questions else None
+                ),
+                "metrics": summarize_agent_calls(
+                    [result.get("agent_calls", []) for result in results]
+                ),
+            }
+        )
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Run a resumable sweep over a grid of game variables."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("grid", help="JSON file with base, axes and n_runs")
+    run_parser.add_argument(
+        "checkpoint", help="JSONL file completed games are appended to"
+    )
+    run_parser.add_argument("--shard-index", type=int, default=0)
+    run_parser.add_argument("--n-shards", type=int, default=1)
+    run_parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="games in flight at once (default $GAME_CONCURRENCY or 100)",
+    )
+    run_parser.add_argument(
+        "--host-cache-threshold",
+        type=float,
+        help="reuse host answers to near-duplicate questions above this similarity",
+    )
+    run_parser.add_argument(
+        "--metrics-path",
+        help="file live agent-call metrics are written to (Prometheus text if *.prom, else JSON)",
+    )
+    run_parser.add_argument(
+        "--max-tokens", type=int, help="stop starting games after this many tokens"
+    )
+    run_parser.add_argument(
+        "--max-dollars",
+        type=float,
+        help="stop starting games after this estimated spend in US dollars",
+    )
+    merge_parser = subparsers.add_parser("merge")
+    merge_parser.add_argument("output")
+    merge_parser.add_argument("checkpoints", nargs="+")
+    summary_parser = subparsers.add_parser("summary")
+    summary_parser.add_argument("checkpoint")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        with open(args.grid, encoding="utf-8") as f:
+            grid = SweepGrid.model_validate(json.load(f))
+        budget = (
+            Budget(args.max_tokens, args.max_dollars)
+            if args.max_tokens or args.max_dollars
+            else None
+        )
+        n_games = asyncio.run(
+            run_sweep(
+                grid,
+                args.checkpoint,
+                shard_index=args.shard_index,
+                n_shards=args.n_shards,
+                concurrency=args.concurrency,
+                host_answer_cache=(
+                    SemanticAnswerCache(threshold=args.host_cache_threshold)
+                    if args.host_cache_threshold
+                    else None
+                ),
+                metrics_path=args.metrics_path,
+                budget=budget,
+            )
+        )
+        print(f"Played {n_games} games, results in {args.checkpoint}")
+        if budget is not None:
+            print(f"Budget: {json.dumps(budget.stats())}")
+    elif args.command == "merge":
+        n_games = merge_checkpoints(args.checkpoints, args.output)
+        print(f"Merged {n_games} games into {args.output}")
+    else:
+        print(json.dumps(summarize_checkpoint(args.checkpoint), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from agent_client import AsyncAgentClient
+from response_cache import ResponseCache
+from runner import run_games
+from sequential import INTERVALS, summarize
+from utils import (
+    GUESSING_AGENT_NAME,
+    HOST_AGENT_NAME,
+    GameResult,
+    GameVariables,
+    Response,
+)
+
+
+class TournamentSpec(BaseModel):
+    base: GameVariables = GameVariables()
+    # Overrides of the base variables per contender, e.g. its guessing prompt
+    # or temperature. Contenders whose host variables match share the host.
+    contenders: Dict[str, Dict[str, Any]] = {}
+    topics: List[str] = ["penguin"]
+    n_runs: int = 10
+
+    def games(self) -> List[Tuple[str, GameVariables]]:
+        # Ordered by topic, then run, then contender, so the contenders' games
+        # on a topic are in flight together and their host questions coalesce.
+        return [
+            (
+                name,
+                GameVariables.model_validate(
+                    {
+                        **self.base.model_dump(),
+                        **overrides,
+                        "topic": topic,
+                        "stream": False,
+                    }
+                ),
+            )
+            for topic in self.topics
+            for _ in range(self.n_runs)
+            for name, overrides in self.contenders.items()
+        ]
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+class SharedHost:
+    # Wraps the client all games of a tournament share. A host answer depends
+    # only on the host's prompt (which holds the topic), model and settings
+    # and on the question just asked, so each distinct (host, question) is
+    # answered once: concurrent asks wait for the call in flight, later ones
+    # reuse its answer. Guesser and judge calls pass straight through.
+    #
+    # Shared answers come back like semantic-cache hits, without tokens or
+    # latency, so the host call is charged to the one game that made it.
+    def __init__(self, client: AsyncAgentClient) -> None:
+        self.client = client
+        self.answers: Dict[tuple, Response] = {}
+        self.in_flight: Dict[tuple, asyncio.Future] = {}
+        self.requests = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.deduplicated = 0
+
+    def key(self, request: dict) -> Optional[tuple]:
+        agent, messages = request["agent"], request["messages"]
+        if agent.name != HOST_AGENT_NAME:
+            return None
+        # The opening message answers no question.
+        question = messages[-1]["content"] if len(messages) > 1 else ""
+        return (
+            agent.model,
+            messages[0]["content"],
+            request["temperature"],
+            request.get("json_response", False),
+            request.get("max_tokens"),
+            normalize_question(question),
+        )
+
+    async def run(self, **request: Any) -> Response:
+        key = self.key(request)
+        if key is None:
+            return await self.client.run(**request)
+        self.requests += 1
+        if key in self.answers:
+            self.deduplicated += 1
+            return self.shared(self.answers[key])
+        call = self.in_flight.get(key)
+        if call is not None:
+            self.coalesced += 1
+            return self.shared(await asyncio.shield(call))
+        self.calls += 1
+        # Shielded, so a cancelled game does not cancel the call for the
+        # games waiting on it.
+        call = self.in_flight[key] = asyncio.ensure_future(self.client.run(**request))
+        call.add_done_callback(lambda call: self.settle(key, call))
+        return await asyncio.shield(call)
+
+    def settle(self, key: tuple, call: asyncio.Future) -> None:
+        del self.in_flight[key]
+        if not call.cancelled() and call.exception() is None:
+            self.answers[key] = call.result()
+
+    def shared(self, response: Response) -> Response:
+        return Response(
+            messages=[dict(message) for message in response.messages],
+            agent=response.agent,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "deduplicated": self.deduplicated,
+            "calls_saved": (1 - self.calls / self.requests if self.requests else None),
+        }
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    contender: str
+    n_runs: int
+    success_rate: float
+    ci_lower: float
+    ci_upper: float
+    mean_number_of_questions: Optional[float] = None
+    questions_ci_lower: Optional[float] = None
+    questions_ci_upper: Optional[float] = None
+    guesser_tokens_per_game: float
+
+
+class TournamentOutcome(BaseModel):
+    leaderboard: List[LeaderboardEntry]
+    topics: Dict[str, List[LeaderboardEntry]]
+    confidence: float
+    method: str
+    host: dict
+    metrics: Dict[str, dict] = {}
+
+
+def leaderboard(
+    results: Dict[str, List[GameResult]], confidence: float, method: str
+) -> List[LeaderboardEntry]:
+    # Ranked by success rate, then by fewer questions to a correct guess.
+    entries = []
+    for contender, contender_results in results.items():
+        outcome = summarize(GameVariables(), contender_results, confidence, method)
+        guesser_tokens = [
+            sum(
+                call["prompt_tokens"] + call["completion_tokens"]
+                for call in result.agent_calls
+                if call["agent"] == GUESSING_AGENT_NAME
+            )
+            for result in contender_results
+        ]
+        entries.append(
+            LeaderboardEntry(
+                rank=0,
+                contender=contender,
+                n_runs=outcome.n_runs,
+                success_rate=outcome.success_rate,
+                ci_lower=outcome.ci_lower,
+                ci_upper=outcome.ci_upper,
+                mean_number_of_questions=outcome.mean_number_of_questions,
+                questions_ci_lower=outcome.questions_ci_lower,
+                questions_ci_upper=outcome.questions_ci_upper,
+                guesser_tokens_per_game=(
+                    sum(guesser_tokens) / len(guesser_tokens) if guesser_tokens else 0.0
+                ),
+            )
+        )
+    entries.sort(
+        key=lambda entry: (
+            -entry.success_rate,
+            (
+                entry.mean_number_of_questions
+                if entry.mean_number_of_questions is not None
+                else float("inf")
+            ),
+        )
+    )
+    for rank, entry in enumerate(entries, start=1):
+        entry.rank = rank
+    return entries
+
+
+async def run_tournament(
+    spec: TournamentSpec,
+    client: Optional[AsyncAgentClient] = None,
+    concurrency: Optional[int] = None,
+    confidence: float = 0.95,
+    method: str = "wilson",
+    verbose: bool = False,
+) -> TournamentOutcome:
+    # Plays every contender n_runs times on every topic in one concurrent
+    # pass, against one shared host, and ranks the contenders overall and
+    # per topic. Each game keeps its own state; only host answers are shared.
+    host = SharedHost(client or AsyncAgentClient(cache=ResponseCache.from_env()))
+    games = spec.games()
+    results = await run_games(
+        [game_variables for _, game_variables in games],
+        concurrency=concurrency,
+        client=host,  # type: ignore[arg-type]
+        verbose=verbose,
+    )
+    by_contender: Dict[str, List[GameResult]] = defaultdict(list)
+    by_topic: Dict[str, Dict[str, List[GameResult]]] = defaultdict(
+        lambda: defaultdict(list)
+    )
+    for (contender, game_variables), result in zip(games, results):
+        by_contender[contender].append(result)
+        by_topic[game_variables.topic][contender].append(result)
+    return TournamentOutcome(
+        leaderboard=leaderboard(by_contender, confidence, method),
+        topics={
+            topic: leaderboard(contenders, confidence, method)
+            for topic, contenders in by_topic.items()
+        },
+        confidence=confidence,
+        method=method,
+        host=host.stats(),
+        metrics={
+            contender: summarize(GameVariables(), results, confidence, method).metrics
+            for contender, results in by_contender.items()
+        },
+    )
+
+
+def format_leaderboard(entries: List[LeaderboardEntry]) -> str:
+    lines = [
+        f"{'rank':>4}  {'contender':<24} {'games':>5}  {'success rate':<22} {'questions':<22}"
+    ]
+    for entry in entries:
+        questions = (
+            f"{entry.mean_number_of_questions:.1f}"
+            if entry.mean_number_of_questions is not None
+            else "-"
+        )
+        if entry.questions_ci_lower is not None:
+            questions += (
+                f" [{entry.questions_ci_lower:.1f}, {entry.questions_ci_upper:.1f}]"
+            )
+        lines.append(
+            f"{entry.rank:>4}  {entry.contender:<24} {entry.n_runs:>5}  "
+            f"{f'{entry.success_rate:.2f} [{entry.ci_lower:.2f}, {entry.ci_upper:.2f}]':<22} "
+            f"{questions:<22}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Play several guessing agents against one shared host per topic and rank them."
+    )
+    parser.add_argument(
+        "spec", help="JSON file with base, contenders, topics and n_runs"
+    )
+    parser.add_argument("--output", help="JSON file the outcome is written to")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="games in flight at once (default $GAME_CONCURRENCY or 100)",
+    )
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--method", choices=list(INTERVALS), default="wilson")
+    parser.add_argument(
+        "--simulated",
+        action="store_true",
+        help="play against the offline simulated backend, which guesses the first topic",
+    )
+    args = parser.parse_args(argv)
+    with open(args.spec, encoding="utf-8") as f:
+        spec = TournamentSpec.model_validate(json.load(f))
+    client = None
+    if args.simulated:
+        from backends import AsyncSimulatedBackend
+
+        client = AsyncAgentClient(
+            backend=AsyncSimulatedBackend(topic=spec.topics[0], seed=0)
+        )
+    outcome = asyncio.run(
+        run_tournament(
+            spec,
+            client=client,
+            concurrency=args.concurrency,
+            confidence=args.confidence,
+            method=args.method,
+        )
+    )
+    print(format_leaderboard(outcome.leaderboard))
+    for topic, entries in outcome.topics.items():
+        print(f"\n{topic}:\n{format_leaderboard(entries)}")
+    print(f"\nhost: {json.dumps(outcome.host)}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(outcome.model_dump(), f)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+import json
+import math
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from utils import GameResult
+
+# Records in this module keep a game's data in __slots__ objects and typed
+# arrays instead of one dict per message or agent call: role and agent names
+# are stored once per game as small ids, texts once, and numbers unboxed.
+# They convert losslessly to and from the GameResult schema, and
+# encode_result/decode_result give a compact binary form of a whole game.
+
+
+class Transcript:
+    # Messages as one role id per message plus the message texts. Indexing
+    # and iteration give {"role", "content"} dicts, built on access.
+    __slots__ = ("roles", "role_ids", "texts")
+
+    def __init__(self, messages: Iterable[dict] = ()) -> None:
+        self.roles: List[str] = []
+        self.role_ids = array("B")
+        self.texts: List[Optional[str]] = []
+        for message in messages:
+            if message.keys() != {"role", "content"}:
+                raise ValueError(f"not a transcript message: {message!r}")
+            self.append(message["role"], message["content"])
+
+    def role_id(self, role: str) -> int:
+        # A game has two or three roles, so a list scan beats a dict.
+        for i, known in enumerate(self.roles):
+            if known == role:
+                return i
+        self.roles.append(sys.intern(role))
+        return len(self.roles) - 1
+
+    def append(self, role: str, content: Optional[str]) -> None:
+        self.role_ids.append(self.role_id(role))
+        self.texts.append(content)
+
+    def role(self, index: int) -> str:
+        return self.roles[self.role_ids[index]]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {"role": self.role(index), "content": self.texts[index]}
+
+    def __iter__(self) -> Iterator[dict]:
+        roles = self.roles
+        for role_id, text in zip(self.role_ids, self.texts):
+            yield {"role": roles[role_id], "content": text}
+
+    def to_list(self) -> List[dict]:
+        return list(self)
+
+
+AGENT_CALL_FIELDS = (
+    "turn",
+    "agent",
+    "latency_seconds",
+    "queue_seconds",
+    "prompt_tokens",
+    "completion_tokens",
+    "retries",
+    "cached",
+    "discarded",
+)
+# (attribute, array typecode) of the numeric columns, in encoding order.
+AGENT_CALL_COLUMNS = (
+    ("turns", "H"),
+    ("agent_ids", "B"),
+    ("latency_seconds", "d"),
+    ("queue_seconds", "d"),
+    ("prompt_tokens", "I"),
+    ("completion_tokens", "I"),
+    ("retries", "H"),
+    ("flags", "B"),
+)
+CACHED = 1
+DISCARDED = 2
+
+
+class AgentCallLog:
+    # GameResult.agent_calls as one typed array per field; `cached` and
+    # `discarded` share a flags byte.
+    __slots__ = ("agents", *(name for name, _ in AGENT_CALL_COLUMNS))
+
+    def __init__(self, calls: Iterable[dict] = ()) -> None:
+        self.agents: List[str] = []
+        for name, typecode in AGENT_CALL_COLUMNS:
+            setattr(self, name, array(typecode))
+        for call in calls:
+            if call.keys() != set(AGENT_CALL_FIELDS):
+                raise ValueError(f"not an agent call: {call!r}")
+            self.append(**call)
+
+    def append(
+        self,
+        turn: int,
+        agent: str,
+        latency_seconds: float,
+        queue_seconds: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+        retries: int,
+        cached: bool,
+        discarded: bool,
+    ) -> None:
+        if agent not in self.agents:
+            self.agents.append(sys.intern(agent))
+        self.turns.append(turn)
+        self.agent_ids.append(self.agents.index(agent))
+        self.latency_seconds.append(latency_seconds)
+        self.queue_seconds.append(queue_seconds)
+        self.prompt_tokens.append(prompt_tokens)
+        self.completion_tokens.append(completion_tokens)
+        self.retries.append(retries)
+        self.flags.append(CACHED * bool(cached) | DISCARDED * bool(discarded))
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield {
+                "turn": self.turns[i],
+                "agent": self.agents[self.agent_ids[i]],
+                "latency_seconds": self.latency_seconds[i],
+                "queue_seconds": self.queue_seconds[i],
+                "prompt_tokens": self.prompt_tokens[i],
+                "completion_tokens": self.completion_tokens[i],
+                "retries": self.retries[i],
+                "cached": bool(self.flags[i] & CACHED),
+                "discarded": bool(self.flags[i] & DISCARDED),
+            }
+
+    def to_list(self) -> List[dict]:
+        return list(self)
+
+
+# GameResult fields kept as they are: optional and small, or rarely set.
+PLAIN_FIELDS = (
+    "host_answers",
+    "speculation",
+    "candidate_tracking",
+    "judgement",
+    "routing",
+)
+SCALAR_FIELDS = (
+    "id",
+    "success",
+    "status",
+    "number_of_questions",
+    "prompt_tokens",
+    "completion_tokens",
+    "cost_dollars",
+    "duration_seconds",
+    "host_cache_hits",
+)
+
+
+class CompactGameResult:
+    # A GameResult for keeping many games in memory. The ledger is held as
+    # (question, answer) tuples whose questions are the transcript's own
+    # strings, and answers are interned.
+    __slots__ = (
+        *SCALAR_FIELDS,
+        "chat_history",
+        "ledger",
+        "agent_calls",
+        *PLAIN_FIELDS,
+    )
+
+    @classmethod
+    def from_result(cls, result: GameResult) -> "CompactGameResult":
+        compact = cls.__new__(cls)
+        for name in SCALAR_FIELDS + PLAIN_FIELDS:
+            setattr(compact, name, getattr(result, name))
+        compact.status = sys.intern(result.status)
+        compact.chat_history = Transcript(result.chat_history)
+        compact.ledger = compact_ledger(result.ledger, compact.chat_history)
+        compact.agent_calls = AgentCallLog(result.agent_calls)
+        return compact
+
+    def to_dict(self) -> dict:
+        # Plain data in the GameResult schema, ready for json.dumps.
+        data = {name: getattr(self, name) for name in SCALAR_FIELDS}
+        data["chat_history"] = self.chat_history.to_list()
+        data["ledger"] = expand_ledger(self.ledger)
+        data["agent_calls"] = self.agent_calls.to_list()
+        for name in PLAIN_FIELDS:
+            data[name] = getattr(self, name)
+        return {name: data[name] for name in GameResult.model_fields}
+
+    def to_result(self) -> GameResult:
+        return GameResult.model_validate(self.to_dict())
+
+
+Ledger = Optional[List[Union[Tuple[str, str], dict]]]
+
+
+def compact_ledger(ledger: Optional[List[dict]], transcript: Transcript) -> Ledger:
+    # Entries other than {"question", "answer"} are kept as dicts.
+    if ledger is None:
+        return None
+    texts = {text: text for text in transcript.texts if text is not None}
+    return [
+        (
+            (texts.get(fact["question"], fact["question"]), sys.intern(fact["answer"]))
+            if fact.keys() == {"question", "answer"}
+            and isinstance(fact["question"], str)
+            and isinstance(fact["answer"], str)
+            else fact
+        )
+        for fact in ledger
+    ]
+
+
+def expand_ledger(ledger: Ledger) -> Optional[List[dict]]:
+    if ledger is None:
+        return None
+    return [
+        ({"question": fact[0], "answer": fact[1]} if isinstance(fact, tuple) else fact)
+        for fact in ledger
+    ]
+
+
+# Binary layout, little-endian: MAGIC, the scalar HEADER, a string table
+# (count, one uint32 length per string with NONE_LENGTH for None, then the
+# UTF-8 bytes of all strings), the transcript's role ids, the agent call
+# columns (each a uint32 length plus raw array bytes), and a JSON trailer for
+# the ledger and the PLAIN_FIELDS. The string table holds the id, status,
+# transcript roles, agent names and texts, and the ledger refers to questions
+# by their index in the transcript.
+MAGIC = b"GQR1"
+HEADER = struct.Struct("<?iqqddiHBB")
+NONE_LENGTH = 0xFFFFFFFF
+
+
+def encode_strings(strings: List[Optional[str]]) -> bytes:
+    encoded = [
+        string.encode("utf-8") if string is not None else b"" for string in strings
+    ]
+    lengths = array(
+        "I",
+        [
+            len(data) if string is not None else NONE_LENGTH
+            for string, data in zip(strings, encoded)
+        ],
+    )
+    return struct.pack("<I", len(strings)) + lengths.tobytes() + b"".join(encoded)
+
+
+def decode_strings(data: memoryview, offset: int) -> Tuple[List[Optional[str]], int]:
+    (count,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    lengths = array("I")
+    lengths.frombytes(data[offset : offset + 4 * count])
+    offset += 4 * count
+    strings: List[Optional[str]] = []
+    for length in lengths:
+        if length == NONE_LENGTH:
+            strings.append(None)
+            continue
+        strings.append(str(data[offset : offset + length], "utf-8"))
+        offset += length
+    return strings, offset
+
+
+def encode_array(values: array) -> bytes:
+    return struct.pack("<I", len(values)) + values.tobytes()
+
+
+def decode_array(typecode: str, data: memoryview, offset: int) -> Tuple[array, int]:
+    (count,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    values = array(typecode)
+    values.frombytes(data[offset : offset + count * values.itemsize])
+    return values, offset + count * values.itemsize
+
+
+def encode_result(result: Union[GameResult, CompactGameResult]) -> bytes:
+    if not isinstance(result, CompactGameResult):
+        result = CompactGameResult.from_result(result)
+    transcript, calls = result.chat_history, result.agent_calls
+    header = HEADER.pack(
+        result.success,
+        result.number_of_questions if result.number_of_questions is not None else -1,
+        result.prompt_tokens,
+        result.completion_tokens,
+        result.cost_dollars,
+        result.duration_seconds if result.duration_seconds is not None else math.nan,
+        result.host_cache_hits if result.host_cache_hits is not None else -1,
+        len(transcript.texts),
+        len(transcript.roles),
+        len(calls.agents),
+    )
+    positions = {
+        id(text): i for i, text in enumerate(transcript.texts) if text is not None
+    }
+    trailer = {name: getattr(result, name) for name in PLAIN_FIELDS}
+    trailer["ledger"] = (
+        [
+            (
+                [positions.get(id(fact[0]), fact[0]), fact[1]]
+                if isinstance(fact, tuple)
+                else fact
+            )
+            for fact in result.ledger
+        ]
+        if result.ledger is not None
+        else None
+    )
+    return b"".join(
+        [
+            MAGIC,
+            header,
+            encode_strings(
+                [result.id, result.status, *transcript.roles, *calls.agents]
+                + transcript.texts
+            ),
+            encode_array(transcript.role_ids),
+            *(encode_array(getattr(calls, name)) for name, _ in AGENT_CALL_COLUMNS),
+            json.dumps(trailer, separators=(",", ":")).encode("utf-8"),
+        ]
+    )
+
+
+def decode_result(data: bytes) -> CompactGameResult:
+    view = memoryview(data)
+    if bytes(view[: len(MAGIC)]) != MAGIC:
+        raise ValueError("not an encoded game result")
+    (
+        success,
+        number_of_questions,
+        prompt_tokens,
+        completion_tokens,
+        cost_dollars,
+        duration_seconds,
+        host_cache_hits,
+        n_texts,
+        n_roles,
+        n_agents,
+    ) = HEADER.unpack_from(view, len(MAGIC))
+    offset = len(MAGIC) + HEADER.size
+    strings, offset = decode_strings(view, offset)
+    result = CompactGameResult.__new__(CompactGameResult)
+    result.id = strings[0]
+    result.status = sys.intern(strings[1])
+    result.success = success
+    result.number_of_questions = (
+        number_of_questions if number_of_questions >= 0 else None
+    )
+    result.prompt_tokens = prompt_tokens
+    result.completion_tokens = completion_tokens
+    result.cost_dollars = cost_dollars
+    result.duration_seconds = (
+        duration_seconds if not math.isnan(duration_seconds) else None
+    )
+    result.host_cache_hits = host_cache_hits if host_cache_hits >= 0 else None
+
+    transcript = Transcript()
+    transcript.roles = [sys.intern(role) for role in strings[2 : 2 + n_roles]]
+    transcript.texts = strings[len(strings) - n_texts :]
+    transcript.role_ids, offset = decode_array("B", view, offset)
+    result.chat_history = transcript
+
+    calls = AgentCallLog()
+    calls.agents = [
+        sys.intern(agent) for agent in strings[2 + n_roles : 2 + n_roles + n_agents]
+    ]
+    for name, typecode in AGENT_CALL_COLUMNS:
+        column, offset = decode_array(typecode, view, offset)
+        setattr(calls, name, column)
+    result.agent_calls = calls
+
+    trailer: Dict[str, Any] = json.loads(bytes(view[offset:]))
+    for name in PLAIN_FIELDS:
+        setattr(result, name, trailer.get(name))
+    result.ledger = (
+        [
+            (
+                (
+                    transcript.texts[fact[0]] if isinstance(fact[0], int) else fact[0],
+                    sys.intern(fact[1]),
+                )
+                if isinstance(fact, list)
+                else fact
+            )
+            for fact in trailer["ledger"]
+        ]
+        if trailer["ledger"] is not None
+        else None
+    )
+    return result
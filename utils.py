@@ -1,6 +1,11 @@
+import functools
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
 from typing import Any, Callable, List, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Agent(BaseModel):
@@ -11,9 +16,29 @@ class Agent(BaseModel):
     )
 
 
-class Response(BaseModel):
-    messages: List = []
+# Responses and completions are created for every agent call (completions
+# for every streamed chunk), so they are plain slotted dataclasses rather
+# than validated models.
+@dataclass(slots=True)
+class Response:
+    messages: List = field(default_factory=list)
     agent: Optional[Agent] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # None when no agent call was made, e.g. for a semantic-cache host answer.
+    latency_seconds: Optional[float] = None
+    queue_seconds: float = 0.0
+    retries: int = 0
+    cached: bool = False
+
+
+@dataclass(slots=True)
+class Completion:
+    content: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+    queue_seconds: float = 0.0
 
 
 class bcolors:
@@ -27,8 +52,37 @@ class bcolors:
 class GameResult(BaseModel):
     id: str
     success: bool
+    # "completed", "interrupted", "over_budget" or "not_scheduled" (a sweep
+    # whose budget ran out before the game started).
+    status: str = "completed"
     number_of_questions: Optional[int] = None
     chat_history: List[dict]
+    ledger: Optional[List[dict]] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_dollars: float = 0.0
+    duration_seconds: Optional[float] = None
+    host_answers: Optional[List[dict]] = None
+    speculation: Optional[dict] = None
+    host_cache_hits: Optional[int] = None
+    candidate_tracking: Optional[dict] = None
+    agent_calls: List[dict] = []
+    judgement: Optional[dict] = None
+    routing: Optional[dict] = None
+
+
+class ModelRoute(BaseModel):
+    # The models for one role from question `from_question` on. The first
+    # model answers, each later one is escalated to when the answer before it
+    # fails validation or looks low-confidence (see routing.py).
+    models: List[str]
+    from_question: int = 0
+
+
+class RoutingPolicy(BaseModel):
+    name: str = "custom"
+    host: List[ModelRoute] = []
+    guesser: List[ModelRoute] = []
 
 
 class GameVariables(BaseModel):
@@ -37,3 +91,64 @@ class GameVariables(BaseModel):
     host_agent_temperature: float = 0.8
     host_agent_additional_instructions: str = ""
     guessing_agent_additional_instructions: str = ""
+    compact_history: bool = False
+    # At least the question the host answers must stay in the window.
+    raw_turns_to_keep: int = Field(default=2, ge=1)
+    stream: bool = False
+    final_host_turn: bool = True
+    structured_host_answers: bool = False
+    host_answer_max_tokens: int = 40
+    speculative_questions: bool = False
+    candidate_tracking: bool = False
+    knowledge_base_path: Optional[str] = None
+    max_game_tokens: Optional[int] = None
+    max_game_dollars: Optional[float] = None
+    topic_aliases: List[str] = []
+    llm_judge: bool = False
+    # None keeps the Agent default model; a routing policy overrides both.
+    host_agent_model: Optional[str] = None
+    guessing_agent_model: Optional[str] = None
+    routing: Optional[RoutingPolicy] = None
+
+
+# Games a shared budget kept from being played; summaries skip them. Games
+# that ran out of their own budget ("over_budget") count as failures.
+UNPLAYED_STATUSES = ("not_scheduled",)
+
+HOST_AGENT_NAME = "Host Agent"
+GUESSING_AGENT_NAME = "Guessing Agent"
+
+
+@functools.lru_cache(maxsize=None)
+def load_env() -> None:
+    # Loads .env into the environment once, when the first setting read from
+    # it is needed (building a client, opening the response cache).
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def drop_partial_line(path: str) -> None:
+    # A crash can leave a partially written last line in an append-only JSONL
+    # file. It is cut off before appending again, or the next record would be
+    # written onto it and both lines would fail to parse.
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+def config_hash(game_variables: GameVariables) -> str:
+    dump = json.dumps(game_variables.model_dump(), sort_keys=True)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()[:16]